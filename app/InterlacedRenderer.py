@@ -18,9 +18,10 @@ class InterlacedRenderer(DefaultRenderer):
         frame1 = nt.composite_layer(frame1, frame1, field=0, fieldno=0, frameno=frameno)
         frame1 = cv2.convertScaleAbs(frame1)
 
-        frame2 = cv2.copyMakeBorder(frame2,1,0,0,0,cv2.BORDER_CONSTANT)
+        bordered = nt.workspace.get('field 2 input', (frame2.shape[0] + 1,) + frame2.shape[1:], frame2.dtype)
+        frame2 = cv2.copyMakeBorder(frame2,1,0,0,0,cv2.BORDER_CONSTANT, dst=bordered)
         frame2 = nt.composite_layer(frame2, frame2, field=2, fieldno=2, frameno=frameno)
-        frame2 = cv2.convertScaleAbs(frame2)
+        frame2 = cv2.convertScaleAbs(frame2, dst=nt.workspace.get('field 2 output', frame2.shape, numpy.uint8))
         frame = frame1
         frame[1::2,:] = frame2[2::2,:]
         return frame
\ No newline at end of file
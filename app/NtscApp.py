@@ -1,8 +1,9 @@
+import copy
 import json
+import threading
 from pathlib import Path
 from random import randint
 from typing import Tuple, Union, List, Dict, Set, Any, TypeVar, Generic, Callable, Type
-import requests
 import cv2
 import numpy
 from PyQt5 import QtWidgets, QtCore, QtGui
@@ -16,12 +17,18 @@ from abc import abstractmethod
 
 from app.InterlacedRenderer import InterlacedRenderer
 from app.config_dialog import ConfigDialog
-from app.logs import logger
+from app.logs import logger, hot_logger
 from app.Renderer import DefaultRenderer
+from app.render_job import FrameMailbox
+from app.render_metrics import format_metrics
+from app.PreviewRenderer import PreviewRenderer, PREVIEW_DEBOUNCE_MS, PREVIEW_DRAFT_HEIGHT, PREVIEW_SETTLE_MS
+from app.preview_frames import PreviewFrameServer
 from app.funcs import resize_to_height, pick_save_file, trim_to_4width
-from app.ntsc import random_ntsc, Ntsc, VHSSpeed
+from app.ntsc import apply_parameters, random_ntsc, Ntsc, VHSSpeed
+from app.templates import load_templates, fetch_templates
 from ui import mainWindow
 from ui.DoubleSlider import DoubleSlider
+from ui.PreviewDisplay import PreviewDisplay
 
 T = TypeVar("T")
 
@@ -263,21 +270,28 @@ class ControlGrid:
 
 class NtscApp(QtWidgets.QMainWindow, mainWindow.Ui_MainWindow):
     render_thread: QtCore.QThread
+    templatesFetched = QtCore.pyqtSignal(dict)
     def __init__(self):
         self.videoRenderer: DefaultRenderer = None
         self.current_frame: numpy.ndarray = False
         self.next_frame: numpy.ndarray = False
         self.scale_pixmap = False
         self.input_video = {}
+        self.frameServer: PreviewFrameServer = None
         self.templates = {}
+        self.template_buttons: List[QPushButton] = []
         self.orig_wh: Tuple[int, int] = (0, 0)
         self.compareMode: bool = False
+        self.draftPreview: bool = True
         self.isRenderActive: bool = False
         self.mainEffect: bool = True
         self.videoMode: bool = False
         self.lossless_mode: bool = False
         self.interlaced: bool = True
         self.framecount: int = 0
+        # render range in input frames [in, out), None means start / end of the video
+        self.in_frame: Union[int, None] = None
+        self.out_frame: Union[int, None] = None
         self.__video_output_suffix = ".mp4"  # or .mkv for FFV1
         self.ProcessAudio: bool = False
         self.nt_controls: Dict[str, Control] = {}
@@ -290,6 +304,18 @@ class NtscApp(QtWidgets.QMainWindow, mainWindow.Ui_MainWindow):
         self.supported_video_type = ['.mp4', '.mkv', '.avi', '.webm', '.mpg', '.gif']
         self.supported_image_type = ['.png', '.jpg', '.jpeg', '.webp']
         self.setupUi(self)  # Это нужно для инициализации нашего дизайна
+        self.replace_image_frame()
+
+        self.previewRenderer = PreviewRenderer()
+        self.previewRenderer.frameReady.connect(self.preview_ready)
+        self.previewTimer = QtCore.QTimer(self)
+        self.previewTimer.setSingleShot(True)
+        self.previewTimer.setInterval(PREVIEW_DEBOUNCE_MS)
+        self.previewTimer.timeout.connect(self.request_preview)
+        self.previewSettleTimer = QtCore.QTimer(self)
+        self.previewSettleTimer.setSingleShot(True)
+        self.previewSettleTimer.setInterval(PREVIEW_SETTLE_MS)
+        self.previewSettleTimer.timeout.connect(self.request_full_preview)
         self.strings = {
             "_composite_preemphasis": self.tr("Composite preemphasis"),
             "_vhs_out_sharpen": self.tr("VHS out sharpen"),
@@ -370,14 +396,16 @@ class NtscApp(QtWidgets.QMainWindow, mainWindow.Ui_MainWindow):
 
         self.set_pro_mode(False)
 
-        self.renderHeightBox.valueChanged.connect(
-            lambda: self.set_current_frames(*self.get_current_video_frames())
-        )
+        self.renderHeightBox.valueChanged.connect(self.update_video_frames)
+        # connected once, open_video only swaps the frame server behind it
+        self.videoTrackSlider.valueChanged.connect(self.update_video_frames)
         self.openFile.clicked.connect(self.open_file)
         self.renderVideoButton.clicked.connect(self.render_video)
         self.saveImageButton.clicked.connect(self.render_image)
         self.stopRenderButton.clicked.connect(self.stop_render)
         self.compareModeButton.stateChanged.connect(self.toggle_compare_mode)
+        self.add_draft_preview_checkbox()
+        self.add_metrics_label()
         self.toggleMainEffect.stateChanged.connect(self.toggle_main_effect)
         self.LossLessCheckBox.stateChanged.connect(self.lossless_exporting)
         # self.ProcessAudioCheckBox.stateChanged.connect(self.audio_filtering)
@@ -412,6 +440,8 @@ class NtscApp(QtWidgets.QMainWindow, mainWindow.Ui_MainWindow):
         self.videoTrackSlider.hide()
         self.livePreviewCheckbox.hide()
 
+        self.add_range_controls()
+
         #self.label_2.hide()
         #self.renderHeightBox.hide()
         #self.seedLabel.hide()
@@ -420,15 +450,28 @@ class NtscApp(QtWidgets.QMainWindow, mainWindow.Ui_MainWindow):
         self.add_builtin_templates()
 
     def add_builtin_templates(self):
+        self.set_templates(load_templates())
 
-        try:
-            # TODO: if online not available, then load from file (it need file to be included in build spec)
-            res = requests.get('https://raw.githubusercontent.com/JargeZ/vhs/master/builtin_templates.json')
-            if not res.ok:
-                return
-            self.templates = json.loads(res.content)
-        except Exception as e:
-            logger.exception(f'json not loaded: {e}')
+        # refresh from github without holding up the window, the buttons update when it arrives.
+        # daemon thread, a slow request never blocks closing the app
+        self.templatesFetched.connect(self.set_templates)
+        threading.Thread(target=self.refresh_templates, daemon=True).start()
+
+    def refresh_templates(self):
+        templates = fetch_templates()
+        if templates:
+            self.templatesFetched.emit(templates)
+
+    @QtCore.pyqtSlot(dict)
+    def set_templates(self, templates: Dict[str, Dict[str, Union[int, float]]]):
+        if templates == self.templates:
+            return
+        self.templates = templates
+
+        for button in self.template_buttons:
+            self.templatesLayout.removeWidget(button)
+            button.deleteLater()
+        self.template_buttons = []
 
         for name, values in self.templates.items():
             button = QPushButton()
@@ -438,6 +481,87 @@ class NtscApp(QtWidgets.QMainWindow, mainWindow.Ui_MainWindow):
             )(values)
             button.clicked.connect(set_values)
             self.templatesLayout.addWidget(button)
+            self.template_buttons.append(button)
+
+    def add_range_controls(self):
+        self.setInButton = QPushButton(self.tr("In"))
+        self.setInButton.setToolTip(self.tr("Start the render at the current frame"))
+        self.setInButton.clicked.connect(self.set_in_point)
+        self.setOutButton = QPushButton(self.tr("Out"))
+        self.setOutButton.setToolTip(self.tr("End the render at the current frame"))
+        self.setOutButton.clicked.connect(self.set_out_point)
+        self.clearRangeButton = QPushButton(self.tr("Full"))
+        self.clearRangeButton.setToolTip(self.tr("Render the whole video"))
+        self.clearRangeButton.clicked.connect(self.clear_range)
+
+        self.rangeButtons = (self.setInButton, self.setOutButton, self.clearRangeButton)
+        for button in self.rangeButtons:
+            self.positionControlLayout.addWidget(button)
+            button.hide()
+
+    def replace_image_frame(self):
+        # the designer file has a plain QLabel, the preview needs one that paints frames itself
+        label = self.image_frame
+        self.image_frame = PreviewDisplay(self.centralwidget)
+        self.image_frame.setSizePolicy(label.sizePolicy())
+        self.image_frame.setMinimumSize(label.minimumSize())
+        self.image_frame.setMaximumSize(label.maximumSize())
+        self.image_frame.setAlignment(label.alignment())
+        self.image_frame.setStyleSheet(label.styleSheet())
+        self.image_frame.setText(label.text())
+        self.image_frame.setObjectName(label.objectName())
+        self.verticalLayout.replaceWidget(label, self.image_frame)
+        label.deleteLater()
+
+    def add_metrics_label(self):
+        self.metricsLabel = QLabel()
+        self.metricsLabel.setToolTip(self.tr("Render throughput, time per frame of each stage and queue depths"))
+        self.verticalLayout.insertWidget(self.verticalLayout.indexOf(self.progressBar) + 1, self.metricsLabel)
+        self.metricsLabel.hide()
+
+    def add_draft_preview_checkbox(self):
+        self.draftPreviewCheckBox = QCheckBox(self.tr("Draft preview"))
+        self.draftPreviewCheckBox.setToolTip(self.tr(
+            "Show a quick low resolution preview while values change, the full one once they settle"
+        ))
+        self.draftPreviewCheckBox.setChecked(self.draftPreview)
+        self.draftPreviewCheckBox.stateChanged.connect(self.toggle_draft_preview)
+        self.gridLayout_2.addWidget(self.draftPreviewCheckBox, 2, 7, 1, 1)
+
+    def set_in_point(self):
+        in_frame = self.videoTrackSlider.value()
+        if self.interlaced:
+            in_frame -= in_frame % 2
+        self.in_frame = in_frame
+        if self.out_frame is not None and self.out_frame <= in_frame:
+            self.out_frame = None
+        self.update_range()
+
+    def set_out_point(self):
+        # out_frame is the frame the render stops before, the one on screen is still rendered
+        out_frame = self.videoTrackSlider.value() + 1
+        if self.interlaced:
+            out_frame += out_frame % 2
+        self.out_frame = out_frame
+        if self.in_frame is not None and self.in_frame >= out_frame:
+            self.in_frame = None
+        self.update_range()
+
+    def clear_range(self):
+        self.in_frame = None
+        self.out_frame = None
+        self.update_range()
+
+    def update_range(self):
+        frames_count = self.input_video.get("frames_count", 0)
+        in_frame = self.in_frame or 0
+        out_frame = frames_count if self.out_frame is None else self.out_frame
+        self.framecount = self.round_framecount(out_frame - in_frame) if self.interlaced else out_frame - in_frame
+        self.progressBar.setMaximum(max(1, self.framecount))
+        if self.in_frame is None and self.out_frame is None:
+            self.update_status(self.tr("Render range: whole video"))
+        else:
+            self.update_status(self.tr("Render range: frames {} - {}").format(in_frame, out_frame - 1))
 
     def get_render_class(self):
         #is_interlaced = True  # Get state from UI choice
@@ -464,11 +588,12 @@ class NtscApp(QtWidgets.QMainWindow, mainWindow.Ui_MainWindow):
         # перенесём объект в другой поток
         self.videoRenderer.moveToThread(self.render_thread)
         # после чего подключим все сигналы и слоты
-        self.videoRenderer.newFrame.connect(self.render_preview)
+        self.videoRenderer.newFrame.connect(self.show_live_frame)
         self.videoRenderer.frameMoved.connect(self.videoTrackSlider.setValue)
         self.videoRenderer.renderStateChanged.connect(self.set_render_state)
         self.videoRenderer.sendStatus.connect(self.update_status)
         self.videoRenderer.increment_progress.connect(self.increment_progress)
+        self.videoRenderer.metricsUpdated.connect(self.show_metrics)
         # подключим сигнал старта потока к методу run у объекта, который должен выполнять код в другом потоке
         self.render_thread.started.connect(self.videoRenderer.run)
 
@@ -476,9 +601,20 @@ class NtscApp(QtWidgets.QMainWindow, mainWindow.Ui_MainWindow):
     def stop_render(self):
         self.videoRenderer.stop()
 
-    @QtCore.pyqtSlot()
-    def increment_progress(self):
-        self.progressBar.setValue(self.progressBar.value()+1)
+    @QtCore.pyqtSlot(int)
+    def increment_progress(self, frames: int):
+        self.progressBar.setValue(self.progressBar.value() + frames)
+
+    @QtCore.pyqtSlot(object)
+    def show_metrics(self, snapshot: dict):
+        self.metricsLabel.setText(format_metrics(snapshot))
+
+    @QtCore.pyqtSlot(object)
+    def show_live_frame(self, live_frame: FrameMailbox):
+        # the newest frame, whatever arrived since the notification was sent
+        item = live_frame.take()
+        if item is not None:
+            self.render_preview(item[1])
 
     @QtCore.pyqtSlot()
     def toggle_compare_mode(self):
@@ -486,6 +622,11 @@ class NtscApp(QtWidgets.QMainWindow, mainWindow.Ui_MainWindow):
         self.compareMode = state
         self.nt_update_preview()
 
+    @QtCore.pyqtSlot()
+    def toggle_draft_preview(self):
+        self.draftPreview = self.sender().isChecked()
+        self.nt_update_preview()
+
     @QtCore.pyqtSlot()
     def toggle_pause_render(self):
         button = self.sender()
@@ -566,6 +707,11 @@ class NtscApp(QtWidgets.QMainWindow, mainWindow.Ui_MainWindow):
         self.presetSeedSpinBox.setEnabled(not is_render_active)
 
         self.progressBar.setVisible(is_render_active)
+        self.metricsLabel.setVisible(is_render_active)
+        if is_render_active:
+            self.metricsLabel.clear()
+        for button in self.rangeButtons:
+            button.setEnabled(not is_render_active)
         if is_render_active:
             self.renderingLabel.show()
             if self.videoMode:
@@ -590,11 +736,11 @@ class NtscApp(QtWidgets.QMainWindow, mainWindow.Ui_MainWindow):
             value = getattr(self.nt, parameter_name)
 
             control.set_value(value, block_signals=True)
-            logger.debug(f"set {type(value)} {parameter_name} {type(control).__name__} to {value}")
+            hot_logger.debug("set {} {} {} to {}", type(value), parameter_name, type(control).__name__, value)
         self.nt_update_preview()
 
     def value_changed(self, parameter_name, value):
-        logger.debug(f"Set {parameter_name} to {value}")
+        hot_logger.debug("Set {} to {}", parameter_name, value)
         setattr(self.nt, parameter_name, value)
         self.nt_update_preview()
 
@@ -672,24 +818,18 @@ class NtscApp(QtWidgets.QMainWindow, mainWindow.Ui_MainWindow):
         preview_h = self.renderHeightBox.value()
         if not self.input_video or preview_h < 10:
             return None, None
-        current_index = self.videoTrackSlider.value()
-
-        checkcap = self.input_video["cap"]
-        checkcap.set(1, current_index)
+        if self.frameServer is None:
+            return None, None
 
-        ret, frame1 = checkcap.read()
+        # already resized to the preview height
+        return self.frameServer.frames(self.videoTrackSlider.value(), preview_h)
 
-        # Read next frame
-        checkcap.set(1, current_index+1)
-        ret, frame2 = checkcap.read()
-        # Check if next frame exists
-        if not ret:
-            frame2 = frame1
-        
-        # Reset checkcap
-        checkcap.set(1, current_index)
-
-        return frame1, frame2
+    def update_video_frames(self):
+        frame1, frame2 = self.get_current_video_frames()
+        if not isinstance(frame1, ndarray):
+            self.update_status("Trying to set invalid current frame")
+            return None
+        self.show_current_frames(frame1, frame2)
 
     def resize_to_preview_frame(self, frame):
         preview_h = self.renderHeightBox.value()
@@ -715,8 +855,11 @@ class NtscApp(QtWidgets.QMainWindow, mainWindow.Ui_MainWindow):
         if frame2 is None:
             frame2 = frame1.copy()
 
-        self.current_frame = self.resize_to_preview_frame(frame1)
-        self.next_frame = self.resize_to_preview_frame(frame2)
+        self.show_current_frames(self.resize_to_preview_frame(frame1), self.resize_to_preview_frame(frame2))
+
+    def show_current_frames(self, frame1: ndarray, frame2: ndarray):
+        self.current_frame = frame1
+        self.next_frame = frame2
 
         self.nt_update_preview()
 
@@ -771,6 +914,8 @@ class NtscApp(QtWidgets.QMainWindow, mainWindow.Ui_MainWindow):
         self.videoMode = True
         self.videoTrackSlider.blockSignals(False)
         self.videoTrackSlider.show()
+        for button in self.rangeButtons:
+            button.show()
         self.pauseRenderButton.show()
         self.stopRenderButton.show()
         self.livePreviewCheckbox.show()
@@ -781,6 +926,8 @@ class NtscApp(QtWidgets.QMainWindow, mainWindow.Ui_MainWindow):
         self.videoMode = False
         self.videoTrackSlider.blockSignals(True)
         self.videoTrackSlider.hide()
+        for button in self.rangeButtons:
+            button.hide()
         self.pauseRenderButton.hide()
         self.stopRenderButton.hide()
         self.livePreviewCheckbox.hide()
@@ -811,8 +958,7 @@ class NtscApp(QtWidgets.QMainWindow, mainWindow.Ui_MainWindow):
         return values
 
     def nt_set_config(self, values: Dict[str, Union[int, float]]):
-        for parameter_name, value in values.items():
-            setattr(self.nt, parameter_name, value)
+        apply_parameters(self.nt, values)
 
         self.sync_nt_to_sliders()
     
@@ -838,7 +984,6 @@ class NtscApp(QtWidgets.QMainWindow, mainWindow.Ui_MainWindow):
         cap = cv2.VideoCapture(str(path.resolve()))
         logger.debug(f"cap: {cap} isOpened: {cap.isOpened()}")
         self.input_video = {
-            "cap": cap,
             "width": int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
             "height": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
             "frames_count": int(cap.get(cv2.CAP_PROP_FRAME_COUNT)),
@@ -848,6 +993,8 @@ class NtscApp(QtWidgets.QMainWindow, mainWindow.Ui_MainWindow):
         }
 
         self.check_interlaced(self.input_video["orig_fps"])
+        self.in_frame = None
+        self.out_frame = None
         
         if(self.interlaced):
             self.videoTrackSlider.setSingleStep(2)
@@ -863,13 +1010,14 @@ class NtscApp(QtWidgets.QMainWindow, mainWindow.Ui_MainWindow):
 
         logger.debug(f"selfinput: {self.input_video}")
         self.orig_wh = (int(self.input_video["width"]), int(self.input_video["height"]))
+        if self.frameServer is not None:
+            self.frameServer.close()
+        self.frameServer = PreviewFrameServer(cap)
+
         self.set_render_height(self.input_video["height"])
-        self.set_current_frames(*self.get_current_video_frames())
+        self.update_video_frames()
         self.videoTrackSlider.setMinimum(1)
         self.videoTrackSlider.setMaximum(self.input_video["frames_count"])
-        self.videoTrackSlider.valueChanged.connect(
-            lambda: self.set_current_frames(*self.get_current_video_frames())
-        )
         self.progressBar.setMaximum(self.framecount)
 
     def render_image(self):
@@ -881,7 +1029,9 @@ class NtscApp(QtWidgets.QMainWindow, mainWindow.Ui_MainWindow):
         image = cv2.resize(self.current_frame, crop_wh)
         if image.shape[1] % 4 != 0:
             image = trim_to_4width(image)
-        image = self.videoRenderer.apply_main_effect(self.nt, image, image, self.videoTrackSlider.value())
+        # a paused render still holds self.nt and its scratch arrays, the copy gets its own
+        nt = copy.deepcopy(self.nt, {id(self.nt.profiler): self.nt.profiler})
+        image = self.videoRenderer.apply_main_effect(nt, image, image, self.videoTrackSlider.value())
         is_success, im_buf_arr = cv2.imencode(".png", image)
         if not is_success:
             self.update_status("Error while saving (!is_success)")
@@ -903,7 +1053,9 @@ class NtscApp(QtWidgets.QMainWindow, mainWindow.Ui_MainWindow):
             "input_height": self.renderHeightBox.value(),
             "upscale_2x": self.NearestUpScale.isChecked(),
             "lossless": self.videoRenderer.lossless,
-            "framecount": self.framecount
+            "framecount": self.framecount,
+            "in_frame": self.in_frame,
+            "out_frame": self.out_frame,
         }
         self.setup_renderer()
         self.toggle_main_effect()
@@ -920,17 +1072,37 @@ class NtscApp(QtWidgets.QMainWindow, mainWindow.Ui_MainWindow):
             return None
 
         if not self.mainEffect:
+            self.previewTimer.stop()
+            self.previewSettleTimer.stop()
+            self.previewRenderer.cancel()
             self.render_preview(self.current_frame)
             return None
 
-        ntsc_out_image = self.videoRenderer.apply_main_effect(self.nt, self.current_frame, self.next_frame, self.videoTrackSlider.value())
+        # restarted on every change, the effect runs once the values settle for a moment
+        self.previewTimer.start()
 
-        if self.compareMode:
-            ntsc_out_image = numpy.concatenate(
-                (self.current_frame[:self.current_frame.shape[0] // 2], ntsc_out_image[ntsc_out_image.shape[0] // 2:])
-            )
+    def request_preview(self):
+        draft = self.draftPreview and self.current_frame.shape[0] > PREVIEW_DRAFT_HEIGHT
+        self.previewRenderer.request(
+            self.nt, self.current_frame, self.next_frame, self.videoTrackSlider.value(), self.compareMode,
+            draft_height=PREVIEW_DRAFT_HEIGHT if draft else None
+        )
+        if draft:
+            self.previewSettleTimer.start()
+        else:
+            self.previewSettleTimer.stop()
 
-        self.render_preview(ntsc_out_image)
+    def request_full_preview(self):
+        self.previewRenderer.request(
+            self.nt, self.current_frame, self.next_frame, self.videoTrackSlider.value(), self.compareMode
+        )
+
+    @QtCore.pyqtSlot(object, int)
+    def preview_ready(self, image: ndarray, generation: int):
+        # a newer request went out while this frame was queued
+        if generation != self.previewRenderer.generation:
+            return None
+        self.render_preview(image)
 
     def export_import_config(self):
         config = self.nt_get_config()
@@ -948,19 +1120,4 @@ class NtscApp(QtWidgets.QMainWindow, mainWindow.Ui_MainWindow):
 
     @QtCore.pyqtSlot(object)
     def render_preview(self, img: ndarray):
-        # https://stackoverflow.com/questions/41596940/qimage-skews-some-images-but-not-others
-
-        height, width, _ = img.shape
-        # calculate the total number of bytes in the frame
-        totalBytes = img.nbytes
-        # divide by the number of rows
-        bytesPerLine = int(totalBytes / height)
-
-        image = QtGui.QImage(img.tobytes(), width, height, bytesPerLine, QtGui.QImage.Format_RGB888) \
-            .rgbSwapped()
-
-        max_h = self.image_frame.height()
-        if height > max_h:
-            self.image_frame.setPixmap(QtGui.QPixmap.fromImage(image).scaledToHeight(max_h))
-        else:
-            self.image_frame.setPixmap(QtGui.QPixmap.fromImage(image))
+        self.image_frame.show_frame(img)
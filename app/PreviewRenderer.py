@@ -0,0 +1,100 @@
+import copy
+import threading
+from typing import Union
+
+import cv2
+import numpy
+from numpy import ndarray
+from PyQt5 import QtCore
+
+from app.logs import logger
+from app.ntsc import Ntsc, Workspace
+from app import render_core
+from app.preview_frames import resize_preview
+from app.stage_cache import StageCache
+
+# slider ticks closer together than this end up in one preview request
+PREVIEW_DEBOUNCE_MS = 20
+# draft previews render this many lines while the values are still changing
+PREVIEW_DRAFT_HEIGHT = 240
+# the full resolution preview follows once nothing changed for this long
+PREVIEW_SETTLE_MS = 300
+
+
+class PreviewRenderer(QtCore.QObject):
+    """
+    Renders the preview on a background thread. A new request replaces the one still waiting,
+    and a frame finished after a newer request came in is dropped, so the GUI thread only gets
+    frames for the latest parameters
+    """
+    frameReady = QtCore.pyqtSignal(object, int)
+
+    def __init__(self):
+        super().__init__()
+        self.generation = 0
+        self._pending = None
+        self._condition = threading.Condition()
+        # only touched by the render thread, consecutive previews of one frame share their early stages
+        self._stage_cache = StageCache()
+        # and the scratch arrays, the snapshots start with empty ones
+        self._workspace = Workspace()
+        # daemon thread, a preview still rendering never holds up closing the app
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def request(
+            self,
+            nt: Ntsc,
+            frame1: ndarray,
+            frame2: Union[ndarray, None],
+            frameno: int,
+            compare: bool,
+            draft_height: Union[int, None] = None
+    ):
+        """With `draft_height` the effect runs on frames scaled down to it, the result is scaled back up"""
+        # the snapshot keeps the render independent of sliders moved in the meantime
+        # one profile over all previews, the snapshot shares the profiler instead of copying it
+        snapshot = copy.deepcopy(nt, {id(nt.profiler): nt.profiler})
+        with self._condition:
+            self.generation += 1
+            self._pending = (self.generation, snapshot, frame1, frame2, frameno, compare, draft_height)
+            self._condition.notify()
+
+    def cancel(self):
+        """Drop the waiting request and whatever is rendering right now"""
+        with self._condition:
+            self.generation += 1
+            self._pending = None
+
+    def _loop(self):
+        while True:
+            with self._condition:
+                while self._pending is None:
+                    self._condition.wait()
+                generation, nt, frame1, frame2, frameno, compare, draft_height = self._pending
+                self._pending = None
+
+            nt.stage_cache = self._stage_cache
+            nt.workspace = self._workspace
+            try:
+                if draft_height is not None and frame1.shape[0] > draft_height:
+                    image = self._render_draft(nt, frame1, frame2, frameno, draft_height)
+                else:
+                    image = render_core.apply_main_effect(nt, frame1, frame2, frameno)
+            except Exception as e:
+                logger.exception(f'Preview render failed: {e}')
+                continue
+
+            if compare:
+                image = numpy.concatenate((frame1[:frame1.shape[0] // 2], image[image.shape[0] // 2:]))
+
+            if generation == self.generation:
+                self.frameReady.emit(image, generation)
+
+    @staticmethod
+    def _render_draft(nt: Ntsc, frame1: ndarray, frame2: Union[ndarray, None], frameno: int, height: int) -> ndarray:
+        small1 = resize_preview(frame1, height)
+        small2 = resize_preview(frame2, height) if frame2 is not None else None
+        nt.cutoff_scale = frame1.shape[1] / small1.shape[1]
+        image = render_core.apply_main_effect(nt, small1, small2, frameno)
+        return cv2.resize(image, (frame1.shape[1], frame1.shape[0]), interpolation=cv2.INTER_LINEAR)
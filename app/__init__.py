@@ -1,2 +1,11 @@
-from .NtscApp import NtscApp
 from .logs import logger
+
+
+def __getattr__(name):
+    # the GUI pulls in PyQt5, headless users of the package never touch it
+    if name == 'NtscApp':
+        from .NtscApp import NtscApp
+        # importing the submodule bound the module itself to this name, the class wins like before
+        globals()[name] = NtscApp
+        return NtscApp
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
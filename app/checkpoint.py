@@ -0,0 +1,199 @@
+import hashlib
+import json
+from pathlib import Path
+from typing import Callable, List, Tuple, Union
+
+import cv2
+from numpy import ndarray
+
+from app.logs import logger
+from app.ntsc import Ntsc
+from app.render_core import Config
+
+MANIFEST_NAME = 'manifest.json'
+
+# overwritten on every frame by update_chromaencoding, so not part of the look
+_volatile_params = {'_video_scanline_phase_shift_offset'}
+
+
+def config_hash(nt: Ntsc, config: Config, interlaced: bool, main_effect: bool) -> str:
+    params = {
+        name: value for name, value in vars(nt).items()
+        if name.startswith('_') and name not in _volatile_params
+    }
+    settings = {
+        "params": params,
+        "render_wh": config.get("render_wh"),
+        "container_wh": config.get("container_wh"),
+        "upscale_2x": config.get("upscale_2x"),
+        "frame_range": config.get("frame_range"),
+        # segment chunks and sequential chunks start at different frames, they don't mix
+        "segment_parallel": bool(config.get("segment_parallel")),
+        "interlaced": interlaced,
+        "main_effect": main_effect,
+    }
+    dump = json.dumps(settings, sort_keys=True, default=str)
+    return hashlib.sha1(dump.encode('utf-8')).hexdigest()
+
+
+def source_fingerprint(path: Path, sample_size: int = 1 << 20) -> str:
+    """Cheap identity of the input: size, mtime and a hash of its first megabyte"""
+    stat = path.stat()
+    digest = hashlib.sha1(f'{stat.st_size}:{stat.st_mtime_ns}'.encode('utf-8'))
+    with open(path, 'rb') as f:
+        digest.update(f.read(sample_size))
+    return digest.hexdigest()
+
+
+class RenderManifest:
+    """
+    Small json file next to the chunk files, tells a restarted render
+    which chunks are already done for the same source and settings
+    """
+
+    def __init__(self, chunk_dir: Path, config_hash: str, source: str):
+        self.chunk_dir = chunk_dir
+        self.config_hash = config_hash
+        self.source = source
+        self.chunks: List[dict] = []
+        self.segments: List[Tuple[int, int]] = []
+        # output frame the render starts at, non-zero for time-range renders
+        self.first_frame = 0
+        # size of the finished chunks, counted once per chunk
+        self.bytes_written = 0
+
+    @property
+    def path(self) -> Path:
+        return self.chunk_dir / MANIFEST_NAME
+
+    @property
+    def last_frame(self) -> int:
+        """Output frame number up to which every frame is in a finished chunk"""
+        last = self.first_frame
+        for chunk in sorted(self.chunks, key=lambda c: c["start"]):
+            if chunk["start"] != last:
+                break
+            last = chunk["end"]
+        return last
+
+    @classmethod
+    def open(cls, chunk_dir: Path, config_hash: str, source: str, first_frame: int = 0) -> "RenderManifest":
+        """Load the manifest of a previous run if it matches, otherwise start a fresh one"""
+        manifest = cls(chunk_dir, config_hash, source)
+        manifest.first_frame = first_frame
+        try:
+            with open(manifest.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = None
+
+        if data and data.get("config_hash") == config_hash and data.get("source") == source:
+            manifest.chunks = [
+                chunk for chunk in data.get("chunks", [])
+                if (chunk_dir / chunk["file"]).exists()
+            ]
+            for chunk in manifest.chunks:
+                if "bytes" not in chunk:
+                    chunk["bytes"] = manifest._chunk_bytes(chunk["file"])
+            manifest.bytes_written = sum(chunk["bytes"] for chunk in manifest.chunks)
+            manifest.segments = [tuple(segment) for segment in data.get("segments", [])]
+            logger.info(f'Resuming render from {chunk_dir}, {len(manifest.chunks)} chunks done')
+        elif data:
+            logger.info(f'Settings or source changed, discarding chunks in {chunk_dir}')
+            for chunk in data.get("chunks", []):
+                (chunk_dir / chunk["file"]).unlink(missing_ok=True)
+
+        chunk_dir.mkdir(parents=True, exist_ok=True)
+        return manifest
+
+    def chunk_path(self, start: int) -> Path:
+        """Chunks are named after their first output frame"""
+        return self.chunk_dir / f'chunk_{start:08d}.mkv'
+
+    def is_done(self, start: int) -> bool:
+        name = self.chunk_path(start).name
+        return any(chunk["file"] == name for chunk in self.chunks)
+
+    def add_chunk(self, start: int, end: int):
+        name = self.chunk_path(start).name
+        self.chunks = [chunk for chunk in self.chunks if chunk["file"] != name]
+        chunk = {"file": name, "start": start, "end": end, "bytes": self._chunk_bytes(name)}
+        self.chunks.append(chunk)
+        self.bytes_written = sum(chunk["bytes"] for chunk in self.chunks)
+        self.save()
+
+    def _chunk_bytes(self, name: str) -> int:
+        try:
+            return (self.chunk_dir / name).stat().st_size
+        except OSError:
+            return 0
+
+    def chunk_files(self) -> List[Path]:
+        return [self.chunk_dir / chunk["file"] for chunk in sorted(self.chunks, key=lambda c: c["start"])]
+
+    def joinable_files(self) -> List[Path]:
+        """Chunks from the first frame up to `last_frame`, the ones after a gap are left out"""
+        last_frame = self.last_frame
+        return [
+            self.chunk_dir / chunk["file"] for chunk in sorted(self.chunks, key=lambda c: c["start"])
+            if chunk["end"] <= last_frame
+        ]
+
+    def discard_from(self, start: int):
+        """Forget and delete the chunks starting at or after `start`"""
+        dropped = [chunk for chunk in self.chunks if chunk["start"] >= start]
+        if not dropped:
+            return
+        for chunk in dropped:
+            (self.chunk_dir / chunk["file"]).unlink(missing_ok=True)
+        self.chunks = [chunk for chunk in self.chunks if chunk["start"] < start]
+        self.bytes_written = sum(chunk["bytes"] for chunk in self.chunks)
+        self.save()
+
+    def save(self):
+        data = {
+            "config_hash": self.config_hash,
+            "source": self.source,
+            "last_frame": self.last_frame,
+            "segments": self.segments,
+            "chunks": self.chunks,
+        }
+        tmp_path = self.path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2)
+        # replace in one step, a crash never leaves a half written manifest
+        tmp_path.replace(self.path)
+
+
+class ChunkWriter:
+    """
+    Drop-in for cv2.VideoWriter that rolls over to a new chunk file every `chunk_frames`
+    frames and checkpoints each finished chunk in the manifest
+    """
+
+    def __init__(self, manifest: RenderManifest, open_writer: Callable[[Path], cv2.VideoWriter], chunk_frames: int):
+        self.manifest = manifest
+        self.open_writer = open_writer
+        self.chunk_frames = chunk_frames
+        self.frameno = manifest.last_frame
+        # chunks past a gap would overlap the ones written from here
+        manifest.discard_from(self.frameno)
+        self._writer: Union[cv2.VideoWriter, None] = None
+        self._start = self.frameno
+
+    def write(self, frame: ndarray):
+        if self._writer is None:
+            self._start = self.frameno
+            self._writer = self.open_writer(self.manifest.chunk_path(self._start))
+        self._writer.write(frame)
+        self.frameno += 1
+        if self.frameno - self._start >= self.chunk_frames:
+            self.release()
+
+    def release(self):
+        if self._writer is None:
+            return
+        self._writer.release()
+        self._writer = None
+        if self.frameno > self._start:
+            self.manifest.add_chunk(self._start, self.frameno)
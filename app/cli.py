@@ -0,0 +1,197 @@
+"""
+Headless renderer, no PyQt5 needed:
+
+    python -m app.cli render in.mp4 out.mkv --preset preset.json --height 480 --workers 16
+
+Presets are the JSON exported by the config dialog.
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import cv2
+
+from app.logs import logger, add_sink, remove_sink, stderr_handler
+from app.ntsc import apply_parameters, random_ntsc
+from app.render_job import RenderJob
+from app.render_metrics import MetricsWriter
+from app.render_trace import RenderTrace
+from app.stage_profiler import StageProfiler
+
+
+class ProgressPrinter:
+    """Throughput and ETA on one status line, redrawn at most every `interval` seconds"""
+
+    def __init__(self, job: RenderJob, stream=sys.stderr, interval: float = 0.5):
+        self.job = job
+        self.stream = stream
+        self.interval = interval
+        self.frames = 0
+        self.started = time.perf_counter()
+        self._printed = 0.0
+
+    @property
+    def fps(self) -> float:
+        elapsed = time.perf_counter() - self.started
+        return self.frames / elapsed if elapsed > 0 else 0.0
+
+    def frame_done(self, frames: int = 1):
+        self.frames += frames
+        now = time.perf_counter()
+        if now - self._printed >= self.interval:
+            self._printed = now
+            self.print_line()
+
+    def print_line(self):
+        done = self.job.resumed_frames + self.frames
+        total = max(self.job.framecount, done)
+        fps = self.fps
+        eta = (total - done) / fps if fps > 0 else 0
+        self.stream.write(
+            f'\r{done}/{total} frames  {fps:.2f} fps  ETA {int(eta) // 60:02d}:{int(eta) % 60:02d} '
+        )
+        self.stream.flush()
+
+    def finish(self):
+        self.print_line()
+        self.stream.write('\n')
+
+
+def load_preset(path: Path) -> dict:
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def input_video_info(path: Path) -> dict:
+    cap = cv2.VideoCapture(str(path.resolve()))
+    if not cap.isOpened():
+        raise ValueError(f'Can not open {path}')
+    info = {
+        "width": int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+        "height": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+        "frames_count": int(cap.get(cv2.CAP_PROP_FRAME_COUNT)),
+        "orig_fps": cap.get(cv2.CAP_PROP_FPS),
+        "path": path,
+        "suffix": path.suffix.lower(),
+    }
+    cap.release()
+    return info
+
+
+def render(args) -> int:
+    input_video = input_video_info(args.input)
+
+    nt = random_ntsc(args.seed)
+    nt._enable_ringing2 = True
+    if args.preset:
+        apply_parameters(nt, load_preset(args.preset))
+
+    if args.trace and (args.profile or args.profile_allocations):
+        print('--trace already records every effect stage, it can not be combined with --profile', file=sys.stderr)
+        return 2
+    if args.profile or args.profile_allocations:
+        nt.profiler = StageProfiler(allocations=args.profile_allocations)
+
+    job = RenderJob()
+    if args.trace:
+        job.trace = RenderTrace()
+    # same rule as the GUI, 50 fps and up is treated as interlaced fields
+    job.interlaced = input_video["orig_fps"] >= 50
+    step = 2 if job.interlaced else 1
+    job.render_data = {
+        "target_file": args.output,
+        "nt": nt,
+        "input_video": input_video,
+        "input_height": args.height or input_video["height"],
+        "upscale_2x": args.upscale_2x,
+        "lossless": args.lossless,
+        "framecount": -(-input_video["frames_count"] // step),
+        "workers": args.workers,
+        "segment_parallel": args.segments,
+        "audio_process": args.process_audio,
+        "in_frame": args.in_frame,
+        "out_frame": args.out_frame,
+    }
+
+    progress = ProgressPrinter(job)
+    job.increment_progress.connect(progress.frame_done)
+    job.sendStatus.connect(lambda status: logger.debug(f'[STATUS] {status}'))
+    metrics = MetricsWriter(args.metrics) if args.metrics else None
+    if metrics is not None:
+        job.metricsUpdated.connect(metrics.write)
+
+    try:
+        written = job.run()
+    except KeyboardInterrupt:
+        progress.finish()
+        print('Interrupted, run the same command again to resume', file=sys.stderr)
+        return 130
+    finally:
+        if metrics is not None:
+            metrics.close()
+        # an interrupted render is written too, a stall is what it is usually wanted for
+        if job.trace is not None:
+            job.trace.write(args.trace)
+    progress.finish()
+
+    if job.trace is not None:
+        print(f'Trace written to {args.trace}, open it in https://ui.perfetto.dev', file=sys.stderr)
+    elif nt.profiler is not None:
+        print(nt.profiler.table(), file=sys.stderr)
+    if not written:
+        print('Nothing rendered', file=sys.stderr)
+        return 1
+    elapsed = time.perf_counter() - progress.started
+    print(f'Rendered {progress.frames} frames in {elapsed:.1f} s ({progress.fps:.2f} fps) to {args.output}')
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='python -m app.cli', description='Headless ntscQT renderer')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    render_parser = commands.add_parser('render', help='render a video file')
+    render_parser.add_argument('input', type=Path)
+    render_parser.add_argument('output', type=Path)
+    render_parser.add_argument('--preset', type=Path, help='JSON exported by the config dialog')
+    render_parser.add_argument('--seed', type=int, default=18, help='preset seed the parameters start from')
+    render_parser.add_argument('--height', type=int, help='render height, input height by default')
+    render_parser.add_argument('--workers', type=int, default=1, help='render processes')
+    render_parser.add_argument('--segments', action='store_true',
+                               help='render keyframe segments in parallel instead of single frames')
+    render_parser.add_argument('--upscale-2x', action='store_true', help='nearest neighbour 2x upscale')
+    render_parser.add_argument('--lossless', action='store_true', help='keep the FFV1 video (use a .mkv output)')
+    render_parser.add_argument('--process-audio', action='store_true', help='apply the VHS audio filter')
+    render_parser.add_argument('--in-frame', type=int, help='first input frame to render')
+    render_parser.add_argument('--out-frame', type=int, help='input frame to stop before')
+    render_parser.add_argument('--metrics', type=Path,
+                               help='append throughput metrics as JSON lines to this file while rendering')
+    render_parser.add_argument('--profile', action='store_true',
+                               help='print the time spent in every effect stage after the render')
+    render_parser.add_argument('--profile-allocations', action='store_true',
+                               help='like --profile, with the memory each stage allocates (much slower)')
+    render_parser.add_argument('--trace', type=Path,
+                               help='write a timeline of the render as Trace Event Format JSON (Perfetto, chrome://tracing)')
+    render_parser.add_argument('-v', '--verbose', action='store_true', help='debug log on stderr')
+    render_parser.set_defaults(func=render)
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+
+    # the default stderr sink would mix debug lines into the progress line
+    remove_sink(stderr_handler)
+    add_sink(sys.stderr, level='DEBUG' if args.verbose else 'WARNING', diagnose=args.verbose)
+
+    try:
+        return args.func(args)
+    except Exception:
+        logger.exception('Render failed')
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
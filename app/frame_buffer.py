@@ -0,0 +1,119 @@
+import queue
+import threading
+from typing import Tuple, Union
+
+import cv2
+import numpy
+from numpy import ndarray
+
+from app.render_trace import RenderTrace
+
+# decoder read-ahead budget, the number of frames follows from the resolution
+DEFAULT_PREFETCH_BYTES = 256 * 1024 * 1024
+
+
+class FrameBuffer:
+    """
+    Fixed number of preallocated frames addressed by frame index.
+    Index `i` always lives in slot `i % slots`, storing it overwrites whatever that slot held before
+    """
+
+    def __init__(self, slots: int, shape: Tuple[int, int, int]):
+        self.slots = slots
+        self._frames = numpy.empty((slots, *shape), dtype=numpy.uint8)
+        self._indices = [None] * slots
+
+    def __getitem__(self, index: int) -> Union[ndarray, None]:
+        slot = index % self.slots
+        if self._indices[slot] != index:
+            return None
+        return self._frames[slot]
+
+    def __setitem__(self, index: int, frame: Union[ndarray, None]):
+        slot = index % self.slots
+        if frame is None:
+            self._indices[slot] = None
+            return
+        target = self._frames[slot]
+        if frame is not target:
+            numpy.copyto(target, frame)
+        self._indices[slot] = index
+
+    def slot(self, index: int) -> ndarray:
+        """Storage for `index`, to decode straight into it before storing"""
+        slot = index % self.slots
+        self._indices[slot] = None
+        return self._frames[slot]
+
+    def clear(self):
+        self._indices = [None] * self.slots
+
+
+class BufferedVideoStream:
+    """
+    Decodes a video in a background thread into a pool of preallocated frames.
+    The pool is sized from a byte budget, so read-ahead memory stays the same for any resolution
+    """
+
+    def __init__(self, path: str, prefetch_bytes: int = DEFAULT_PREFETCH_BYTES, trace: RenderTrace = None):
+        self.stream = cv2.VideoCapture(path)
+        self.trace = trace
+        width = int(self.stream.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(self.stream.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        self.depth = max(2, prefetch_bytes // max(1, width * height * 3))
+
+        self._frames = numpy.empty((self.depth, height, width, 3), dtype=numpy.uint8)
+        self._free = queue.Queue()
+        for slot in range(self.depth):
+            self._free.put(slot)
+        self._ready = queue.Queue()
+        self._ended = False
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._update, daemon=True)
+
+    def start(self) -> "BufferedVideoStream":
+        self._thread.start()
+        return self
+
+    def _update(self):
+        while not self._stopped.is_set():
+            try:
+                slot = self._free.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if self.trace is None:
+                ret, _ = self.stream.read(self._frames[slot])
+            else:
+                with self.trace.span('decode', input_frame=int(self.stream.get(cv2.CAP_PROP_POS_FRAMES))):
+                    ret, _ = self.stream.read(self._frames[slot])
+            if not ret:
+                self._ready.put(None)
+                return
+            self._ready.put(slot)
+
+    @property
+    def buffered(self) -> int:
+        """Decoded frames waiting to be read"""
+        return self._ready.qsize()
+
+    def read(self, dst: ndarray = None) -> Union[ndarray, None]:
+        """Next frame copied into `dst` (or a new array), None once the video ended"""
+        if self._ended:
+            return None
+        slot = self._ready.get()
+        if slot is None:
+            self._ended = True
+            return None
+
+        if dst is None:
+            dst = self._frames[slot].copy()
+        else:
+            numpy.copyto(dst, self._frames[slot])
+        self._free.put(slot)
+        return dst
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        self.stream.release()
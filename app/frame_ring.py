@@ -0,0 +1,99 @@
+import time
+import traceback
+from multiprocessing import shared_memory
+from typing import Tuple
+
+import numpy
+from numpy import ndarray
+
+from app.ntsc import Ntsc
+from app.render_control import RenderControl
+from app.render_core import Config, render_frame
+
+FrameShape = Tuple[int, int, int]
+
+
+class FrameRing:
+    """
+    Fixed number of frame slots living in one shared memory block.
+
+    Every slot holds an input pair (current frame and next frame, as read by the decoder)
+    and one output frame written by a worker, so only slot indices travel over the queues.
+    """
+
+    def __init__(self, slots: int, in_shape: FrameShape, out_shape: FrameShape, name: str = None):
+        self.slots = slots
+        self.in_shape = (2, *in_shape)
+        self.out_shape = tuple(out_shape)
+        self._in_bytes = int(numpy.prod(self.in_shape))
+        self._out_bytes = int(numpy.prod(self.out_shape))
+        self._slot_bytes = self._in_bytes + self._out_bytes
+
+        self.owner = name is None
+        if self.owner:
+            self.shm = shared_memory.SharedMemory(create=True, size=self._slot_bytes * slots)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+
+        self._inputs = []
+        self._outputs = []
+        for slot in range(slots):
+            offset = slot * self._slot_bytes
+            self._inputs.append(
+                ndarray(self.in_shape, dtype=numpy.uint8, buffer=self.shm.buf, offset=offset)
+            )
+            self._outputs.append(
+                ndarray(self.out_shape, dtype=numpy.uint8, buffer=self.shm.buf, offset=offset + self._in_bytes)
+            )
+
+    @property
+    def spec(self):
+        """Everything a worker needs to attach to this ring (picklable)"""
+        return self.slots, self.in_shape[1:], self.out_shape, self.shm.name
+
+    @classmethod
+    def attach(cls, spec) -> "FrameRing":
+        slots, in_shape, out_shape, name = spec
+        return cls(slots, in_shape, out_shape, name=name)
+
+    def input(self, slot: int) -> ndarray:
+        return self._inputs[slot]
+
+    def output(self, slot: int) -> ndarray:
+        return self._outputs[slot]
+
+    def close(self):
+        # views must go before the mapping can be closed
+        self._inputs = []
+        self._outputs = []
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def render_worker(ring_spec, nt: Ntsc, config: Config, main_effect: bool, tasks, results, control: RenderControl = None):
+    """
+    Worker process loop: takes (slot, frameno) from `tasks`, renders the slot input pair
+    into the slot output and reports (slot, frameno, error, seconds, what the profiler recorded) back on `results`.
+    Waits while `control` is paused and quits once it is stopped
+    """
+    ring = FrameRing.attach(ring_spec)
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            slot, frameno = task
+            if control is not None and not control.wait_resumed():
+                break
+            started = time.perf_counter()
+            try:
+                pair = ring.input(slot)
+                frame = render_frame(nt, pair[0], pair[1], frameno, config, main_effect)
+                ring.output(slot)[:] = frame
+                recorded = nt.profiler.take() if nt.profiler is not None else None
+                results.put((slot, frameno, None, time.perf_counter() - started, recorded))
+            except Exception:
+                results.put((slot, frameno, traceback.format_exc(), 0.0, None))
+    finally:
+        ring.close()
@@ -1,6 +1,96 @@
+"""
+Log sinks are set up from the environment, no need to edit this file:
+
+    NTSCQT_LOG_LEVEL        level of the stderr sink, DEBUG by default
+    NTSCQT_LOG_FILE         log file of the main process, ntscqt_last_debug_log.log by default, empty for none
+    NTSCQT_LOG_FILE_LEVEL   level of the log file, DEBUG by default
+    NTSCQT_LOG_SAMPLE       hot paths log only every n-th of their messages, 100 by default
+"""
+import math
+import multiprocessing
+import os
 import sys
+from collections import Counter
 
 from loguru import logger
 
-logger.add("ntscqt_last_debug_log.log", enqueue=True, mode='w')
+DEFAULT_LOG_FILE = "ntscqt_last_debug_log.log"
+
+# handler id -> level number, hot paths skip everything below the lowest of them
+_sink_levels = {}
+_min_level = math.inf
+_TRACE = logger.level('TRACE').no
+_DEBUG = logger.level('DEBUG').no
+
+
+def _update_min_level():
+    global _min_level
+    _min_level = min(_sink_levels.values(), default=math.inf)
+
+
+def add_sink(sink, level: str = 'DEBUG', **kwargs) -> int:
+    """logger.add that the hot path loggers know about"""
+    handler = logger.add(sink, level=level, **kwargs)
+    _sink_levels[handler] = logger.level(level).no
+    _update_min_level()
+    return handler
+
+
+def remove_sink(handler: int = None):
+    """logger.remove, all sinks without a `handler`"""
+    logger.remove(handler)
+    if handler is None:
+        _sink_levels.clear()
+    else:
+        _sink_levels.pop(handler, None)
+    _update_min_level()
+
+
+def level_enabled(level: str) -> bool:
+    return logger.level(level).no >= _min_level
+
+
+class SampledLogger:
+    """
+    Logger for code that runs every frame or on every slider move. A call below the level of all sinks
+    returns before anything gets formatted, otherwise only every `every`-th call per message is logged.
+    Arguments are formatted into the message by loguru, pass them instead of an f-string
+    """
+
+    def __init__(self, every: int = 100):
+        self.every = max(1, every)
+        self._calls = Counter()
+
+    def log(self, level: str, message: str, *args, **kwargs):
+        if logger.level(level).no >= _min_level:
+            self._emit(level, message, args, kwargs)
+
+    def trace(self, message: str, *args, **kwargs):
+        if _TRACE >= _min_level:
+            self._emit('TRACE', message, args, kwargs)
+
+    def debug(self, message: str, *args, **kwargs):
+        if _DEBUG >= _min_level:
+            self._emit('DEBUG', message, args, kwargs)
+
+    def _emit(self, level: str, message: str, args: tuple, kwargs: dict):
+        calls = self._calls[message]
+        self._calls[message] = calls + 1
+        if calls % self.every:
+            return
+        if calls:
+            message = f'{message} [{calls + 1} calls]'
+        # the record points at the caller, not at this class
+        logger.opt(depth=2).log(level, message, *args, **kwargs)
+
+
+# replaces loguru's own stderr sink, so its level is known too
+remove_sink()
+stderr_handler = add_sink(sys.stderr, level=os.environ.get("NTSCQT_LOG_LEVEL", "DEBUG"))
+
+_log_file = os.environ.get("NTSCQT_LOG_FILE", DEFAULT_LOG_FILE)
+# spawned render workers import this as well, they must not truncate the log of the main process
+if _log_file and multiprocessing.parent_process() is None:
+    add_sink(_log_file, level=os.environ.get("NTSCQT_LOG_FILE_LEVEL", "DEBUG"), enqueue=True, mode='w')
 
+hot_logger = SampledLogger(int(os.environ.get("NTSCQT_LOG_SAMPLE", 100)))
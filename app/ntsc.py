@@ -2,26 +2,45 @@ import math
 import random
 import sys
 from enum import IntEnum
+from functools import lru_cache
 from pathlib import Path
-from typing import List, Union
+from typing import Dict, List, Union
 
 import numpy
-from scipy.signal import lfilter, lfiltic
-from scipy.ndimage.interpolation import shift
 
-import cv2
+from app.logs import hot_logger, logger
+
+# scipy.signal and cv2 are imported where they are used, importing this module stays cheap
+# for worker processes and headless runs, the first frame pays for them
 
 M_PI = math.pi
 
 Int_MIN_VALUE = -2147483648
 Int_MAX_VALUE = 2147483647
 
-ring_pattern_real_path = 'app/ringPattern.npy'
+ring_pattern_path = Path(__file__).parent / 'ringPattern.npy'
 if getattr(sys, 'frozen', False):
-    ring_pattern_real_path = f'{sys._MEIPASS}/app/ringPattern.npy'
+    ring_pattern_path = Path(f'{sys._MEIPASS}/app/ringPattern.npy')
+
+
+@lru_cache(maxsize=1)
+def ring_pattern() -> numpy.ndarray:
+    return numpy.load(str(ring_pattern_path.resolve()))
+
+
+def __getattr__(name):
+    # RingPattern used to be loaded at import time
+    if name == 'RingPattern':
+        return ring_pattern()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-ring_pattern_path = Path(ring_pattern_real_path)
-RingPattern = numpy.load(str(ring_pattern_path.resolve()))
+
+def shift_right(samples: numpy.ndarray, out: Union[numpy.ndarray, None] = None) -> numpy.ndarray:
+    """Samples moved one place to the right with a zero in front, same as scipy.ndimage.shift(samples, 1)"""
+    shifted = numpy.empty_like(samples) if out is None else out
+    shifted[0] = 0
+    shifted[1:] = samples[:-1]
+    return shifted
 
 
 def ringing(img2d, alpha=0.5, noiseSize=0, noiseValue=2, clip=True, seed=None):
@@ -33,6 +52,8 @@ def ringing(img2d, alpha=0.5, noiseSize=0, noiseValue=2, clip=True, seed=None):
     :param noiseValue: float, noise amplitude  (0-5) optimal values  is 0.5-2
     :return: 2d image
     """
+    import cv2
+
     dft = cv2.dft(numpy.float32(img2d), flags=cv2.DFT_COMPLEX_OUTPUT)
     dft_shift = numpy.fft.fftshift(dft)
 
@@ -66,13 +87,15 @@ def ringing2(img2d, power=4, shift=0, clip=True):
     :param power: int, ringing parrern poser (optimal 2 - 6)
     :return: 2d image
     """
+    import cv2
+
     dft = cv2.dft(numpy.float32(img2d), flags=cv2.DFT_COMPLEX_OUTPUT)
     dft_shift = numpy.fft.fftshift(dft)
 
     rows, cols = img2d.shape
 
     scalecols = int(cols * (1 + shift))
-    mask = cv2.resize(RingPattern[numpy.newaxis, :], (scalecols, 1), interpolation=cv2.INTER_LINEAR)[0]
+    mask = cv2.resize(ring_pattern()[numpy.newaxis, :], (scalecols, 1), interpolation=cv2.INTER_LINEAR)[0]
 
     mask = mask[(scalecols // 2) - (cols // 2):(scalecols // 2) + (cols // 2)]
     mask = mask ** power
@@ -105,40 +128,145 @@ class NumpyRandom:
     def nextIntArray(self, size: int, _from: int = Int_MIN_VALUE, until: int = Int_MAX_VALUE) -> numpy.ndarray:
         return self.rnd.randint(_from, until, size, dtype=numpy.int32)
 
-# interleaved uint8 HWC BGR to -> planar int32 CHW YIQ
-def bgr2yiq(bgrimg: numpy.ndarray) -> numpy.ndarray:
-    planar = numpy.transpose(bgrimg, (2, 0, 1))
-    b, g, r = planar
-    dY = 0.30 * r + 0.59 * g + 0.11 * b
+class Workspace:
+    """
+    Scratch arrays of an Ntsc, reused by every composite_layer call instead of allocated per field.
+    An array is found by name, shape and dtype, so every frame size gets its own set, and the least
+    recently used ones are dropped past `max_bytes`. Arrays used since `start_frame` are never dropped,
+    a frame too large for the cap keeps its arrays anyway. A new array is zeros, after that it holds whatever
+    its last user left in it. Copies and pickles of a workspace start empty. Not thread safe, an Ntsc
+    rendered on another thread at the same time needs its own copy
+    """
+
+    def __init__(self, max_bytes: int = 512 * 2 ** 20):
+        self.max_bytes = max_bytes
+        self._arrays: Dict[tuple, numpy.ndarray] = {}
+        self._bytes = 0
+        self._frame_keys = set()
+        self._warned = False
+
+    def __getstate__(self):
+        # a preview snapshot or a worker process allocates its own arrays
+        return {'max_bytes': self.max_bytes}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    @property
+    def nbytes(self) -> int:
+        return self._bytes
+
+    def get(self, name: str, shape: tuple, dtype=numpy.int32) -> numpy.ndarray:
+        key = (name, tuple(shape), numpy.dtype(dtype))
+        array = self._arrays.pop(key, None)
+        if array is None:
+            array = numpy.zeros(shape, dtype)
+            self._bytes += array.nbytes
+        # most recently used last, so the arrays of the current frame come after all others
+        self._arrays[key] = array
+        self._frame_keys.add(key)
+        if self._bytes > self.max_bytes:
+            self._drop_unused()
+        return array
+
+    def start_frame(self):
+        self._frame_keys.clear()
+
+    def _drop_unused(self):
+        for key in list(self._arrays):
+            if self._bytes <= self.max_bytes:
+                return
+            if key in self._frame_keys:
+                break
+            self._bytes -= self._arrays.pop(key).nbytes
+            hot_logger.debug('Workspace dropped {} {} {}', *key)
+        if not self._warned:
+            self._warned = True
+            logger.warning(
+                f'One frame needs {self._bytes / 2 ** 20:.0f} MiB of scratch arrays, '
+                f'more than the {self.max_bytes / 2 ** 20:.0f} MiB workspace cap, they are kept anyway'
+            )
+
+    def clear(self):
+        self._arrays.clear()
+        self._bytes = 0
+        self._frame_keys.clear()
+
+
+# rows converted or filtered at a time, keeps the float64 scratch and temporaries in cache
+_STRIP_ROWS = 32
+
+
+def _strips(lines: int) -> List[slice]:
+    return [slice(top, top + _STRIP_ROWS) for top in range(0, lines, _STRIP_ROWS)]
 
-    Y = (dY * 256).astype(numpy.int32)
-    I = (256 * (-0.27 * (b - dY) + 0.74 * (r - dY))).astype(numpy.int32)
-    Q = (256 * (0.41 * (b - dY) + 0.48 * (r - dY))).astype(numpy.int32)
-    return numpy.stack([Y, I, Q], axis=0).astype(numpy.int32)
+
+# interleaved uint8 HWC BGR to -> planar int32 CHW YIQ
+def bgr2yiq(bgrimg: numpy.ndarray, workspace: Union[Workspace, None] = None) -> numpy.ndarray:
+    """With a workspace the result is one of its arrays, valid until the next call"""
+    workspace = workspace if workspace is not None else Workspace()
+    h, w, _ = bgrimg.shape
+    yiq = workspace.get('yiq', (3, h, w), numpy.int32)
+    strip = (min(h, _STRIP_ROWS), w)
+    dY, bY, rY, tmp = (workspace.get(name, strip, numpy.float64) for name in ('dY', 'b-dY', 'r-dY', 'bgr2yiq'))
+    for top in range(0, h, _STRIP_ROWS):
+        n = min(_STRIP_ROWS, h - top)
+        b, g, r = numpy.transpose(bgrimg[top:top + n], (2, 0, 1))
+        Y, I, Q = yiq[:, top:top + n]
+        d, bd, rd, t = dY[:n], bY[:n], rY[:n], tmp[:n]
+        # the operations of the original expressions in the same order, the result is bit identical
+        # dY = 0.30 * r + 0.59 * g + 0.11 * b
+        numpy.multiply(r, 0.30, out=d)
+        d += numpy.multiply(g, 0.59, out=t)
+        d += numpy.multiply(b, 0.11, out=t)
+        # Y = dY * 256
+        Y[:] = numpy.multiply(d, 256, out=t)
+        numpy.subtract(b, d, out=bd)
+        numpy.subtract(r, d, out=rd)
+        # I = 256 * (-0.27 * (b - dY) + 0.74 * (r - dY))
+        numpy.multiply(bd, -0.27, out=d)
+        d += numpy.multiply(rd, 0.74, out=t)
+        d *= 256
+        I[:] = d
+        # Q = 256 * (0.41 * (b - dY) + 0.48 * (r - dY))
+        bd *= 0.41
+        bd += numpy.multiply(rd, 0.48, out=t)
+        bd *= 256
+        Q[:] = bd
+    return yiq
 
 
 # one field of planar int32 CHW YIQ -> one field of interleaved uint8 HWC BGR to
-def yiq2bgr(yiq: numpy.ndarray, dst_bgr: Union[numpy.ndarray, None] = None, field: int = 0) -> numpy.ndarray:
+def yiq2bgr(yiq: numpy.ndarray, dst_bgr: Union[numpy.ndarray, None] = None, field: int = 0,
+            workspace: Union[Workspace, None] = None) -> numpy.ndarray:
+    """
+    Without `dst_bgr` the float64 BGR goes to an array of the workspace, its lines of the other field
+    stay zero. It is valid until the next call for the same field and frame size
+    """
+    workspace = workspace if workspace is not None else Workspace()
     c, h, w = yiq.shape
-    dst_bgr = dst_bgr if dst_bgr is not None else numpy.zeros((h, w, c))
+    if dst_bgr is None:
+        dst_bgr = workspace.get(f'bgr field {field}', (h, w, c), numpy.float64)
     Y, I, Q = yiq
     if field == 0:
-        Y, I, Q = Y[::2], I[::2], Q[::2]
-    else:
-        Y, I, Q = Y[1::2], I[1::2], Q[1::2]
-
-    r = ((1.000 * Y + 0.956 * I + 0.621 * Q) / 256).astype(numpy.int32)
-    g = ((1.000 * Y + -0.272 * I + -0.647 * Q) / 256).astype(numpy.int32)
-    b = ((1.000 * Y + -1.106 * I + 1.703 * Q) / 256).astype(numpy.int32)
-    r = numpy.clip(r, 0, 255)
-    g = numpy.clip(g, 0, 255)
-    b = numpy.clip(b, 0, 255)
-    planarBGR = numpy.stack([b, g, r])
-    interleavedBGR = numpy.transpose(planarBGR, (1, 2, 0))
-    if field == 0:
-        dst_bgr[::2] = interleavedBGR
+        Y, I, Q, dst = Y[::2], I[::2], Q[::2], dst_bgr[::2]
     else:
-        dst_bgr[1::2] = interleavedBGR
+        Y, I, Q, dst = Y[1::2], I[1::2], Q[1::2], dst_bgr[1::2]
+
+    fh = Y.shape[0]
+    acc, tmp = (workspace.get(name, (min(fh, _STRIP_ROWS), w), numpy.float64) for name in ('yiq2bgr', 'yiq2bgr tmp'))
+    for top in range(0, fh, _STRIP_ROWS):
+        n = min(_STRIP_ROWS, fh - top)
+        rows = slice(top, top + n)
+        a, t = acc[:n], tmp[:n]
+        # r, g, b = ((1.000 * Y + i * I + q * Q) / 256).astype(numpy.int32) clipped to 0..255
+        for channel, i, q in ((2, 0.956, 0.621), (1, -0.272, -0.647), (0, -1.106, 1.703)):
+            numpy.multiply(Y[rows], 1.000, out=a)
+            a += numpy.multiply(I[rows], i, out=t)
+            a += numpy.multiply(Q[rows], q, out=t)
+            a /= 256
+            numpy.trunc(a, out=a)
+            dst[rows, :, channel] = numpy.clip(a, 0, 255, out=a)
     return dst_bgr
 
 def cut_black_line_border(image: numpy.ndarray, bordersize: int = None) -> numpy.ndarray:
@@ -152,43 +280,45 @@ def cut_black_line_border(image: numpy.ndarray, bordersize: int = None) -> numpy
     return image
 
 
-def composite_lowpass(yiq: numpy.ndarray, field: int, fieldno: int):
+# the filters run along a strip of lines of a field at once, the same as line by line
+def composite_lowpass(yiq: numpy.ndarray, field: int, fieldno: int, cutoff_scale: float = 1.0):
     _, height, width = yiq.shape
     fY, fI, fQ = yiq
     for p in range(1, 3):
-        cutoff = 1300000.0 if p == 1 else 600000.0
+        cutoff = (1300000.0 if p == 1 else 600000.0) * cutoff_scale
         delay = 2 if (p == 1) else 4
         P = fI if (p == 1) else fQ
         P = P[field::2]
-        for i, f in enumerate(P):
+        for lines in _strips(P.shape[0]):
+            f = lowpassFilter(P[lines], cutoff, reset=0.0)
             f = lowpassFilter(f, cutoff, reset=0.0)
             f = lowpassFilter(f, cutoff, reset=0.0)
-            f = lowpassFilter(f, cutoff, reset=0.0)
-            P[i, 0:width - delay] = f.astype(numpy.int32)[delay:]
+            P[lines, 0:width - delay] = f[:, delay:]
 
 
 # lighter-weight filtering, probably what your old CRT does to reduce color fringes a bit
-def composite_lowpass_tv(yiq: numpy.ndarray, field: int, fieldno: int):
+def composite_lowpass_tv(yiq: numpy.ndarray, field: int, fieldno: int, cutoff_scale: float = 1.0):
     _, height, width = yiq.shape
     fY, fI, fQ = yiq
+    cutoff = 2600000.0 * cutoff_scale
     for p in range(1, 3):
         delay = 1
         P = fI if (p == 1) else fQ
         P = P[field::2]
-        for i, f in enumerate(P):
-            f = lowpassFilter(f, 2600000.0, reset=0.0)
-            f = lowpassFilter(f, 2600000.0, reset=0.0)
-            f = lowpassFilter(f, 2600000.0, reset=0.0)
-            P[i, 0:width - delay] = f.astype(numpy.int32)[delay:]
+        for lines in _strips(P.shape[0]):
+            f = lowpassFilter(P[lines], cutoff, reset=0.0)
+            f = lowpassFilter(f, cutoff, reset=0.0)
+            f = lowpassFilter(f, cutoff, reset=0.0)
+            P[lines, 0:width - delay] = f[:, delay:]
 
 
 def composite_preemphasis(yiq: numpy.ndarray, field: int, composite_preemphasis: float,
                           composite_preemphasis_cut: float):
     fY, fI, fQ = yiq
     fields = fY[field::2]
-    for i, samples in enumerate(fields):
-        filtered = samples + highpassFilter(samples, composite_preemphasis_cut, 16.0) * composite_preemphasis
-        fields[i] = filtered.astype(numpy.int32)
+    for lines in _strips(fields.shape[0]):
+        samples = fields[lines]
+        samples[:] = samples + highpassFilter(samples, composite_preemphasis_cut, 16.0) * composite_preemphasis
 
 
 # Needs to be an IntEnum so it can be saved in JSON
@@ -198,7 +328,6 @@ class VHSSpeed(IntEnum):
     VHS_EP = 2
 
     def __init__(self, num: int):
-        print(num)
         self.luma_cut, self.chroma_cut, self.chroma_delay = [
             (2400000.0, 320000.0, 9),
             (1900000.0, 300000.0, 12),
@@ -206,6 +335,33 @@ class VHSSpeed(IntEnum):
         ][num]
 
 
+# composite_layer stages in the order they run, with the parameters each one reads.
+# Parameters missing here (and the frame itself) are inputs of every stage
+COMPOSITE_STAGES = (
+    ('color_bleed_before', ('_color_bleed_before', '_color_bleed_vert', '_color_bleed_horiz')),
+    ('composite_in_chroma_lowpass', ('_composite_in_chroma_lowpass',)),
+    ('ringing', ('_ringing', '_enable_ringing2', '_ringing_power', '_ringing_shift',
+                 '_freq_noise_size', '_freq_noise_amplitude')),
+    ('chroma_into_luma', ('_subcarrier_amplitude', '_video_scanline_phase_shift',
+                          '_video_scanline_phase_shift_offset')),
+    ('composite_preemphasis', ('_composite_preemphasis', '_composite_preemphasis_cut')),
+    ('video_noise', ('_video_noise',)),
+    ('vhs_head_switching', ('_vhs_head_switching', '_head_switching_speed', '_vhs_head_switching_phase',
+                            '_vhs_head_switching_phase_noise', '_output_ntsc')),
+    ('chroma_from_luma', ('_nocolor_subcarrier', '_subcarrier_amplitude_back', '_video_scanline_phase_shift',
+                          '_video_scanline_phase_shift_offset')),
+    ('video_chroma_noise', ('_video_chroma_noise',)),
+    ('video_chroma_phase_noise', ('_video_chroma_phase_noise',)),
+    ('emulate_vhs', ('_emulating_vhs', '_output_vhs_tape_speed', '_vhs_edge_wave', '_vhs_tracking_noise',
+                     '_vhs_chroma_vert_blend', '_output_ntsc', '_vhs_out_sharpen', '_vhs_svideo_out',
+                     '_subcarrier_amplitude', '_video_scanline_phase_shift', '_video_scanline_phase_shift_offset')),
+    ('vhs_chroma_loss', ('_video_chroma_loss',)),
+    ('composite_out_chroma_lowpass', ('_composite_out_chroma_lowpass', '_composite_out_chroma_lowpass_lite')),
+    ('color_bleed_after', ('_color_bleed_before', '_color_bleed_vert', '_color_bleed_horiz')),
+    ('blur_chroma', ()),
+)
+
+
 class Ntsc:
     # https://en.wikipedia.org/wiki/NTSC
     FS = 315000000.00 / 88
@@ -220,6 +376,18 @@ class Ntsc:
         self.precise = precise
 
         self.random = random
+        # python-side randomness of the tracking glitches, reseeded per frame in composite_layer
+        self.tracking_random = None
+        # StageCache reused between composite_layer calls, set by the preview only
+        self.stage_cache = None
+        # opt-in StageProfiler, times every composite_layer stage that runs. Render workers send
+        # what theirs recorded back with take(), the main process adds it with extend()
+        self.profiler = None
+        # > 1 when rendering narrower than the output (draft preview), keeps the filters
+        # at the same fraction of the picture width
+        self.cutoff_scale = 1.0
+        # scratch arrays of composite_layer, allocated on the first frame of every size
+        self.workspace = Workspace()
 
         # Seed to use when generating random noise
         self._noise_seed = 0
@@ -286,8 +454,11 @@ class Ntsc:
         fh, fw = fields.shape
         if not self.precise:  # this one works FAST
             rnds = self.rand_array(fw * fh) % noise_mod - video_noise
-            noises = shift(lfilter([0.5], [1, -0.5], rnds).astype(numpy.int32), 1)
-            fields += noises.reshape(fields.shape)
+            from scipy.signal import lfilter
+
+            noises = self.workspace.get('noise', fields.shape, numpy.int32)
+            shift_right(lfilter([0.5], [1, -0.5], rnds), out=noises.reshape(-1))
+            fields += noises
         else:  # this one works EXACTLY like original code
             noise = 0
             for field1 in fields:
@@ -306,14 +477,13 @@ class Ntsc:
         V = fQ[field::2]
         fh, fw = U.shape
         if not self.precise:
-            rndsU = self.rand_array(fw * fh) % noise_mod - video_chroma_noise
-            noisesU = shift(lfilter([0.5], [1, -0.5], rndsU).astype(numpy.int32), 1)
-
-            rndsV = self.rand_array(fw * fh) % noise_mod - video_chroma_noise
-            noisesV = shift(lfilter([0.5], [1, -0.5], rndsV).astype(numpy.int32), 1)
+            from scipy.signal import lfilter
 
-            U += noisesU.reshape(U.shape)
-            V += noisesV.reshape(V.shape)
+            noises = self.workspace.get('noise', U.shape, numpy.int32)
+            for P in (U, V):
+                rnds = self.rand_array(fw * fh) % noise_mod - video_chroma_noise
+                shift_right(lfilter([0.5], [1, -0.5], rnds), out=noises.reshape(-1))
+                P += noises
         else:
             noiseU = 0
             noiseV = 0
@@ -335,16 +505,19 @@ class Ntsc:
         V = fQ[field::2]
         fh, fw = U.shape
         noise = 0
+        sinpi = numpy.empty((fh, 1))
+        cospi = numpy.empty((fh, 1))
         for y in range(0, fh):
             noise += self.rand() % noise_mod - video_chroma_phase_noise
             noise = int(noise / 2)
             pi = noise * M_PI / 100
-            sinpi = math.sin(pi)
-            cospi = math.cos(pi)
-            u = U[y] * cospi - V[y] * sinpi
-            v = U[y] * sinpi + V[y] * cospi
-            U[y, :] = u
-            V[y, :] = v
+            sinpi[y] = math.sin(pi)
+            cospi[y] = math.cos(pi)
+        for rows in _strips(fh):
+            u = U[rows] * cospi[rows] - V[rows] * sinpi[rows]
+            v = U[rows] * sinpi[rows] + V[rows] * cospi[rows]
+            U[rows] = u
+            V[rows] = v
 
     def vhs_head_switching(self, yiq: numpy.ndarray, field: int, frameno: int):
         _, height, width = yiq.shape
@@ -407,106 +580,117 @@ class Ntsc:
         else:
             return int(self._video_scanline_phase_shift_offset & 3)
 
+    def _chroma_luma_xis(self, field: int, fieldno: int, height: int) -> numpy.ndarray:
+        """_chroma_luma_xi of every line of the field"""
+        return numpy.array([self._chroma_luma_xi(fieldno, y) for y in range(field, height, 2)], dtype=numpy.intp)
+
     def encode_composite_level(self, array: numpy.ndarray):
         arrayMax = (256.0 * 256.0)
-        ar = array.astype(numpy.float32) / arrayMax
+        ar = array.astype(numpy.float32)
+        ar /= arrayMax
         interp = numpy.interp(ar, (0.0, 1.0), (Ntsc.BLACK_LEVEL, 1.0))
-        return (interp * arrayMax).astype(numpy.int32)
+        interp *= arrayMax
+        return interp.astype(numpy.int32)
+
     def decode_composite_level(self, array: numpy.ndarray):
         arrayMax = (256.0 * 256.0)
-        ar = array.astype(numpy.float32) / arrayMax
+        ar = array.astype(numpy.float32)
+        ar /= arrayMax
         interp = numpy.interp(ar, (Ntsc.BLACK_LEVEL, 1.0), (0.0, 1.0))
-        return (interp * arrayMax).astype(numpy.int32)
-    
+        interp *= arrayMax
+        return interp.astype(numpy.int32)
+
+    # the lines of a field together, each with the subcarrier phase of its own xi
     def chroma_into_luma(self, yiq: numpy.ndarray, field: int, fieldno: int, subcarrier_amplitude: int, frame: int = 0):
         _, height, width = yiq.shape
         fY, fI, fQ = yiq
-        y = field
-        
-        umult = numpy.tile(Ntsc._Umult, int((width / 4) + 1))
-        vmult = numpy.tile(Ntsc._Vmult, int((width / 4) + 1))
+        Y, I, Q = fY[field::2], fI[field::2], fQ[field::2]
+        xis = self._chroma_luma_xis(field, fieldno, height)
 
-        while y < height:
-            Y = fY[y]
-            I = fI[y]
-            Q = fQ[y]
+        umult_lines, vmult_lines, _ = _subcarrier_lines(width)
+        umult = numpy.take(umult_lines, xis, axis=0, out=self.workspace.get('umult', Y.shape, numpy.int32))
+        vmult = numpy.take(vmult_lines, xis, axis=0, out=self.workspace.get('vmult', Y.shape, numpy.int32))
 
-            xi = self._chroma_luma_xi(fieldno, y)
+        for rows in _strips(Y.shape[0]):
+            chroma = I[rows] * subcarrier_amplitude
+            chroma *= umult[rows]
+            vchroma = Q[rows] * subcarrier_amplitude
+            vchroma *= vmult[rows]
+            chroma += vchroma
 
-            chroma = I * subcarrier_amplitude * umult[xi:xi + width]
-            chroma += Q * subcarrier_amplitude * vmult[xi:xi + width]
+            chroma = chroma.astype(numpy.int32, copy=False)
+            chroma //= 50
+            Y[rows] += chroma
+            Y[rows] = self.encode_composite_level(Y[rows])
 
-            Y[:] = Y + chroma.astype(numpy.int32) // 50
-            Y[:] = self.encode_composite_level(Y)
-
-            I[:] = 0
-            Q[:] = 0
-            
-            y += 2
+        I[:] = 0
+        Q[:] = 0
 
     def chroma_from_luma(self, yiq: numpy.ndarray, field: int, fieldno: int, subcarrier_amplitude: int):
-        
         _, height, width = yiq.shape
         fY, fI, fQ = yiq
-
-        chroma = numpy.zeros(width, dtype=numpy.int32)
-        blackLine = numpy.zeros(width, dtype=numpy.int32)
-
-        umult = numpy.tile(Ntsc._Umult, int((width / 4) + 1))
-        vmult = numpy.tile(Ntsc._Vmult, int((width / 4) + 1))
-
-        clpbuffer = [[numpy.zeros(width, dtype=numpy.int32)] * height] * 2
-
-        arrayMax = (256.0 * 256.0)
-
-        for y in range(field, height, 2):
-            Y = fY[y]
-            I = fI[y]
-            Q = fQ[y]
-
-            floatY = Y.astype(numpy.float32) / arrayMax
-
-            Y[:] = self.decode_composite_level(Y)
-
-            xi = self._chroma_luma_xi(fieldno, y)
-            
-            # 1D comb (blurry)
-            sum: int = Y[0] + Y[1]
-            y2 = numpy.pad(Y[2:], (0, 2))
-            yd4 = numpy.pad(Y[:-2], (2, 0))
-            sums = y2 - yd4
-            sums0 = numpy.concatenate([numpy.array([sum], dtype=numpy.int32), sums])
-            acc = numpy.add.accumulate(sums0, dtype=numpy.int32)[1:]
-            acc4 = acc // 4
-
-            chroma = y2 - acc4
-            Y[:] = acc4
-
-            # TBA: 2D adaptive comb
-
-            # Extract I and Q from chroma
-            x = 4 - xi & 3
-            # // flip the part of the sine wave that would correspond to negative U and V values
-            chroma[x + 2::4] = -chroma[x + 2::4]
-            chroma[x + 3::4] = -chroma[x + 3::4]
-
-            chroma = (chroma * 50 / subcarrier_amplitude)
-
-            # decode the color right back out from the subcarrier we generated
-            cxi = -chroma[xi::2]
-            cxi1 = -chroma[xi + 1::2]
-            I[::2] = numpy.pad(cxi, (0, width // 2 - cxi.shape[0]))
-            Q[::2] = numpy.pad(cxi1, (0, width // 2 - cxi1.shape[0]))
-
-            I[1:width - 2:2] = (I[:width - 2:2] + I[2::2]) >> 1
-            Q[1:width - 2:2] = (Q[:width - 2:2] + Q[2::2]) >> 1
-            I[width - 2:] = 0
-            Q[width - 2:] = 0
+        Y, I, Q = fY[field::2], fI[field::2], fQ[field::2]
+        lines = Y.shape[0]
+        if lines == 0:
+            return
+        workspace = self.workspace
+
+        for rows in _strips(lines):
+            Y[rows] = self.decode_composite_level(Y[rows])
+
+        xis = self._chroma_luma_xis(field, fieldno, height)
+
+        # 1D comb (blurry), per line:
+        # y2 = Y shifted 2 to the left, acc = running sum of [Y[0] + Y[1], y2 - Y shifted 2 to the right]
+        y2 = workspace.get('y2', Y.shape, Y.dtype)
+        y2[:, :width - 2] = Y[:, 2:]
+        y2[:, width - 2:] = 0
+        acc = workspace.get('comb', (lines, width + 1), Y.dtype)
+        numpy.add(Y[:, 0], Y[:, 1], out=acc[:, 0])
+        acc[:, 1:3] = y2[:, :2]
+        numpy.subtract(y2[:, 2:], Y[:, :width - 2], out=acc[:, 3:])
+        numpy.add.accumulate(acc, axis=1, dtype=numpy.int32, out=acc)
+        acc4 = acc[:, 1:]
+        acc4 //= 4
+
+        chroma = numpy.subtract(y2, acc4, out=y2)
+        Y[:] = acc4
+
+        # TBA: 2D adaptive comb
+
+        # Extract I and Q from chroma
+        # flip the part of the sine wave that would correspond to negative U and V values
+        _, _, flip_lines = _subcarrier_lines(width)
+        chroma *= numpy.take(flip_lines, xis, axis=0, out=workspace.get('flip', Y.shape, numpy.int32))
+
+        chroma *= 50
+        # the decoded chroma with zeros past the end of every line, where a line's samples run out
+        decoded = workspace.get('decoded', (lines, width + 4), numpy.float64)
+        numpy.true_divide(chroma, subcarrier_amplitude, out=decoded[:, :width])
+        decoded[:, width:] = 0
+
+        # decode the color right back out from the subcarrier we generated:
+        # the even samples of I are -chroma[xi::2] and of Q -chroma[xi + 1::2], zero padded
+        samples = I[:, ::2].shape[1]
+        indices = workspace.get('decoded indices', (lines, samples), numpy.intp)
+        numpy.add((numpy.arange(lines) * (width + 4) + xis)[:, None], numpy.arange(0, samples * 2, 2), out=indices)
+        even = workspace.get('decoded even', (lines, samples), numpy.float64)
+        for P in (I, Q):
+            numpy.take(decoded.reshape(-1), indices, out=even)
+            P[:, ::2] = numpy.negative(even, out=even)
+            indices += 1
+
+        I[:, 1:width - 2:2] = (I[:, :width - 2:2] + I[:, 2::2]) >> 1
+        Q[:, 1:width - 2:2] = (Q[:, :width - 2:2] + Q[:, 2::2]) >> 1
+        I[:, width - 2:] = 0
+        Q[:, width - 2:] = 0
 
     def vhs_luma_lowpass(self, yiq: numpy.ndarray, field: int, luma_cut: float):
         _, height, width = yiq.shape
         fY, fI, fQ = yiq
-        for Y in fY[field::2]:
+        fields = fY[field::2]
+        for lines in _strips(fields.shape[0]):
+            Y = fields[lines]
             f0 = lowpassFilter(Y, cutoff=luma_cut, reset=16.0)
             f1 = lowpassFilter(f0, cutoff=luma_cut, reset=16.0)
             f2 = lowpassFilter(f1, cutoff=luma_cut, reset=16.0)
@@ -516,19 +700,13 @@ class Ntsc:
     def vhs_chroma_lowpass(self, yiq: numpy.ndarray, field: int, chroma_cut: float, chroma_delay: int):
         _, height, width = yiq.shape
         fY, fI, fQ = yiq
-        for U in fI[field::2]:
-            f0 = lowpassFilter(U, cutoff=chroma_cut, reset=0.0)
-            f1 = lowpassFilter(f0, cutoff=chroma_cut, reset=0.0)
-            f2 = lowpassFilter(f1, cutoff=chroma_cut, reset=0.0)
+        for P in (fI[field::2], fQ[field::2]):
+            for lines in _strips(P.shape[0]):
+                f0 = lowpassFilter(P[lines], cutoff=chroma_cut, reset=0.0)
+                f1 = lowpassFilter(f0, cutoff=chroma_cut, reset=0.0)
+                f2 = lowpassFilter(f1, cutoff=chroma_cut, reset=0.0)
 
-            U[:width - chroma_delay] = f2[chroma_delay:]
-
-        for V in fQ[field::2]:
-            f0 = lowpassFilter(V, cutoff=chroma_cut, reset=0.0)
-            f1 = lowpassFilter(f0, cutoff=chroma_cut, reset=0.0)
-            f2 = lowpassFilter(f1, cutoff=chroma_cut, reset=0.0)
-
-            V[:width - chroma_delay] = f2[chroma_delay:]
+                P[lines, :width - chroma_delay] = f2[:, chroma_delay:]
 
     # VHS decks also vertically smear the chroma subcarrier using a delay line
     # to add the previous line's color subcarrier to the current line's color subcarrier.
@@ -538,22 +716,28 @@ class Ntsc:
     def vhs_chroma_vert_blend(self, yiq: numpy.ndarray, field: int):
         _, height, width = yiq.shape
         fY, fI, fQ = yiq
-        U2 = fI[field + 2::2, ]
-        V2 = fQ[field + 2::2, ]
-        delayU = numpy.pad(U2[:-1, ], [[1, 0], [0, 0]])
-        delayV = numpy.pad(V2[:-1, ], [[1, 0], [0, 0]])
-        fI[field + 2::2, ] = (delayU + U2 + 1) >> 1
-        fQ[field + 2::2, ] = (delayV + V2 + 1) >> 1
+        if fI[field + 2::2, ].shape[0] == 0:
+            return
+        for P in (fI[field + 2::2, ], fQ[field + 2::2, ]):
+            # (the line before, zeros for the first, + the line + 1) >> 1
+            blend = self.workspace.get('vert blend', P.shape, P.dtype)
+            blend[0] = 0
+            blend[1:] = P[:-1]
+            blend += P
+            blend += 1
+            blend >>= 1
+            P[:] = blend
 
     def vhs_sharpen(self, yiq: numpy.ndarray, field: int, luma_cut: float):
         _, height, width = yiq.shape
         fY, fI, fQ = yiq
-        for Y in fY[field::2]:
-            s = Y
-            ts = lowpassFilter(Y, cutoff=luma_cut * 4, reset=0.0)
+        fields = fY[field::2]
+        for lines in _strips(fields.shape[0]):
+            s = fields[lines]
+            ts = lowpassFilter(s, cutoff=luma_cut * 4, reset=0.0)
             ts = lowpassFilter(ts, cutoff=luma_cut * 4, reset=0.0)
             ts = lowpassFilter(ts, cutoff=luma_cut * 4, reset=0.0)
-            Y[:] = (s + (s - ts) * self._vhs_out_sharpen * 2.0)
+            s[:] = (s + (s - ts) * self._vhs_out_sharpen * 2.0)
 
     # http://www.michaeldvd.com.au/Articles/VideoArtefacts/VideoArtefactsColourBleeding.html
     # https://bavc.github.io/avaa/artifacts/yc_delay_error.html
@@ -561,13 +745,16 @@ class Ntsc:
         _, height, width = yiq.shape
         fY, fI, fQ = yiq
 
-        field_ = fI[field::2]
-        h, w = field_.shape
-        fI[field::2] = numpy.pad(field_, ((self._color_bleed_vert, 0), (self._color_bleed_horiz, 0)))[0:h, 0:w]
-
-        field_ = fQ[field::2]
-        h, w = field_.shape
-        fQ[field::2] = numpy.pad(field_, ((self._color_bleed_vert, 0), (self._color_bleed_horiz, 0)))[0:h, 0:w]
+        vert, horiz = self._color_bleed_vert, self._color_bleed_horiz
+        for field_ in (fI[field::2], fQ[field::2]):
+            # moved down and right, zeros coming in
+            h, w = field_.shape
+            if vert < h and horiz < w:
+                kept = self.workspace.get('bleed', (h - vert, w - horiz), field_.dtype)
+                kept[:] = field_[:h - vert, :w - horiz]
+                field_[vert:, horiz:] = kept
+            field_[:vert] = 0
+            field_[:, :horiz] = 0
 
     def vhs_edge_wave(self, yiq: numpy.ndarray, field: int):
         _, height, width = yiq.shape
@@ -575,26 +762,23 @@ class Ntsc:
         rnds = self.random.nextIntArray(height // 2, 0, self._vhs_edge_wave)
         rnds = lowpassFilter(rnds, self._output_vhs_tape_speed.luma_cut, 0.0).astype(numpy.int32)
 
-        for y, Y in enumerate(fY[field::2]):
-            if rnds[y] != 0:
-                shift = rnds[y]
-                Y[:] = numpy.pad(Y, (shift, 0))[:-shift]
-        for y, I in enumerate(fI[field::2]):
-            if rnds[y] != 0:
+        # lines moved right, zeros coming in. With an odd height the first field has one line more
+        # than there are offsets, that line stays in place
+        for P in (fY[field::2], fI[field::2], fQ[field::2]):
+            for y in numpy.flatnonzero(rnds[:P.shape[0]]):
                 shift = rnds[y]
-                I[:] = numpy.pad(I, (shift, 0))[:-shift]
-        for y, Q in enumerate(fQ[field::2]):
-            if rnds[y] != 0:
-                shift = rnds[y]
-                Q[:] = numpy.pad(Q, (shift, 0))[:-shift]
+                if shift < width:
+                    P[y, shift:] = P[y, :width - shift]
+                P[y, :shift] = 0
     
     def vhs_tracking_error_mini(self, channel: numpy.ndarray, mult: int = 32768):
         width = channel.shape[0]
 
-        startx = random.Random().randint(0, width)
+        rnd = self.tracking_random or random.Random()
+        startx = rnd.randint(0, width)
 
-        multsub = random.Random().uniform(0.85, 0.9)
-        reverse = bool(random.getrandbits(1))
+        multsub = rnd.uniform(0.85, 0.9)
+        reverse = bool(rnd.getrandbits(1))
 
         x = 0
         add = 0
@@ -618,12 +802,13 @@ class Ntsc:
             pI = fI[y]
             pQ = fQ[y]
             if self.rand() % 100000 < amount:
-                startx = random.Random().randint(0, width)
+                rnd = self.tracking_random or random.Random()
+                startx = rnd.randint(0, width)
 
                 mult = 32768
-                reverse = bool(random.getrandbits(1))
+                reverse = bool(rnd.getrandbits(1))
 
-                multsub = random.Random().uniform(0.85, 0.9)
+                multsub = rnd.uniform(0.85, 0.9)
                 x = 0
                 add = 0
                 while x < width:
@@ -651,20 +836,21 @@ class Ntsc:
 
     def emulate_vhs(self, yiq: numpy.ndarray, field: int, fieldno: int):
         vhs_speed = self._output_vhs_tape_speed
+        luma_cut = vhs_speed.luma_cut * self.cutoff_scale
         if self._vhs_edge_wave != 0:
             self.vhs_edge_wave(yiq, field)
 
-        self.vhs_luma_lowpass(yiq, field, vhs_speed.luma_cut)
+        self.vhs_luma_lowpass(yiq, field, luma_cut)
 
         self.vhs_tracking_error(yiq, field, self._vhs_tracking_noise)
 
-        self.vhs_chroma_lowpass(yiq, field, vhs_speed.chroma_cut, vhs_speed.chroma_delay)
+        self.vhs_chroma_lowpass(yiq, field, vhs_speed.chroma_cut * self.cutoff_scale, vhs_speed.chroma_delay)
 
         if self._vhs_chroma_vert_blend and self._output_ntsc:
             self.vhs_chroma_vert_blend(yiq, field)
 
         if True:  # TODO: make option
-            self.vhs_sharpen(yiq, field, vhs_speed.luma_cut)
+            self.vhs_sharpen(yiq, field, luma_cut)
 
         if not self._vhs_svideo_out:
             self.chroma_into_luma(yiq, field, fieldno, self._subcarrier_amplitude)
@@ -678,75 +864,98 @@ class Ntsc:
         frame_dependent = self.random.nextInt()
         seed = (frame_dependent ^ self._noise_seed) & 0x7fffffff
         self.random.seed(seed)
+        # absolute frame number fully determines the noise, so frames rendered by separate
+        # workers or segments are identical to a sequential render
+        self.tracking_random = random.Random(seed)
+        # the first field starts a frame, the arrays of both fields stay in the workspace
+        if field == 0:
+            self.workspace.start_frame()
 
         ogw, ogh, channel = src.shape
 
         self.fs = (30000.0 / 1001.0) * float(525) * float(ogw) * (858.0 / 760.0)
 
-        if self._black_line_cut:
-            src = cut_black_line_border(src.copy())
-
-        yiq = bgr2yiq(src)
-
-        if self._color_bleed_before and (self._color_bleed_vert != 0 or self._color_bleed_horiz != 0):
-            self.color_bleed(yiq, field)
-
-        if self._composite_in_chroma_lowpass:
-            composite_lowpass(yiq, field, fieldno)
+        stages = self._composite_stages(field, fieldno, frameno, seed)
+        profiler = self.profiler
+        if profiler is not None:
+            stages = profiler.wrap([name for name, _ in COMPOSITE_STAGES], stages, field)
 
-        if self._ringing != 1.0:
-            self.ringing(yiq, field, seed)
-
-        self.chroma_into_luma(yiq, field, fieldno, self._subcarrier_amplitude)
-
-        if self._composite_preemphasis != 0.0 and self._composite_preemphasis_cut > 0:
-            composite_preemphasis(yiq, field, self._composite_preemphasis, self._composite_preemphasis_cut)
-
-        if self._video_noise != 0:
-            self.video_noise(yiq, field, self._video_noise)
-
-        if self._vhs_head_switching:
-            self.vhs_head_switching(yiq, field, frameno)
-
-        if not self._nocolor_subcarrier:
-            self.chroma_from_luma(yiq, field, fieldno, self._subcarrier_amplitude_back)
-
-        if self._video_chroma_noise != 0:
-            self.video_chroma_noise(yiq, field, self._video_chroma_noise)
-
-        if self._video_chroma_phase_noise != 0:
-            self.video_chroma_phase_noise(yiq, field, self._video_chroma_phase_noise)
-
-        if self._emulating_vhs:
-            self.emulate_vhs(yiq, field, fieldno)
-
-        if self._video_chroma_loss != 0:
-            self.vhs_chroma_loss(yiq, field, self._video_chroma_loss)
-
-        if self._composite_out_chroma_lowpass:
-            if self._composite_out_chroma_lowpass_lite:
-                composite_lowpass_tv(yiq, field, fieldno)
+        if self.stage_cache is not None:
+            yiq = self.stage_cache.run(self, src, field, fieldno, frameno, stages)
+        else:
+            if profiler is not None:
+                yiq = profiler.measure('bgr2yiq', field, self._composite_input, src)
             else:
-                composite_lowpass(yiq, field, fieldno)
-
-        if not self._color_bleed_before and (self._color_bleed_vert != 0 or self._color_bleed_horiz != 0):
-            self.color_bleed(yiq, field)
+                yiq = self._composite_input(src)
+            for enabled, apply in stages:
+                if enabled:
+                    apply(yiq)
 
-        #if self._ringing != 1.0:
-        #    self.ringing(yiq, field, seed)
+        if profiler is not None:
+            return profiler.measure('yiq2bgr', field, yiq2bgr, yiq, None, 0, self.workspace)
+        return yiq2bgr(yiq, workspace=self.workspace)
 
+    def _composite_input(self, src: numpy.ndarray) -> numpy.ndarray:
+        if self._black_line_cut:
+            copy = self.workspace.get('black line cut', src.shape, src.dtype)
+            copy[:] = src
+            src = cut_black_line_border(copy)
+        return bgr2yiq(src, self.workspace)
+
+    def _composite_stages(self, field: int, fieldno: int, frameno: int, seed: int):
+        """(enabled, apply) of every COMPOSITE_STAGES entry, apply works on the yiq in place"""
+        color_bleed = self._color_bleed_vert != 0 or self._color_bleed_horiz != 0
+        out_chroma_lowpass = composite_lowpass_tv if self._composite_out_chroma_lowpass_lite else composite_lowpass
+        return [
+            (self._color_bleed_before and color_bleed,
+             lambda yiq: self.color_bleed(yiq, field)),
+            (self._composite_in_chroma_lowpass,
+             lambda yiq: composite_lowpass(yiq, field, fieldno, self.cutoff_scale)),
+            (self._ringing != 1.0,
+             lambda yiq: self.ringing(yiq, field, seed)),
+            (True,
+             lambda yiq: self.chroma_into_luma(yiq, field, fieldno, self._subcarrier_amplitude)),
+            (self._composite_preemphasis != 0.0 and self._composite_preemphasis_cut > 0,
+             lambda yiq: composite_preemphasis(yiq, field, self._composite_preemphasis,
+                                               self._composite_preemphasis_cut * self.cutoff_scale)),
+            (self._video_noise != 0,
+             lambda yiq: self.video_noise(yiq, field, self._video_noise)),
+            (self._vhs_head_switching,
+             lambda yiq: self.vhs_head_switching(yiq, field, frameno)),
+            (not self._nocolor_subcarrier,
+             lambda yiq: self.chroma_from_luma(yiq, field, fieldno, self._subcarrier_amplitude_back)),
+            (self._video_chroma_noise != 0,
+             lambda yiq: self.video_chroma_noise(yiq, field, self._video_chroma_noise)),
+            (self._video_chroma_phase_noise != 0,
+             lambda yiq: self.video_chroma_phase_noise(yiq, field, self._video_chroma_phase_noise)),
+            (self._emulating_vhs,
+             lambda yiq: self.emulate_vhs(yiq, field, fieldno)),
+            (self._video_chroma_loss != 0,
+             lambda yiq: self.vhs_chroma_loss(yiq, field, self._video_chroma_loss)),
+            (self._composite_out_chroma_lowpass,
+             lambda yiq: out_chroma_lowpass(yiq, field, fieldno, self.cutoff_scale)),
+            (not self._color_bleed_before and color_bleed,
+             lambda yiq: self.color_bleed(yiq, field)),
+            # simulate 2x less bandwidth for chroma components, just like yuv420
+            (True,
+             lambda yiq: self._blur_chroma_field(yiq, field)),
+        ]
+
+    def _blur_chroma_field(self, yiq: numpy.ndarray, field: int):
         Y, I, Q = yiq
-
-        # simulate 2x less bandwidth for chroma components, just like yuv420
         I[field::2] = self._blur_chroma(I[field::2])
         Q[field::2] = self._blur_chroma(Q[field::2])
 
-        return yiq2bgr(yiq)
-
     def _blur_chroma(self, chroma: numpy.ndarray) -> numpy.ndarray:
+        """The blurred chroma as float32, an array of the workspace"""
+        import cv2
+
         h, w = chroma.shape
-        down2 = cv2.resize(chroma.astype(numpy.float32), (w // 2, h // 2), interpolation=cv2.INTER_LANCZOS4)
-        return cv2.resize(down2, (w, h), interpolation=cv2.INTER_LANCZOS4).astype(numpy.int32)
+        chroma32 = self.workspace.get('blur', (h, w), numpy.float32)
+        chroma32[:] = chroma
+        down2 = self.workspace.get('blur half', (h // 2, w // 2), numpy.float32)
+        cv2.resize(chroma32, (w // 2, h // 2), dst=down2, interpolation=cv2.INTER_LANCZOS4)
+        return cv2.resize(down2, (w, h), dst=chroma32, interpolation=cv2.INTER_LANCZOS4)
 
     def ringing(self, yiq: numpy.ndarray, field: int, seed: int):
         Y, I, Q = yiq
@@ -795,15 +1004,45 @@ def random_ntsc(seed=None) -> Ntsc:
     ntsc._color_bleed_vert = int(rnd.triangular(0, 8, 0))
     return ntsc
 
+@lru_cache(maxsize=8)
+def _subcarrier_lines(width: int):
+    """(U multipliers, V multipliers, chroma signs to flip back) of a line starting at phase xi, row xi"""
+    umult = numpy.tile(Ntsc._Umult, width // 4 + 2)
+    vmult = numpy.tile(Ntsc._Vmult, width // 4 + 2)
+    flip = numpy.ones((4, width), dtype=numpy.int32)
+    for xi in range(4):
+        x = 4 - xi & 3
+        flip[xi, x + 2::4] = -1
+        flip[xi, x + 3::4] = -1
+    return (
+        numpy.stack([umult[xi:xi + width] for xi in range(4)]),
+        numpy.stack([vmult[xi:xi + width] for xi in range(4)]),
+        flip,
+    )
+
+
+def apply_parameters(nt: Ntsc, values: dict):
+    """Sets parameters from a preset, the plain ints it stores for enum parameters become enums again"""
+    for parameter_name, value in values.items():
+        current = getattr(nt, parameter_name, None)
+        if isinstance(current, IntEnum) and not isinstance(value, IntEnum):
+            value = type(current)(value)
+        setattr(nt, parameter_name, value)
+
+
 def lowpassFilter(samples: numpy.ndarray, cutoff: float, reset: float, rate: float = Ntsc.NTSC_RATE) -> numpy.ndarray:
     timeInterval = 1.0 / rate
     tau = 1 / (cutoff * 2.0 * M_PI)
     alpha = timeInterval / (tau + timeInterval)
 
+    from scipy.signal import lfilter, lfiltic
+
     if reset == 0.0:
         return lfilter([alpha], [1, -(1.0 - alpha)], samples)
     else:
         ic = lfiltic([alpha], [1, -(1.0 - alpha)], [reset])
+        # the same initial condition for every line when filtering several at once
+        ic = numpy.broadcast_to(ic, samples.shape[:-1] + ic.shape)
         return lfilter([alpha], [1, -(1.0 - alpha)], samples, zi=ic)[0]
 
 def highpassFilter(samples: numpy.ndarray, cutoff: float, reset: float, rate: float = Ntsc.NTSC_RATE) -> numpy.ndarray:
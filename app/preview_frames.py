@@ -0,0 +1,128 @@
+import threading
+from collections import OrderedDict
+from typing import Tuple, Union
+
+import cv2
+from numpy import ndarray
+
+from app.funcs import resize_to_height, trim_to_4width
+
+# decoded preview frames kept around for scrubbing
+DEFAULT_CACHE_BYTES = 256 * 1024 * 1024
+# frames decoded ahead of the slider, in the direction it moves
+PREFETCH_FRAMES = 8
+
+
+def resize_preview(frame: ndarray, height: int) -> ndarray:
+    h, w = frame.shape[:2]
+    frame = cv2.resize(frame, resize_to_height((w, h), height))
+    if frame.shape[1] % 4 != 0:
+        frame = trim_to_4width(frame)
+    return frame
+
+
+class PreviewFrameServer:
+    """
+    Decoded and resized preview frames of one video, served from an LRU cache with a memory budget.
+    After every request the neighbours in the scrub direction are decoded on a background thread
+    """
+
+    def __init__(
+            self,
+            cap: cv2.VideoCapture,
+            budget_bytes: int = DEFAULT_CACHE_BYTES,
+            prefetch: int = PREFETCH_FRAMES
+    ):
+        self.budget_bytes = budget_bytes
+        self.prefetch = prefetch
+        self.frames_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+
+        self._cap = cap
+        # index the next cap.read() returns, sequential reads skip the seek
+        self._cap_position = None
+        self._cache: "OrderedDict[Tuple[int, int], ndarray]" = OrderedDict()
+        self._cache_bytes = 0
+        # guards the capture and the cache
+        self._lock = threading.Lock()
+
+        self._last_index = None
+        self._generation = 0
+        self._prefetch_request = None
+        self._closed = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._prefetch_loop, daemon=True)
+        self._thread.start()
+
+    def frames(self, index: int, height: int) -> Tuple[Union[ndarray, None], Union[ndarray, None]]:
+        """Frame `index` and the one after it (or itself on the last frame), at preview `height`"""
+        frame1 = self.frame(index, height)
+        frame2 = self.frame(index + 1, height) if index + 1 < self.frames_count else None
+        if frame2 is None:
+            frame2 = frame1
+
+        direction = -1 if self._last_index is not None and index < self._last_index else 1
+        self._last_index = index
+        with self._condition:
+            self._generation += 1
+            self._prefetch_request = (self._generation, index, direction, height)
+            self._condition.notify()
+
+        return frame1, frame2
+
+    def frame(self, index: int, height: int) -> Union[ndarray, None]:
+        key = (index, height)
+        with self._lock:
+            frame = self._cache.get(key)
+            if frame is not None:
+                self._cache.move_to_end(key)
+                return frame
+
+            frame = self._decode(index)
+            if frame is None:
+                return None
+            frame = resize_preview(frame, height)
+            self._store(key, frame)
+            return frame
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._generation += 1
+            self._condition.notify()
+        with self._lock:
+            self._cap.release()
+            self._cache.clear()
+
+    def _decode(self, index: int) -> Union[ndarray, None]:
+        if self._cap_position != index:
+            self._cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+        ret, frame = self._cap.read()
+        self._cap_position = index + 1 if ret else None
+        return frame if ret else None
+
+    def _store(self, key: Tuple[int, int], frame: ndarray):
+        self._cache[key] = frame
+        self._cache_bytes += frame.nbytes
+        while self._cache_bytes > self.budget_bytes and len(self._cache) > 1:
+            _, evicted = self._cache.popitem(last=False)
+            self._cache_bytes -= evicted.nbytes
+
+    def _prefetch_loop(self):
+        while True:
+            with self._condition:
+                while self._prefetch_request is None and not self._closed:
+                    self._condition.wait()
+                if self._closed:
+                    return
+                generation, index, direction, height = self._prefetch_request
+                self._prefetch_request = None
+
+            # forward, index + 1 is already decoded as the next frame.
+            # ascending order keeps the reads sequential for both directions
+            first = 2 if direction > 0 else 1
+            ahead = [index + direction * k for k in range(first, first + self.prefetch)]
+            for neighbour in sorted(ahead):
+                if generation != self._generation:
+                    break
+                if 0 <= neighbour < self.frames_count:
+                    self.frame(neighbour, height)
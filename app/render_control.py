@@ -0,0 +1,82 @@
+import multiprocessing
+import subprocess
+from typing import List
+
+
+class RenderCancelled(Exception):
+    pass
+
+
+class RenderControl:
+    """
+    Pause, resume and stop of one render. Built on events of the spawn context, so worker
+    processes get the same object and block on it instead of polling
+    """
+
+    def __init__(self):
+        ctx = multiprocessing.get_context('spawn')
+        self._resumed = ctx.Event()
+        self._resumed.set()
+        self._stopped = ctx.Event()
+        self._aborted = ctx.Event()
+        # set once only the ffmpeg steps are left, a stop then cancels them
+        self.finishing = False
+
+    @property
+    def paused(self) -> bool:
+        return not self._resumed.is_set()
+
+    @property
+    def stopped(self) -> bool:
+        return self._stopped.is_set()
+
+    @property
+    def aborted(self) -> bool:
+        return self._aborted.is_set()
+
+    def pause(self):
+        if not self.stopped:
+            self._resumed.clear()
+
+    def resume(self):
+        self._resumed.set()
+
+    def stop(self):
+        """
+        The first stop ends rendering, the frames done so far are still joined into the output.
+        Stopping again, or once only the ffmpeg steps are left, cancels those as well
+        """
+        if self.stopped or self.finishing:
+            self._aborted.set()
+        self._stopped.set()
+        # wakes everything waiting in a pause
+        self._resumed.set()
+
+    def wait_resumed(self) -> bool:
+        """Blocks while paused, False when the render was stopped"""
+        self._resumed.wait()
+        return not self.stopped
+
+
+def run_ffmpeg(command: List[str], control: RenderControl = None, poll: float = 0.1):
+    """Run an ffmpeg command line, terminated within about `poll` seconds when `control` gets aborted"""
+    # ffmpeg reads keyboard commands from stdin otherwise
+    process = subprocess.Popen(command, stdin=subprocess.DEVNULL)
+    try:
+        while True:
+            try:
+                returncode = process.wait(timeout=poll)
+                break
+            except subprocess.TimeoutExpired:
+                if control is not None and control.aborted:
+                    raise RenderCancelled(command[0])
+    finally:
+        if process.poll() is None:
+            process.terminate()
+            try:
+                process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, command)
@@ -0,0 +1,116 @@
+from typing import Tuple, TypedDict, Union
+
+import cv2
+import numpy
+from numpy import ndarray
+
+from app.logs import logger
+from app.funcs import expand_to_4width
+from app.ntsc import Ntsc
+from app.render_trace import trace_of, traced
+
+
+class Config(TypedDict):
+    orig_wh: Tuple[int, int]
+    render_wh: Tuple[int, int]
+    container_wh: Tuple[int, int]
+    upscale_2x: bool
+    lossless: bool
+    workers: int
+    segment_parallel: bool
+    chunk_frames: int
+    # decoder read-ahead of the sequential renderer, in bytes
+    prefetch_bytes: int
+    # input frames [in, out) to render, frame numbers (and noise) stay absolute
+    frame_range: Tuple[int, int]
+
+    next_frame_context: bool
+
+    audio_process: bool
+    audio_sat_beforevol: float
+    audio_lowpass: int
+    audio_noise_volume: float
+
+
+def apply_main_effect(nt: Ntsc, frame1, frame2, frameno: int):
+    if frame2 is None:
+        frame2 = frame1
+
+    frame1 = nt.composite_layer(frame1, frame1, field=0, fieldno=0, frameno=frameno)
+    frame1 = cv2.convertScaleAbs(frame1)
+
+    # the second field only contributes half its lines, its buffers are the workspace's
+    bordered = nt.workspace.get('field 2 input', (frame2.shape[0] + 1,) + frame2.shape[1:], frame2.dtype)
+    frame2 = cv2.copyMakeBorder(frame2, 1, 0, 0, 0, cv2.BORDER_CONSTANT, dst=bordered)
+    frame2 = nt.composite_layer(frame2, frame2, field=2, fieldno=2, frameno=frameno)
+    frame2 = cv2.convertScaleAbs(frame2, dst=nt.workspace.get('field 2 output', frame2.shape, numpy.uint8))
+
+    frame = frame1
+    frame[1::2, :] = frame2[2::2, :]
+    return frame
+
+
+def update_chromaencoding(nt: Ntsc, frameindex: int):
+    if frameindex % 2 != 0:
+        nt._video_scanline_phase_shift_offset = 2
+    else:
+        nt._video_scanline_phase_shift_offset = 0
+
+
+def prepare_frame(frame: ndarray, config: Config) -> ndarray:
+    orig_wh = config.get("orig_wh")
+    render_wh = config.get("render_wh")
+
+    if orig_wh != render_wh:
+        try:
+            frame = cv2.resize(frame, render_wh)
+        except Exception as e:
+            logger.exception(e)
+            raise e
+
+    #  crash workaround
+    if render_wh[0] % 4 != 0:
+        frame = expand_to_4width(frame)
+
+    return frame
+
+
+def upscale_frame(frame: ndarray, config: Config) -> ndarray:
+    if config.get("upscale_2x"):
+        frame = cv2.resize(frame, dsize=config.get("container_wh"), interpolation=cv2.INTER_NEAREST)
+    return frame
+
+
+def render_frame(
+        nt: Ntsc,
+        frame1: ndarray,
+        frame2: Union[ndarray, None],
+        frameno: int,
+        config: Config,
+        main_effect: bool = True
+) -> ndarray:
+    """
+    Whole per-frame pipeline (resize, effect, crop, upscale) without any GUI side effects,
+    so it can run in worker processes
+    """
+    render_wh = config.get("render_wh")
+    trace = trace_of(nt)
+    if trace is not None:
+        trace.frame = frameno
+
+    with traced(trace, 'prepare_frame'):
+        frame1 = prepare_frame(frame1, config)
+        if frame2 is not None and config.get("next_frame_context"):
+            frame2 = prepare_frame(frame2, config)
+        else:
+            frame2 = None
+
+    if main_effect:
+        update_chromaencoding(nt, frameno)
+        with traced(trace, 'apply_main_effect'):
+            frame = apply_main_effect(nt, frame1, frame2, frameno)
+    else:
+        frame = frame1
+
+    frame = frame[:, 0:render_wh[0]]
+    return upscale_frame(frame, config)
@@ -0,0 +1,810 @@
+import multiprocessing
+import queue
+import subprocess
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Tuple, Union
+
+import cv2
+import ffmpeg
+from numpy import ndarray
+
+from app.logs import logger
+from app.funcs import resize_to_height
+from app.frame_buffer import FrameBuffer, BufferedVideoStream, DEFAULT_PREFETCH_BYTES
+from app.frame_ring import FrameRing, render_worker
+from app.ntsc import Ntsc
+from app.render_control import RenderControl, RenderCancelled, run_ffmpeg
+from app.render_metrics import RenderMetrics
+from app.render_trace import RenderTrace, traced
+from app.checkpoint import RenderManifest, ChunkWriter, config_hash, source_fingerprint
+from app.segments import (
+    probe_media, probe_keyframes, seek_to_frame, plan_segments, render_segment, segment_worker_init, concat_chunks, remove_chunks
+)
+from app import render_core
+from app.render_core import Config
+
+
+class BoundSignal:
+    def __init__(self):
+        self._slots = []
+
+    def connect(self, slot):
+        self._slots.append(slot)
+
+    def disconnect(self, slot):
+        self._slots.remove(slot)
+
+    def emit(self, *args):
+        for slot in self._slots:
+            slot(*args)
+
+
+class Signal:
+    """
+    Plain Python stand-in for pyqtSignal, so a render can run without Qt.
+    Declared on the class, every instance gets its own connections
+    """
+
+    def __set_name__(self, owner, name):
+        self._attr = f'_signal_{name}'
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        bound = instance.__dict__.get(self._attr)
+        if bound is None:
+            bound = instance.__dict__[self._attr] = BoundSignal()
+        return bound
+
+
+class FrameMailbox:
+    """
+    Single slot for the latest live view frame. A newer frame replaces one the reader has not
+    taken yet, so frames never queue up behind a slow GUI
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._item = None
+
+    def put(self, index: int, frame: ndarray) -> bool:
+        """True when the slot was empty, the reader only needs a notification then"""
+        with self._lock:
+            was_empty = self._item is None
+            self._item = (index, frame)
+        return was_empty
+
+    def take(self) -> Union[Tuple[int, ndarray], None]:
+        with self._lock:
+            item, self._item = self._item, None
+        return item
+
+
+class RenderJob:
+    """
+    Video render without any Qt dependency. Progress and frames are reported through
+    signals, DefaultRenderer swaps them for Qt signals to drive the GUI from a QThread
+    """
+    mainEffect = True
+    liveView = False
+    # live view frames per second, without live view a frame now and then still shows where the render is
+    live_view_fps = 15
+    overview_fps = 1
+    # progress and status are passed on at most this often, in seconds
+    report_interval = 0.25
+    newFrame = Signal()
+    frameMoved = Signal()
+    renderStateChanged = Signal()
+    sendStatus = Signal()
+    increment_progress = Signal()
+    metricsUpdated = Signal()
+    render_data = {}
+    current_frame_index = 0
+    show_frame_index = 0
+    cap = None
+    interlaced = False
+    lossless = True
+    framecount: int = 0
+    # output frames found in finished chunks of an interrupted run
+    resumed_frames: int = 0
+    videoend: int = 0
+    keyframes: list = []
+    buffer: FrameBuffer = None
+    live_frame: FrameMailbox = None
+    metrics: RenderMetrics = None
+    manifest: RenderManifest = None
+    # timeline of the render, also set as the Ntsc profiler so the effect stages end up in it
+    trace: RenderTrace = None
+    _control: RenderControl = None
+    _frames_done = 0
+    _status = None
+    _reported = 0.0
+    _published = 0.0
+
+    @property
+    def control(self) -> RenderControl:
+        # created on first use, the GUI may pause before the render starts
+        if self._control is None:
+            self._control = RenderControl()
+        return self._control
+
+    @property
+    def running(self) -> bool:
+        return not self.control.stopped
+
+    @property
+    def pause(self) -> bool:
+        return self.control.paused
+
+    @pause.setter
+    def pause(self, value: bool):
+        if value:
+            self.control.pause()
+        else:
+            self.control.resume()
+
+    @staticmethod
+    def apply_main_effect(nt: Ntsc, frame1, frame2, frameno: int):
+        return render_core.apply_main_effect(nt, frame1, frame2, frameno)
+
+    def update_buffer(self):
+        buf = self.buffer
+        current_index = self.current_frame_index
+
+        # the progressive path finds the current frame as the next frame of the previous step
+        with traced(self.trace, 'decode wait', 'queue'):
+            if buf[current_index] is None:
+                buf[current_index] = self.cap.read(buf.slot(current_index))
+
+            buf[current_index+1] = self.cap.read(buf.slot(current_index+1))
+
+    def frame_done(self, status: str):
+        """Count a written frame, progress and `status` go out together once per report_interval"""
+        self._frames_done += 1
+        self._status = status
+        self.metrics.frame_done()
+        now = time.perf_counter()
+        if now - self._reported >= self.report_interval:
+            self.flush_progress(now)
+
+    def flush_progress(self, now: float = None):
+        trace = self.trace
+        if self._frames_done:
+            with traced(trace, 'emit increment_progress', 'signal'):
+                self.increment_progress.emit(self._frames_done)
+            self._frames_done = 0
+        if self._status is not None:
+            with traced(trace, 'emit sendStatus', 'signal'):
+                self.sendStatus.emit(self._status)
+            self._status = None
+        self.metrics.bytes_written = self.manifest.bytes_written
+        with traced(trace, 'emit metricsUpdated', 'signal'):
+            self.metricsUpdated.emit(self.metrics.snapshot())
+        self._reported = now if now is not None else time.perf_counter()
+
+    def publish_frame(self, frame: ndarray):
+        """Offer `frame` to the live view, it is dropped when the last one went out too recently"""
+        now = time.perf_counter()
+        if now - self._published < 1 / (self.live_view_fps if self.liveView else self.overview_fps):
+            return
+        self._published = now
+        with traced(self.trace, 'emit frameMoved', 'signal'):
+            self.frameMoved.emit(self.current_frame_index)
+        # the caller may reuse the frame memory, the reader gets its own copy
+        if self.live_frame.put(self.current_frame_index, frame.copy()):
+            with traced(self.trace, 'emit newFrame', 'signal'):
+                self.newFrame.emit(self.live_frame)
+
+    def prepare_frame(self, frame):
+        with traced(self.trace, 'prepare_frame'):
+            return render_core.prepare_frame(frame, self.config)
+
+    def produce_frame(self):
+        frame = self.buffer[self.current_frame_index]
+        if frame is None or not self.running:
+            self.sendStatus.emit(f'Render stopped. ret(debug):')
+            return False
+
+        render_wh = self.config.get("render_wh")
+
+        frame1 = self.prepare_frame(frame)
+        if self.config.get('next_frame_context'):
+            fr = self.buffer[self.current_frame_index + 1]
+            if fr is not None:
+                frame2 = self.prepare_frame(fr)
+            else:
+                frame2 = None
+        else:
+            frame2 = None
+
+        if self.mainEffect:
+            with traced(self.trace, 'apply_main_effect'):
+                frame = self.apply_main_effect(
+                    self.render_data.get("nt"),
+                    frame1,
+                    frame2,
+                    self.show_frame_index
+                )
+        else:
+            # frame1 may be a view of the reused input buffer
+            frame = frame1.copy()
+
+        frame = frame[:, 0:render_wh[0]]
+        self.publish_frame(frame)
+
+        return render_core.upscale_frame(frame, self.config)
+
+    def set_up(self):
+        orig_wh = (
+            self.render_data["input_video"]["width"],
+            self.render_data["input_video"]["height"]
+        )
+        render_wh = resize_to_height(orig_wh, self.render_data["input_height"])
+        container_wh = render_wh
+
+        upscale_2x = self.render_data["upscale_2x"]
+        if upscale_2x:
+            container_wh = (
+                render_wh[0] * 2,
+                render_wh[1] * 2,
+            )
+        
+        step = 2 if self.interlaced else 1
+        frames_count = self.render_data["input_video"]["frames_count"]
+        in_frame = max(0, self.render_data.get("in_frame") or 0)
+        out_frame = min(frames_count, self.render_data.get("out_frame") or frames_count)
+        # interlaced renders consume frame pairs, keep the range on pair boundaries
+        in_frame -= in_frame % step
+        out_frame += -out_frame % step
+
+        self.config = Config(
+            upscale_2x=upscale_2x,
+            container_wh=container_wh,
+            render_wh=render_wh,
+            orig_wh=orig_wh,
+
+            lossless=self.render_data["lossless"],
+            framecount=self.render_data["framecount"],
+            workers=max(1, self.render_data.get("workers", 1)),
+            segment_parallel=self.render_data.get("segment_parallel", False),
+            chunk_frames=self.render_data.get("chunk_frames", 600),
+            prefetch_bytes=self.render_data.get("prefetch_bytes", DEFAULT_PREFETCH_BYTES),
+            frame_range=(in_frame, max(in_frame, out_frame)),
+            next_frame_context=True,
+
+            audio_process=self.render_data.get("audio_process", False),
+            audio_sat_beforevol=4.5,
+            audio_lowpass=10896,
+            audio_noise_volume=0.03,
+        )
+
+    def check_frame_stops(self, frameindex, framecount):
+        if((frameindex > framecount) or (frameindex+1 > framecount)):
+            return framecount
+        return frameindex
+    
+    def update_chromaencoding(self, nt: Ntsc, frameindex):
+        render_core.update_chromaencoding(nt, frameindex)
+
+    def render_sequential(self, video: ChunkWriter):
+        orig_w, orig_h = self.config.get("orig_wh")
+        # current and next frame, every render gets its own
+        self.buffer = FrameBuffer(2, (orig_h, orig_w, 3))
+        self.cap = BufferedVideoStream(
+            path=str(self.render_data["input_video"]["path"]),
+            prefetch_bytes=self.config.get("prefetch_bytes"),
+            trace=self.trace,
+        )
+        logger.debug(f'Decoder prefetch: {self.cap.depth} frames')
+        if self.current_frame_index > 0:
+            seek_to_frame(self.cap.stream, self.current_frame_index, self.keyframes)
+        self.cap.start()
+        _, end_frame = self.config.get("frame_range")
+        step = 2 if self.interlaced else 1
+        frame_bytes = orig_w * orig_h * 3
+        status_string = ''
+
+        try:
+            while self.running:
+                if self.control.paused:
+                    self.sendStatus.emit(f"{status_string} [P]")
+                    self.control.wait_resumed()
+                    continue
+
+                if self.current_frame_index >= end_frame:
+                    logger.info(f"Out point reached {status_string}")
+                    break
+
+                self.update_chromaencoding(self.render_data.get("nt"),self.show_frame_index)
+                if self.trace is not None:
+                    self.trace.frame = self.show_frame_index
+                #print("Full chroma encode")
+
+                started = time.perf_counter()
+                self.update_buffer()
+                if self.buffer[self.current_frame_index] is None:
+                    logger.info(f"Video end or render error {status_string}")
+                    break
+                decoded = time.perf_counter()
+                frame = self.produce_frame()
+                if frame is False:
+                    break
+                rendered = time.perf_counter()
+
+                status_string = '[CV2] Render progress: {current_frame_index}/{total}'.format(
+                    current_frame_index=self.show_frame_index,
+                    total=(self.framecount),
+                )
+
+                if self.interlaced:
+                    self.current_frame_index += 2
+                else:
+                    self.current_frame_index += 1
+                self.show_frame_index += 1
+                #print("Change frames")
+
+                #print("Writing video")
+                with traced(self.trace, 'encode'):
+                    video.write(frame)
+
+                metrics = self.metrics
+                metrics.stage('decode', decoded - started)
+                metrics.stage('effect', rendered - decoded)
+                metrics.stage('encode', time.perf_counter() - rendered)
+                metrics.bytes_read += frame_bytes * step
+                metrics.queue('decoded', self.cap.buffered)
+                self.frame_done(status_string)
+        finally:
+            self.cap.stop()
+            self.flush_progress()
+
+    def render_parallel(self, video: ChunkWriter):
+        """
+        Decode in this thread straight into a shared memory ring and let worker processes
+        run the effect in place; only slot indices and frame numbers cross process boundaries
+        """
+        nt = self.render_data.get("nt")
+        workers = self.config.get("workers")
+        orig_w, orig_h = self.config.get("orig_wh")
+        container_w, container_h = self.config.get("container_wh")
+
+        ring = FrameRing(workers * 2 + 2, (orig_h, orig_w, 3), (container_h, container_w, 3))
+        ctx = multiprocessing.get_context("spawn")
+        tasks = ctx.Queue()
+        results = ctx.Queue()
+        processes = [
+            ctx.Process(
+                target=render_worker,
+                args=(ring.spec, nt, self.config, self.mainEffect, tasks, results, self.control),
+                daemon=True,
+            )
+            for _ in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        logger.debug(f'Started {workers} render workers, ring of {ring.slots} slots')
+
+        cap = cv2.VideoCapture(str(self.render_data["input_video"]["path"]))
+        if self.current_frame_index > 0:
+            seek_to_frame(cap, self.current_frame_index, self.keyframes)
+        _, end_frame = self.config.get("frame_range")
+        end_dispatch = -(-end_frame // (2 if self.interlaced else 1))
+        free_slots = list(range(ring.slots))
+        done = {}
+        in_flight = 0
+        next_dispatch = self.show_frame_index
+        next_write = self.show_frame_index
+        # progressive input: slot whose current frame is decoded but still waits for the next one
+        carry = None
+        eof = False
+        status_string = ''
+
+        def read_into(dst) -> bool:
+            started = time.perf_counter()
+            ret, _ = cap.read(dst)
+            if ret:
+                finished = time.perf_counter()
+                self.metrics.stage('decode', finished - started)
+                if self.trace is not None:
+                    self.trace.add('decode', started, finished, frame=next_dispatch)
+                self.metrics.bytes_read += dst.nbytes
+            return ret
+
+        try:
+            while self.running:
+                if self.control.paused:
+                    self.sendStatus.emit(f"{status_string} [P]")
+                    self.control.wait_resumed()
+                    continue
+
+                while not eof and len(free_slots) >= (1 if self.interlaced else 2):
+                    if next_dispatch >= end_dispatch:
+                        if carry is not None:
+                            free_slots.append(carry)
+                            carry = None
+                        eof = True
+                        break
+                    if self.interlaced:
+                        slot = free_slots.pop()
+                        pair = ring.input(slot)
+                        if not read_into(pair[0]):
+                            free_slots.append(slot)
+                            eof = True
+                            break
+                        if not read_into(pair[1]):
+                            pair[1][:] = pair[0]
+                            eof = True
+                    else:
+                        if carry is None:
+                            carry = free_slots.pop()
+                            if not read_into(ring.input(carry)[0]):
+                                free_slots.append(carry)
+                                carry = None
+                                eof = True
+                                break
+                        slot, pair = carry, ring.input(carry)
+                        carry = free_slots.pop()
+                        if read_into(ring.input(carry)[0]):
+                            pair[1][:] = ring.input(carry)[0]
+                        else:
+                            pair[1][:] = pair[0]
+                            free_slots.append(carry)
+                            carry = None
+                            eof = True
+
+                    tasks.put((slot, next_dispatch))
+                    next_dispatch += 1
+                    in_flight += 1
+
+                if in_flight == 0:
+                    logger.info(f"Video end or render error {status_string}")
+                    break
+
+                try:
+                    with traced(self.trace, 'results wait', 'queue', in_flight=in_flight):
+                        slot, frameno, error, seconds, recorded = results.get(timeout=1)
+                except queue.Empty:
+                    if not all(process.is_alive() for process in processes):
+                        raise RuntimeError('Render worker exited unexpectedly')
+                    continue
+                in_flight -= 1
+                if recorded:
+                    self.render_data["nt"].profiler.extend(recorded)
+                if error is not None:
+                    raise RuntimeError(f'Render worker failed on frame {frameno}:\n{error}')
+                done[frameno] = slot
+                self.metrics.stage('effect', seconds)
+
+                while next_write in done:
+                    slot = done.pop(next_write)
+                    frame = ring.output(slot)
+
+                    self.show_frame_index = next_write
+                    self.current_frame_index = next_write * 2 if self.interlaced else next_write
+                    if self.trace is not None:
+                        self.trace.frame = next_write
+                    self.publish_frame(frame)
+
+                    started = time.perf_counter()
+                    video.write(frame)
+                    finished = time.perf_counter()
+                    self.metrics.stage('encode', finished - started)
+                    if self.trace is not None:
+                        self.trace.add('encode', started, finished)
+                    free_slots.append(slot)
+                    next_write += 1
+
+                    status_string = '[CV2] Render progress: {current_frame_index}/{total}'.format(
+                        current_frame_index=next_write,
+                        total=self.framecount,
+                    )
+                    self.metrics.queue('in_flight', in_flight)
+                    self.metrics.queue('reorder', len(done))
+                    self.frame_done(status_string)
+        finally:
+            self.flush_progress()
+            for _ in processes:
+                tasks.put(None)
+            for process in processes:
+                process.join(timeout=5)
+                if process.is_alive():
+                    process.terminate()
+            cap.release()
+            ring.close()
+
+    def open_video_writer(self, path: Path, framerate: float) -> cv2.VideoWriter:
+        # Process temp file in lossless for better compression when encoding
+        fourcc_choice = cv2.VideoWriter_fourcc(*'FFV1')
+        video = cv2.VideoWriter()
+
+        open_result = False
+        while not open_result:
+            open_result = video.open(
+                filename=str(path.resolve()),
+                fourcc=fourcc_choice,
+                fps=framerate,
+                frameSize=self.config.get("container_wh"),
+            )
+            logger.debug(f'Output video open result: {open_result}')
+        return video
+
+    def render_segments(self, manifest: RenderManifest, framerate: float):
+        """
+        Split the source on keyframes and render every segment in its own process, each with
+        its own decoder and encoder. Finished segments are checkpointed as chunks in `manifest`
+        """
+        input_video = self.render_data["input_video"]
+        source = str(input_video["path"].resolve())
+        workers = self.config.get("workers")
+        step = 2 if self.interlaced else 1
+
+        if not manifest.segments:
+            manifest.segments = plan_segments(self.keyframes, self.config.get("frame_range"), workers * 4, step)
+            manifest.save()
+        segments = [
+            segment for segment in manifest.segments
+            if not manifest.is_done(segment[0] // step)
+        ]
+        logger.debug(f'Segments to render: {segments}')
+
+        ctx = multiprocessing.get_context("spawn")
+        progress = ctx.Queue()
+
+        orig_w, orig_h = self.config.get("orig_wh")
+        frame_bytes = orig_w * orig_h * 3 * step
+        status_string = ''
+        rendered = sum(chunk["end"] - chunk["start"] for chunk in manifest.chunks)
+        with ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=ctx,
+                initializer=segment_worker_init,
+                initargs=(progress, self.control),
+        ) as pool:
+            futures = {
+                pool.submit(
+                    render_segment, index, source, segment, str(manifest.chunk_path(segment[0] // step).resolve()),
+                    self.render_data.get("nt"), self.config, framerate, self.interlaced, self.mainEffect,
+                    self.keyframes,
+                ): segment
+                for index, segment in enumerate(segments)
+            }
+            pending = set(futures)
+
+            while pending or not progress.empty():
+                for future in [future for future in pending if future.done()]:
+                    pending.remove(future)
+                    written = future.result()
+                    if self.running:
+                        start = futures[future][0] // step
+                        manifest.add_chunk(start, start + written)
+
+                if not self.running:
+                    for future in pending:
+                        future.cancel()
+                    break
+                if self.control.paused:
+                    self.sendStatus.emit(f"{status_string} [P]")
+                    self.control.wait_resumed()
+                    continue
+                try:
+                    with traced(self.trace, 'progress wait', 'queue', segments=len(pending)):
+                        _, frameno, seconds, recorded = progress.get(timeout=0.3)
+                except queue.Empty:
+                    continue
+                if recorded:
+                    self.render_data["nt"].profiler.extend(recorded)
+                rendered += 1
+                status_string = '[CV2] Render progress: {current_frame_index}/{total} ({segments} segments)'.format(
+                    current_frame_index=rendered,
+                    total=self.framecount,
+                    segments=len(manifest.segments),
+                )
+                self.metrics.stage('frame', seconds)
+                self.metrics.bytes_read += frame_bytes
+                self.metrics.queue('segments', len(pending))
+                self.frame_done(status_string)
+        self.flush_progress()
+
+    def filter_audio(self, audio, sample_rate):
+        """VHS audio chain on `audio`, it runs inside the final mux command"""
+        # unbounded noise source, amix ends it together with the audio
+        aud_ff_noise = ffmpeg.input(f'aevalsrc=-2+random(0):sample_rate={sample_rate}:channel_layout=mono',f="lavfi")
+        aud_ff_noise = ffmpeg.filter((aud_ff_noise, aud_ff_noise), 'join', inputs=2, channel_layout='stereo')
+        aud_ff_noise = aud_ff_noise.filter('volume', self.config.get('audio_noise_volume'))
+
+        aud_ff_fx = audio.filter("volume",self.config.get('audio_sat_beforevol')).filter("alimiter",limit="0.5").filter("volume",0.8)
+        aud_ff_fx = aud_ff_fx.filter("firequalizer",gain=f'if(lt(f,{self.config.get("audio_lowpass")}), 0, -INF)')
+
+        return ffmpeg.filter([aud_ff_fx, aud_ff_noise], 'amix', duration='first').filter("firequalizer",gain='if(lt(f,13301), 0, -INF)')
+
+    def run(self) -> bool:
+        """Render the whole job, True once the output file is written"""
+        nt = self.render_data["nt"]
+        profiler = nt.profiler
+        if self.trace is not None:
+            nt.profiler = self.trace
+        try:
+            return self.render()
+        finally:
+            # the caller keeps using its Ntsc for previews and later renders
+            nt.profiler = profiler
+
+    def render(self) -> bool:
+        self.set_up()
+
+        suffix = '.mkv'
+
+        #print(self.config.get("lossless"))
+
+        tmp_output = self.render_data['target_file'].parent / f'tmp_{self.render_data["target_file"].stem}{suffix}'
+
+        if (self.interlaced):
+            framerate = self.render_data["input_video"]["orig_fps"] / 2
+        else:
+            framerate = self.render_data["input_video"]["orig_fps"]
+        
+        step = 2 if self.interlaced else 1
+        in_frame, out_frame = self.config.get("frame_range")
+        self.framecount = -(-(out_frame - in_frame) // step)
+        #print(self.framecount)
+        
+        logger.debug(f'Input video: {str(self.render_data["input_video"]["path"].resolve())}')
+        logger.debug(f'Temp output: {str(tmp_output.resolve())}')
+        logger.debug(f'Output video: {str(self.render_data["target_file"].resolve())}')
+        #logger.debug(f'Process audio: {self.process_audio}')
+        logger.debug(f'Process audio: {str(self.config.get("audio_process"))}')
+
+        chunk_dir = tmp_output.parent / f'{tmp_output.stem}_chunks'
+        self.manifest = manifest = RenderManifest.open(
+            chunk_dir,
+            config_hash(self.render_data.get("nt"), self.config, self.interlaced, self.mainEffect),
+            source_fingerprint(self.render_data["input_video"]["path"]),
+            first_frame=in_frame // step,
+        )
+        video = None
+        if not self.config.get("segment_parallel"):
+            video = ChunkWriter(
+                manifest,
+                lambda path: self.open_video_writer(path, framerate),
+                self.config.get("chunk_frames"),
+            )
+
+        # continue after the last checkpointed chunk of an interrupted run
+        self.resumed_frames = sum(chunk["end"] - chunk["start"] for chunk in manifest.chunks)
+        self.show_frame_index = manifest.last_frame
+        self.current_frame_index = self.show_frame_index * step
+
+        self.live_frame = FrameMailbox()
+        self.metrics = RenderMetrics(self.framecount, self.resumed_frames)
+        self._frames_done, self._status, self._reported, self._published = 0, None, 0.0, 0.0
+
+        self.renderStateChanged.emit(True)
+        if self.show_frame_index > in_frame // step:
+            self.sendStatus.emit(f'Resuming render from frame {self.show_frame_index}')
+
+        self.keyframes = []
+        if self.current_frame_index > 0 or self.config.get("segment_parallel"):
+            self.sendStatus.emit('[FFPROBE] Scanning keyframes')
+            with traced(self.trace, 'ffprobe keyframes', 'ffmpeg'):
+                self.keyframes = probe_keyframes(
+                    self.render_data["input_video"]["path"],
+                    self.render_data["input_video"]["orig_fps"],
+                )
+
+        orig_path = str(self.render_data["input_video"]["path"].resolve())
+
+        # cut the audio to the rendered range, the rendered video always starts at 0
+        orig_fps = self.render_data["input_video"]["orig_fps"]
+        trim = {}
+        if (in_frame, out_frame) != (0, self.render_data["input_video"]["frames_count"]):
+            trim = {"ss": in_frame / orig_fps, "t": (out_frame - in_frame) / orig_fps}
+
+        if video is None:
+            self.render_segments(manifest, framerate)
+        else:
+            if self.config.get("workers") > 1:
+                self.render_parallel(video)
+            else:
+                self.render_sequential(video)
+            video.release()
+        # the last chunk is only on disk now
+        self.flush_progress()
+        if self.trace is not None:
+            self.trace.frame = None
+        profiler = self.render_data["nt"].profiler
+        if profiler is not None and profiler is not self.trace:
+            logger.info(f'Effect stage profile:\n{profiler.table()}')
+
+        completed = self.running
+        # a stopped segment render can have finished segments after unfinished ones
+        chunks = manifest.joinable_files()
+        if not chunks:
+            self.renderStateChanged.emit(False)
+            self.sendStatus.emit('Render stopped, nothing rendered')
+            return False
+
+        # from here on a stop cancels the ffmpeg steps, the chunks stay for a resume
+        self.control.finishing = True
+        try:
+            if self.control.aborted:
+                raise RenderCancelled('render')
+            self.sendStatus.emit(f'[FFMPEG] Joining {len(chunks)} chunks')
+            with traced(self.trace, 'ffmpeg concat', 'ffmpeg', chunks=len(chunks)):
+                concat_chunks(chunks, tmp_output, self.control)
+            with traced(self.trace, 'ffmpeg mux', 'ffmpeg'):
+                self.mux_output(tmp_output, orig_path, trim)
+        except RenderCancelled:
+            tmp_output.unlink(missing_ok=True)
+            logger.info(f'Render cancelled, chunks kept in {chunk_dir} to resume')
+            self.renderStateChanged.emit(False)
+            self.sendStatus.emit('Render cancelled')
+            return False
+
+        tmp_output.unlink()
+        if completed:
+            remove_chunks(chunk_dir)
+        else:
+            logger.info(f'Render interrupted, chunks kept in {chunk_dir} to resume')
+
+        self.renderStateChanged.emit(False)
+        self.sendStatus.emit('[DONE] Render done')
+        return True
+
+    def mux_output(self, tmp_output: Path, orig_path: str, trim: dict):
+        """Final file from the joined video and the (trimmed, maybe filtered) source audio"""
+        orig_suffix = self.render_data["input_video"]["suffix"]
+        target_suffix = self.render_data["target_file"].suffix
+        result_path = str(self.render_data["target_file"].resolve())
+
+        # FIXME beautify file render and audio detection
+
+        #self.sendStatus.emit(f'[FFMPEG] Copying audio to {result_path}')
+
+        probe = probe_media(self.render_data["input_video"]["path"])
+        audio_stream = next((stream for stream in probe.get('streams', []) if stream['codec_type'] == 'audio'), None)
+        # without a probe result try the mux with audio anyway, it falls back to video only
+        has_audio = audio_stream is not None or not probe
+
+        orig = ffmpeg.input(orig_path, **trim)
+        temp_video_stream = ffmpeg.input(str(tmp_output.resolve()))
+        # render_streams.append(temp_video_stream.video)
+
+        streams = [temp_video_stream.video]
+        audio_args = {}
+        if self.config.get("audio_process") and audio_stream is not None:
+            self.sendStatus.emit(f'[FFMPEG] Filtering audio into {result_path}')
+            streams.append(self.filter_audio(orig.audio, audio_stream['sample_rate']))
+            audio_args = {'acodec': 'flac'} if target_suffix == '.mkv' else {'acodec': 'aac', 'b:a': '320k'}
+        elif has_audio:
+            self.sendStatus.emit(f'[FFMPEG] Copying audio to {result_path}')
+            streams.append(orig.audio)
+            audio_args = {'acodec': 'copy'} if target_suffix == '.mkv' else {'acodec': 'aac', 'b:a': '320k'}
+
+        if (self.config.get("lossless")):
+            ff_command = ffmpeg.output(*streams, result_path, shortest=None, vcodec='copy', **audio_args)
+        else:
+            ff_command = ffmpeg.output(*streams, result_path, shortest=None, vcodec='libx264', preset='slow', crf=16, **{'vf': 'setfield=tff'}, **{'flags': '+ildct+ilme'}, **audio_args)
+
+        logger.debug(ff_command)
+        logger.debug(' '.join(ff_command.compile()))
+        try:
+            try:
+                run_ffmpeg(ff_command.overwrite_output().compile(), self.control)
+            except subprocess.CalledProcessError:
+                if orig_suffix == '.gif':
+                    ff_command = ffmpeg.output(temp_video_stream.video, result_path, shortest=None)
+                else:
+                    ff_command = ffmpeg.output(temp_video_stream.video, result_path, shortest=None, vcodec='copy')
+                run_ffmpeg(ff_command.overwrite_output().compile(), self.control)
+        except RenderCancelled:
+            # ffmpeg got killed halfway through writing it
+            Path(result_path).unlink(missing_ok=True)
+            raise
+
+        self.sendStatus.emit('[FFMPEG] Audio copy done')
+
+    def stop(self):
+        self.control.stop()
@@ -0,0 +1,101 @@
+import json
+import time
+from collections import deque
+from pathlib import Path
+from typing import Dict, Union
+
+# frames per second are averaged over this many seconds
+FPS_WINDOW = 5.0
+# weight of the newest sample in the smoothed stage times and ETA rate
+SMOOTHING = 0.1
+
+
+class RenderMetrics:
+    """
+    Throughput of one render: rolling frames per second, smoothed milliseconds per pipeline stage,
+    queue depths, bytes through the pipeline and an ETA. Updated by the render loop, read as snapshot()
+    """
+
+    def __init__(self, total_frames: int, done_frames: int = 0):
+        self.total_frames = total_frames
+        self.done_frames = done_frames
+        self._resumed_frames = done_frames
+        self.started = time.perf_counter()
+        self.stage_ms: Dict[str, float] = {}
+        self.queues: Dict[str, int] = {}
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self._window = deque()
+        self._rate: Union[float, None] = None
+
+    def frame_done(self, frames: int = 1):
+        now = time.perf_counter()
+        self.done_frames += frames
+        self._window.append((now, frames))
+        while self._window and now - self._window[0][0] > FPS_WINDOW:
+            self._window.popleft()
+
+    def stage(self, name: str, seconds: float):
+        ms = seconds * 1000
+        previous = self.stage_ms.get(name)
+        self.stage_ms[name] = ms if previous is None else previous + SMOOTHING * (ms - previous)
+
+    def queue(self, name: str, depth: int):
+        self.queues[name] = depth
+
+    @property
+    def fps(self) -> float:
+        if len(self._window) < 2:
+            elapsed = time.perf_counter() - self.started
+            return (self.done_frames - self._resumed_frames) / elapsed if elapsed > 0 else 0.0
+        first, last = self._window[0][0], self._window[-1][0]
+        if last <= first:
+            return 0.0
+        # frames of the first sample were done before the window starts
+        return (sum(frames for _, frames in self._window) - self._window[0][1]) / (last - first)
+
+    def snapshot(self) -> dict:
+        fps = self.fps
+        if fps > 0:
+            self._rate = fps if self._rate is None else self._rate + SMOOTHING * (fps - self._rate)
+        eta = max(0, self.total_frames - self.done_frames) / self._rate if self._rate else None
+        return {
+            "time": time.time(),
+            "elapsed": round(time.perf_counter() - self.started, 3),
+            "frames": self.done_frames,
+            "total_frames": self.total_frames,
+            "fps": round(fps, 3),
+            "eta": None if eta is None else round(eta, 1),
+            "stage_ms": {name: round(ms, 3) for name, ms in self.stage_ms.items()},
+            "queues": dict(self.queues),
+            "bytes_read": self.bytes_read,
+            "bytes_written": self.bytes_written,
+        }
+
+
+def format_metrics(snapshot: dict) -> str:
+    """One line summary of a snapshot for the status bar"""
+    eta = snapshot["eta"]
+    parts = [
+        f'{snapshot["frames"]}/{snapshot["total_frames"]}',
+        f'{snapshot["fps"]:.2f} fps',
+        'ETA --:--' if eta is None else f'ETA {int(eta) // 60:02d}:{int(eta) % 60:02d}',
+    ]
+    parts += [f'{name} {ms:.1f} ms' for name, ms in snapshot["stage_ms"].items()]
+    parts += [f'{name} queue {depth}' for name, depth in snapshot["queues"].items()]
+    parts.append(f'{snapshot["bytes_written"] / 2 ** 20:.1f} MiB written')
+    return '  '.join(parts)
+
+
+class MetricsWriter:
+    """Appends every snapshot it gets to a JSON-lines file"""
+
+    def __init__(self, path: Path):
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def write(self, snapshot: dict):
+        self._file.write(json.dumps(snapshot) + '\n')
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
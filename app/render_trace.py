@@ -0,0 +1,128 @@
+import json
+import multiprocessing
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import Callable, List, Union
+
+
+class RenderTrace:
+    """
+    Timeline of one render written as Trace Event Format JSON, for Perfetto or chrome://tracing.
+    Every span is tagged with its process, thread and frame number. Set as `nt.profiler` the
+    composite_layer stages are recorded too, worker processes send their spans back with each frame
+    """
+
+    def __init__(self):
+        self._events: List[dict] = []
+        self._named = set()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def __getstate__(self):
+        # the copy a worker process gets starts empty, with its own lock
+        state = self.__dict__.copy()
+        del state['_lock'], state['_local']
+        state['_events'] = []
+        state['_named'] = set()
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @property
+    def frame(self) -> Union[int, None]:
+        """Frame number spans of the calling thread are tagged with"""
+        return getattr(self._local, 'frame', None)
+
+    @frame.setter
+    def frame(self, frameno: Union[int, None]):
+        self._local.frame = frameno
+
+    def add(self, name: str, started: float, finished: float, cat: str = 'render', frame: int = None, **args):
+        """Complete span from `started` to `finished`, perf_counter() seconds"""
+        frame = self.frame if frame is None else frame
+        if frame is not None:
+            args['frame'] = frame
+        pid, tid = os.getpid(), threading.get_ident()
+        # perf_counter is a system wide monotonic clock, spans of worker processes line up with ours
+        event = {
+            "name": name, "cat": cat, "ph": "X", "pid": pid, "tid": tid,
+            "ts": started * 1e6, "dur": (finished - started) * 1e6, "args": args,
+        }
+        with self._lock:
+            if (pid, tid) not in self._named:
+                self._named.add((pid, tid))
+                self._events += self._names(pid, tid)
+            self._events.append(event)
+
+    @contextmanager
+    def span(self, name: str, cat: str = 'render', frame: int = None, **args):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, started, time.perf_counter(), cat, frame, **args)
+
+    def measure(self, stage: str, field: int, func: Callable, *args):
+        with self.span(stage, 'effect', field=field):
+            return func(*args)
+
+    def wrap(self, names: List[str], stages: list, field: int) -> list:
+        """(enabled, apply) stages of composite_layer with a span around every apply"""
+        return [
+            (enabled, lambda yiq, name=name, apply=apply: self.measure(name, field, apply, yiq))
+            for name, (enabled, apply) in zip(names, stages)
+        ]
+
+    def take(self) -> List[dict]:
+        """Events recorded so far, removed from this trace to be sent to the main process"""
+        with self._lock:
+            events, self._events = self._events, []
+        return events
+
+    def extend(self, events: List[dict]):
+        with self._lock:
+            self._events += events
+
+    def write(self, path: Path):
+        with self._lock:
+            events = list(self._events)
+        # every Ntsc copy a worker got names its process and thread again
+        named = set()
+        unique = []
+        for event in events:
+            if event["ph"] == "M":
+                key = (event["name"], event["pid"], event["tid"])
+                if key in named:
+                    continue
+                named.add(key)
+            unique.append(event)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({"traceEvents": unique, "displayTimeUnit": "ms"}, f)
+
+    @staticmethod
+    def _names(pid: int, tid: int) -> List[dict]:
+        process = multiprocessing.current_process().name
+        thread = threading.current_thread().name
+        return [
+            {"name": "process_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": f'{process} ({pid})'}},
+            {"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": thread}},
+        ]
+
+
+def trace_of(nt) -> Union[RenderTrace, None]:
+    """The trace a render records into, worker processes find it on their copy of the Ntsc"""
+    profiler = getattr(nt, 'profiler', None)
+    return profiler if isinstance(profiler, RenderTrace) else None
+
+
+def traced(trace: Union[RenderTrace, None], name: str, cat: str = 'render', frame: int = None, **args):
+    """trace.span(...), or nothing when there is no trace"""
+    if trace is None:
+        return nullcontext()
+    return trace.span(name, cat, frame, **args)
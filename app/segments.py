@@ -0,0 +1,208 @@
+import shutil
+import subprocess
+import time
+from bisect import bisect_right
+from functools import lru_cache
+from pathlib import Path
+from typing import List, Tuple
+
+import cv2
+import ffmpeg
+
+from app.logs import logger
+from app.ntsc import Ntsc
+from app.render_control import RenderControl, run_ffmpeg
+from app.render_core import Config, render_frame
+from app.render_trace import trace_of, traced
+
+Segment = Tuple[int, int]
+
+# set by segment_worker_init in every pool process
+_progress = None
+_control: RenderControl = None
+
+
+def probe_media(path: Path) -> dict:
+    """ffprobe format and stream info, cached per file version. Empty when the probe fails"""
+    return _probe_media(str(path.resolve()), path.stat().st_mtime_ns)
+
+
+@lru_cache(maxsize=8)
+def _probe_media(path: str, mtime_ns: int) -> dict:
+    try:
+        return ffmpeg.probe(path)
+    except (OSError, ffmpeg.Error) as e:
+        logger.warning(f'Probe of {path} failed: {e}')
+        return {}
+
+
+def probe_keyframes(path: Path, fps: float) -> List[int]:
+    """
+    Indices of the video keyframes, found with an ffprobe packet scan (no decoding).
+    Cached per file version, repeated renders of the same source scan it once
+    """
+    return list(_probe_keyframes(str(path.resolve()), path.stat().st_mtime_ns, fps))
+
+
+@lru_cache(maxsize=8)
+def _probe_keyframes(path: str, mtime_ns: int, fps: float) -> Tuple[int, ...]:
+    command = [
+        'ffprobe', '-v', 'error',
+        '-select_streams', 'v:0',
+        '-show_entries', 'packet=pts_time,flags',
+        '-of', 'csv=print_section=0',
+        str(path),
+    ]
+    try:
+        out = subprocess.run(command, capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError) as e:
+        logger.warning(f'Keyframe scan failed, seeks and segments will not be keyframe aligned: {e}')
+        return ()
+
+    times = []
+    start = None
+    for line in out.splitlines():
+        pts_time, _, flags = line.partition(',')
+        try:
+            pts = float(pts_time)
+        except ValueError:
+            continue
+        start = pts if start is None else min(start, pts)
+        if 'K' in flags:
+            times.append(pts)
+
+    return tuple(sorted({round((pts - start) * fps) for pts in times}))
+
+
+def seek_to_frame(cap: cv2.VideoCapture, target: int, keyframes: List[int]):
+    """
+    Position `cap` so the next read returns frame `target`: jump to the closest keyframe
+    at or before it, then decode forward without converting the skipped frames
+    """
+    position = bisect_right(keyframes, target) - 1
+    if position < 0:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, target)
+        return
+
+    keyframe = keyframes[position]
+    cap.set(cv2.CAP_PROP_POS_FRAMES, keyframe)
+    for _ in range(target - keyframe):
+        if not cap.grab():
+            break
+
+
+def plan_segments(keyframes: List[int], frame_range: Segment, segments: int, step: int = 1) -> List[Segment]:
+    """
+    Split `frame_range` into about `segments` ranges starting on keyframes.
+    Boundaries are kept on multiples of `step`, so interlaced frame pairs are never split
+    """
+    first, last = frame_range
+    boundaries = set()
+    for k in range(1, segments):
+        ideal = first + (last - first) * k // segments
+        if keyframes:
+            ideal = min(keyframes, key=lambda keyframe: abs(keyframe - ideal))
+        boundary = ideal - ideal % step
+        if first < boundary < last:
+            boundaries.add(boundary)
+
+    points = [first, *sorted(boundaries), last]
+    return list(zip(points[:-1], points[1:]))
+
+
+def segment_worker_init(progress, control: RenderControl):
+    global _progress, _control
+    _progress = progress
+    _control = control
+
+
+def render_segment(
+        index: int,
+        source: str,
+        segment: Segment,
+        target: str,
+        nt: Ntsc,
+        config: Config,
+        framerate: float,
+        interlaced: bool,
+        main_effect: bool,
+        keyframes: List[int],
+) -> int:
+    """
+    Render input frames [start, end) with an own decoder and encoder into `target`.
+    Frame numbers stay absolute, so the noise matches a sequential render.
+    """
+    start, end = segment
+    step = 2 if interlaced else 1
+
+    cap = cv2.VideoCapture(source)
+    seek_to_frame(cap, start, keyframes)
+    video = cv2.VideoWriter(
+        target,
+        cv2.VideoWriter_fourcc(*'FFV1'),
+        framerate,
+        config.get("container_wh"),
+    )
+
+    trace = trace_of(nt)
+    written = 0
+    with traced(trace, 'decode', frame=start // step):
+        ret, current = cap.read()
+    index_in = start
+    try:
+        while ret and index_in < end:
+            # blocks while the render is paused
+            if _control is not None and not _control.wait_resumed():
+                break
+
+            with traced(trace, 'decode', frame=index_in // step):
+                ret, following = cap.read()
+                if interlaced:
+                    pair = following if ret else None
+                    # the next pair starts with a new frame
+                    ret, following = cap.read()
+                else:
+                    pair = following if ret else None
+
+            started = time.perf_counter()
+            frame = render_frame(nt, current, pair, index_in // step, config, main_effect)
+            with traced(trace, 'encode'):
+                video.write(frame)
+            written += 1
+            if _progress is not None:
+                recorded = nt.profiler.take() if nt.profiler is not None else None
+                _progress.put((index, index_in // step, time.perf_counter() - started, recorded))
+
+            current = following
+            index_in += step
+    finally:
+        video.release()
+        cap.release()
+
+    return written
+
+
+def concat_chunks(chunks: List[Path], target: Path, control: RenderControl = None):
+    """Join encoded chunks without re-encoding, using ffmpeg's concat demuxer"""
+    list_file = target.parent / f'{target.stem}_concat.txt'
+    with open(list_file, 'w', encoding='utf-8') as f:
+        for chunk in chunks:
+            escaped = str(chunk.resolve()).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+
+    command = [
+        'ffmpeg', '-y', '-v', 'error',
+        '-f', 'concat', '-safe', '0',
+        '-i', str(list_file),
+        '-c', 'copy',
+        str(target),
+    ]
+    logger.debug(' '.join(command))
+    try:
+        run_ffmpeg(command, control)
+    finally:
+        list_file.unlink()
+
+
+def remove_chunks(chunk_dir: Path):
+    shutil.rmtree(chunk_dir, ignore_errors=True)
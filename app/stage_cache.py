@@ -0,0 +1,108 @@
+from typing import Dict, List, Optional, Tuple
+
+import numpy
+
+from app.ntsc import COMPOSITE_STAGES, Ntsc
+
+_stage_params = {name for _, params in COMPOSITE_STAGES for name in params}
+
+# both fields of the full and the draft preview
+MAX_FIELD_CACHES = 4
+
+# yiq after a stage together with both random states, resuming from it gives the same noise
+Checkpoint = Tuple[numpy.ndarray, tuple, tuple]
+
+
+class _FieldCache:
+    def __init__(self, src: numpy.ndarray, inputs: tuple):
+        self.src = src.copy()
+        self.inputs = inputs
+        self.params: List[tuple] = []
+        # checkpoints[0] is the converted input, checkpoints[i + 1] the yiq after stage i, None once dropped
+        self.checkpoints: List[Optional[Checkpoint]] = []
+
+    @property
+    def nbytes(self) -> int:
+        # a disabled stage shares the checkpoint before it
+        arrays = {id(checkpoint[0]): checkpoint[0].nbytes for checkpoint in self.checkpoints if checkpoint is not None}
+        return self.src.nbytes + sum(arrays.values())
+
+
+class StageCache:
+    """
+    Intermediate buffers of Ntsc.composite_layer for the frame on screen, one set per field and frame size.
+    When only parameters of later stages changed, the earlier stages are not computed again.
+    Least recently used fields, then the last checkpoints, are dropped to stay under `max_bytes`
+    """
+
+    def __init__(self, max_bytes: int = 256 * 2 ** 20):
+        self.max_bytes = max_bytes
+        self._fields: Dict[tuple, _FieldCache] = {}
+
+    @property
+    def nbytes(self) -> int:
+        return sum(cache.nbytes for cache in self._fields.values())
+
+    def clear(self):
+        self._fields.clear()
+
+    def run(self, nt: Ntsc, src: numpy.ndarray, field: int, fieldno: int, frameno: int, stages) -> numpy.ndarray:
+        params = [tuple(getattr(nt, name) for name in names) for _, names in COMPOSITE_STAGES]
+        inputs = (frameno, nt.precise, nt.cutoff_scale) + tuple(
+            (name, value) for name, value in sorted(vars(nt).items())
+            if name.startswith('_') and name not in _stage_params
+        )
+
+        key = (field, fieldno, src.shape)
+        cache = self._fields.pop(key, None)
+        if cache is None or cache.inputs != inputs or not numpy.array_equal(cache.src, src):
+            cache = _FieldCache(src, inputs)
+        # most recently used last
+        self._fields[key] = cache
+        while len(self._fields) > MAX_FIELD_CACHES:
+            del self._fields[next(iter(self._fields))]
+
+        start = 0
+        if cache.checkpoints:
+            while start < len(stages) and cache.params[start] == params[start]:
+                start += 1
+            while cache.checkpoints[start] is None:
+                start -= 1
+            yiq, random_state, tracking_state = cache.checkpoints[start]
+            yiq = yiq.copy()
+            nt.random.rnd.set_state(random_state)
+            nt.tracking_random.setstate(tracking_state)
+        else:
+            yiq = nt._composite_input(src)
+            self._checkpoint(cache, nt, yiq)
+
+        del cache.checkpoints[start + 1:]
+        cache.params = params
+        for enabled, apply in stages[start:]:
+            if enabled:
+                apply(yiq)
+                self._checkpoint(cache, nt, yiq)
+            else:
+                # a disabled stage changes neither the yiq nor the random state
+                cache.checkpoints.append(cache.checkpoints[-1])
+        self._trim(cache)
+        return yiq
+
+    def _trim(self, current: _FieldCache):
+        nbytes = self.nbytes
+        for key in list(self._fields):
+            if nbytes <= self.max_bytes:
+                return
+            if self._fields[key] is not current:
+                nbytes -= self._fields.pop(key).nbytes
+        # the converted input is always kept, an edit then resumes from the last checkpoint left before it
+        for index in range(len(current.checkpoints) - 1, 0, -1):
+            if nbytes <= self.max_bytes:
+                return
+            before = current.nbytes
+            current.checkpoints[index] = None
+            nbytes -= before - current.nbytes
+
+    @staticmethod
+    def _checkpoint(cache: _FieldCache, nt: Ntsc, yiq: numpy.ndarray):
+        cache.checkpoints.append((yiq.copy(), nt.random.rnd.get_state(), nt.tracking_random.getstate()))
@@ -0,0 +1,128 @@
+import threading
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Tuple
+
+
+class _StageStats:
+    __slots__ = ('calls', 'seconds', 'max_seconds', 'allocated', 'max_allocated')
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.allocated = 0
+        self.max_allocated = 0
+
+
+class StageProfiler:
+    """
+    Opt-in profile of Ntsc.composite_layer. Set as `nt.profiler` and every stage that runs is timed,
+    per stage and field, summed over all frames. With `allocations` the peak memory a stage allocates
+    is traced too (tracemalloc, slows the render down noticeably). The copy a worker process renders
+    with hands its stats over with `take`, the main process adds them with `extend`
+    """
+
+    def __init__(self, allocations: bool = False):
+        self.allocations = allocations
+        self._stats: Dict[Tuple[str, int], _StageStats] = {}
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # the copy a worker process gets starts empty, with its own lock
+        state = self.__dict__.copy()
+        del state['_lock']
+        state['_stats'] = {}
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def measure(self, stage: str, field: int, func: Callable, *args):
+        if self.allocations:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+        started = time.perf_counter()
+        result = func(*args)
+        seconds = time.perf_counter() - started
+        allocated = tracemalloc.get_traced_memory()[1] - before if self.allocations else 0
+
+        with self._lock:
+            stats = self._stats.get((stage, field))
+            if stats is None:
+                stats = self._stats[(stage, field)] = _StageStats()
+            stats.calls += 1
+            stats.seconds += seconds
+            stats.max_seconds = max(stats.max_seconds, seconds)
+            stats.allocated += allocated
+            stats.max_allocated = max(stats.max_allocated, allocated)
+        return result
+
+    def wrap(self, names: List[str], stages: list, field: int) -> list:
+        """(enabled, apply) stages of composite_layer with every apply measured under its name"""
+        return [
+            (enabled, lambda yiq, name=name, apply=apply: self.measure(name, field, apply, yiq))
+            for name, (enabled, apply) in zip(names, stages)
+        ]
+
+    def clear(self):
+        with self._lock:
+            self._stats.clear()
+
+    def take(self) -> Dict[Tuple[str, int], _StageStats]:
+        """Stats recorded so far, removed from this profiler to be sent to the main process"""
+        with self._lock:
+            stats, self._stats = self._stats, {}
+        return stats
+
+    def extend(self, stats: Dict[Tuple[str, int], _StageStats]):
+        with self._lock:
+            for key, theirs in stats.items():
+                ours = self._stats.get(key)
+                if ours is None:
+                    self._stats[key] = theirs
+                    continue
+                ours.calls += theirs.calls
+                ours.seconds += theirs.seconds
+                ours.max_seconds = max(ours.max_seconds, theirs.max_seconds)
+                ours.allocated += theirs.allocated
+                ours.max_allocated = max(ours.max_allocated, theirs.max_allocated)
+
+    def rows(self) -> List[dict]:
+        """One row per stage and field, slowest stage first"""
+        with self._lock:
+            items = list(self._stats.items())
+        rows = [
+            {
+                "stage": stage,
+                "field": field,
+                "calls": stats.calls,
+                "total_ms": stats.seconds * 1000,
+                "mean_ms": stats.seconds * 1000 / stats.calls,
+                "max_ms": stats.max_seconds * 1000,
+                "mean_alloc_kib": stats.allocated / 1024 / stats.calls,
+                "max_alloc_kib": stats.max_allocated / 1024,
+            }
+            for (stage, field), stats in items
+        ]
+        return sorted(rows, key=lambda row: row["total_ms"], reverse=True)
+
+    def table(self) -> str:
+        rows = self.rows()
+        total = sum(row["total_ms"] for row in rows) or 1.0
+        header = f'{"stage":<30}{"field":>6}{"calls":>8}{"total ms":>12}{"share":>8}{"mean ms":>10}{"max ms":>10}'
+        if self.allocations:
+            header += f'{"alloc KiB":>11}{"max KiB":>10}'
+        lines = [header]
+        for row in rows:
+            line = (
+                f'{row["stage"]:<30}{row["field"]:>6}{row["calls"]:>8}{row["total_ms"]:>12.1f}'
+                f'{row["total_ms"] / total:>8.1%}{row["mean_ms"]:>10.2f}{row["max_ms"]:>10.2f}'
+            )
+            if self.allocations:
+                line += f'{row["mean_alloc_kib"]:>11.0f}{row["max_alloc_kib"]:>10.0f}'
+            lines.append(line)
+        return '\n'.join(lines)
@@ -0,0 +1,62 @@
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Dict, Union
+
+from app.logs import logger
+
+Templates = Dict[str, Dict[str, Union[int, float, bool]]]
+
+TEMPLATES_URL = 'https://raw.githubusercontent.com/JargeZ/vhs/master/builtin_templates.json'
+
+bundled_templates_path = Path(__file__).parent.parent / 'builtin_templates.json'
+if getattr(sys, 'frozen', False):
+    bundled_templates_path = Path(f'{sys._MEIPASS}/builtin_templates.json')
+
+cached_templates_path = Path(os.environ.get('XDG_CACHE_HOME', Path.home() / '.cache')) / 'ntscQT' / 'builtin_templates.json'
+
+
+def _read_templates(path: Path) -> Union[Templates, None]:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            templates = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return templates if isinstance(templates, dict) else None
+
+
+def load_templates() -> Templates:
+    """Templates available right away: the last downloaded copy, else the one shipped with the app"""
+    for path in (cached_templates_path, bundled_templates_path):
+        templates = _read_templates(path)
+        if templates:
+            logger.debug(f'Templates loaded from {path}')
+            return templates
+    logger.warning('No builtin templates found')
+    return {}
+
+
+def fetch_templates(timeout: float = 10) -> Union[Templates, None]:
+    """Download the current templates and cache them for the next start, None when offline"""
+    import requests
+
+    try:
+        res = requests.get(TEMPLATES_URL, timeout=timeout)
+        res.raise_for_status()
+        templates = json.loads(res.content)
+    except Exception as e:
+        logger.info(f'Templates not refreshed: {e}')
+        return None
+    if not isinstance(templates, dict):
+        return None
+
+    try:
+        cached_templates_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = cached_templates_path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(templates, f, indent=2)
+        tmp_path.replace(cached_templates_path)
+    except OSError as e:
+        logger.warning(f'Templates cache not written: {e}')
+    return templates
@@ -0,0 +1,7 @@
+"""
+Performance tooling, run from the repository root:
+
+    python -m benchmarks.ntsc_stages    micro-benchmarks of every app/ntsc.py stage
+    python -m benchmarks.render_e2e     whole renders of synthetic clips with every preset
+    python -m benchmarks.golden         golden outputs to check a faster engine against
+"""
@@ -0,0 +1,216 @@
+"""
+Golden outputs of the effect, to check that a faster engine still looks the same:
+
+    python -m benchmarks.golden record golden.npz     on the reference commit
+    python -m benchmarks.golden check golden.npz      after the change
+
+Fixed synthetic frames are rendered through apply_main_effect with every builtin template, a few
+random_ntsc seeds and a preset with every stage on, at fixed _noise_seed and frame numbers. The YIQ
+after each composite_layer stage of both fields and the final frame are stored compressed.
+`check` renders the same cases with `--engine` (the current Ntsc by default) and compares every
+array by PSNR and maximum error; the first stage out of tolerance in each case is reported
+"""
+import argparse
+import importlib
+import json
+import math
+import sys
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple, Union
+
+import numpy
+
+from app import render_core
+from app.ntsc import Ntsc, apply_parameters, random_ntsc
+from app.templates import bundled_templates_path
+from benchmarks.ntsc_stages import bench_ntsc
+from benchmarks.synthetic import synthetic_frame
+
+# small frames keep the golden file at a few tens of MB, the stages see the same structure
+DEFAULT_HEIGHT = 120
+NOISE_SEED = 7
+FRAMENOS = (0, 1)
+SEEDS = (0, 1, 2)
+# random_ntsc seed the templates are applied on top of, same as the command line renderer
+TEMPLATE_BASE_SEED = 18
+ALL_STAGES = 'all stages'
+
+# (minimum PSNR in dB, maximum absolute error); YIQ is 8 bit scaled by 256, so 256 is one level
+STAGE_TOLERANCE = (60.0, 256)
+OUTPUT_TOLERANCE = (50.0, 1)
+# stage name -> tolerance, for stages allowed to differ more than the default
+TOLERANCES: Dict[str, Tuple[float, float]] = {}
+
+# engine(seed, template) -> Ntsc-like object with composite_layer and the profiler hook
+Engine = Callable[[Union[int, None], Union[dict, None]], Ntsc]
+
+
+def reference_ntsc(seed: Union[int, None], template: Union[dict, None]) -> Ntsc:
+    if template is None and seed is None:
+        nt = bench_ntsc()
+    else:
+        nt = random_ntsc(seed)
+        nt._enable_ringing2 = True
+        apply_parameters(nt, template or {})
+    return nt
+
+
+def presets() -> Dict[str, Tuple[Union[int, None], Union[dict, None]]]:
+    """preset name -> (random_ntsc seed, template values); no seed and no template is every stage on"""
+    with open(bundled_templates_path, 'r', encoding='utf-8') as f:
+        templates = json.load(f)
+    cases = {name: (TEMPLATE_BASE_SEED, values) for name, values in templates.items()}
+    cases.update({f'seed {seed}': (seed, None) for seed in SEEDS})
+    cases[ALL_STAGES] = (None, None)
+    return cases
+
+
+class StageRecorder:
+    """Profiler stand-in for Ntsc.profiler that keeps a copy of the YIQ after every stage"""
+
+    def __init__(self):
+        self.arrays: Dict[str, numpy.ndarray] = {}
+        self._index = 0
+
+    def _keep(self, stage: str, field: int, yiq: numpy.ndarray):
+        self.arrays[f'field {field}|{self._index:02d} {stage}'] = yiq.copy()
+        self._index += 1
+
+    def measure(self, stage: str, field: int, func: Callable, *args):
+        result = func(*args)
+        if stage == 'bgr2yiq':
+            self._keep(stage, field, result)
+        return result
+
+    def wrap(self, names: List[str], stages: list, field: int) -> list:
+        def run(yiq, name, apply):
+            apply(yiq)
+            self._keep(name, field, yiq)
+
+        return [
+            (enabled, lambda yiq, name=name, apply=apply: run(yiq, name, apply))
+            for name, (enabled, apply) in zip(names, stages)
+        ]
+
+
+def render_case(engine: Engine, seed, template, frameno: int, height: int) -> Dict[str, numpy.ndarray]:
+    """Stage arrays and the final frame of one case"""
+    nt = engine(seed, template)
+    nt._noise_seed = NOISE_SEED
+    recorder = StageRecorder()
+    nt.profiler = recorder
+
+    frame1 = synthetic_frame(height, seed=0)
+    frame2 = synthetic_frame(height, seed=1)
+    render_core.update_chromaencoding(nt, frameno)
+    output = render_core.apply_main_effect(nt, frame1, frame2, frameno)
+    arrays = recorder.arrays
+    arrays['output'] = output
+    return arrays
+
+
+def cases(engine: Engine, height: int):
+    """(case name, arrays) of every preset and frame number"""
+    for preset, (seed, template) in presets().items():
+        for frameno in FRAMENOS:
+            yield f'{preset}|frame {frameno}', render_case(engine, seed, template, frameno, height)
+
+
+def stage_of(key: str) -> str:
+    return key.rsplit('|', 1)[-1].split(' ', 1)[-1]
+
+
+def difference(golden: numpy.ndarray, current: numpy.ndarray, peak: float) -> Tuple[float, float]:
+    """(PSNR in dB, maximum absolute error)"""
+    diff = golden.astype(numpy.float64) - current.astype(numpy.float64)
+    mse = float(numpy.mean(diff * diff))
+    psnr = math.inf if mse == 0 else 10 * math.log10(peak * peak / mse)
+    return psnr, float(numpy.abs(diff).max(initial=0))
+
+
+def tolerance(stage: str) -> Tuple[float, float]:
+    if stage in TOLERANCES:
+        return TOLERANCES[stage]
+    return OUTPUT_TOLERANCE if stage == 'output' else STAGE_TOLERANCE
+
+
+def record(path: Path, height: int, engine: Engine = reference_ntsc) -> int:
+    arrays = {}
+    for case, case_arrays in cases(engine, height):
+        arrays.update({f'{case}|{key}': array for key, array in case_arrays.items()})
+    numpy.savez_compressed(path, height=numpy.array(height), **arrays)
+    return len(arrays)
+
+
+def check(path: Path, engine: Engine = reference_ntsc) -> List[str]:
+    """Failures, one line per case: the first array out of tolerance"""
+    golden = numpy.load(path)
+    height = int(golden['height'])
+    by_case: Dict[str, List[str]] = {}
+    for key in golden.files:
+        if key != 'height':
+            # 'preset|frame n|field f|nn stage' or 'preset|frame n|output'
+            case = '|'.join(key.split('|', 2)[:2])
+            by_case.setdefault(case, []).append(key)
+
+    failures = []
+    compared = dict(cases(engine, height))
+    for case, keys in by_case.items():
+        current = compared.get(case)
+        if current is None:
+            failures.append(f'{case}: missing')
+            continue
+        worst = math.inf
+        for key in keys:
+            array_key = key[len(case) + 1:]
+            stage = stage_of(array_key)
+            expected = golden[key]
+            actual = current.get(array_key)
+            if actual is None or actual.shape != expected.shape:
+                failures.append(f'{case}: {array_key} missing or of another shape')
+                break
+            psnr, max_error = difference(expected, actual, 255.0 if stage == 'output' else 255.0 * 256)
+            worst = min(worst, psnr)
+            min_psnr, max_allowed = tolerance(stage)
+            if psnr < min_psnr or max_error > max_allowed:
+                failures.append(f'{case}: {array_key} PSNR {psnr:.1f} dB, max error {max_error:g}')
+                break
+        else:
+            print(f'{case:<40} ok, lowest PSNR {worst:.1f} dB')
+    return failures
+
+
+def load_engine(spec: str) -> Engine:
+    """'package.module:callable'"""
+    module, _, name = spec.partition(':')
+    return getattr(importlib.import_module(module), name)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.golden', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+    record_parser = commands.add_parser('record', help='render the cases and store them')
+    record_parser.add_argument('golden', type=Path)
+    record_parser.add_argument('--height', type=int, default=DEFAULT_HEIGHT, help='frame height in lines')
+    check_parser = commands.add_parser('check', help='compare an engine against stored cases')
+    check_parser.add_argument('golden', type=Path)
+    for command in (record_parser, check_parser):
+        command.add_argument('--engine', default='benchmarks.golden:reference_ntsc',
+                             help='module:callable(seed, template) returning the Ntsc to render with')
+    args = parser.parse_args(argv)
+
+    engine = load_engine(args.engine)
+    if args.command == 'record':
+        count = record(args.golden, args.height, engine)
+        print(f'{count} arrays written to {args.golden}')
+        return 0
+
+    failures = check(args.golden, engine)
+    for failure in failures:
+        print(f'FAILED {failure}')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,204 @@
+"""
+Micro-benchmarks of the app/ntsc.py functions and Ntsc stages on synthetic frames:
+
+    python -m benchmarks.ntsc_stages --output before.json
+    python -m benchmarks.ntsc_stages --baseline before.json --threshold 0.1
+
+Every case runs on a fresh copy of its input with the random generators reseeded, so runs compare.
+With a baseline, the exit code is 1 when any case got slower than the threshold allows
+"""
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+from functools import partial
+from pathlib import Path
+from typing import Callable, Dict, List
+
+import numpy
+
+from app.ntsc import (
+    Ntsc, NumpyRandom, VHSSpeed, bgr2yiq, yiq2bgr, cut_black_line_border, ringing, ringing2,
+    composite_lowpass, composite_lowpass_tv, composite_preemphasis, lowpassFilter, highpassFilter,
+)
+from benchmarks.synthetic import HEIGHTS, synthetic_frame, environment
+
+DEFAULT_REPEAT = 5
+# a case regresses when its median got this much slower than the baseline
+DEFAULT_THRESHOLD = 0.10
+
+SP = VHSSpeed.VHS_SP
+
+
+class Inputs:
+    """Inputs at one frame height: the BGR frame, its YIQ and the YIQ with the chroma on the subcarrier"""
+
+    def __init__(self, height: int):
+        self.frame = synthetic_frame(height)
+        self.yiq = bgr2yiq(self.frame)
+        self.composite = self.yiq.copy()
+        bench_ntsc().chroma_into_luma(self.composite, 0, 0, 50)
+
+    def fresh_yiq(self) -> numpy.ndarray:
+        return self.yiq.copy()
+
+    def fresh_composite(self) -> numpy.ndarray:
+        return self.composite.copy()
+
+
+def bench_ntsc() -> Ntsc:
+    """Ntsc with every stage switched on at a moderate strength"""
+    nt = Ntsc(precise=False, random=NumpyRandom(0))
+    nt._composite_preemphasis = 4.0
+    nt._ringing = 0.7
+    nt._video_noise = 100
+    nt._video_chroma_noise = 1000
+    nt._video_chroma_phase_noise = 10
+    nt._video_chroma_loss = 1000
+    nt._color_bleed_horiz = 4
+    nt._color_bleed_vert = 2
+    nt._vhs_edge_wave = 4
+    nt._vhs_head_switching = True
+    nt._emulating_vhs = True
+    return nt
+
+
+# name -> builds the call to time from a reseeded Ntsc and the inputs, all copying happens here
+Case = Callable[[Ntsc, Inputs], Callable[[], object]]
+
+CASES: Dict[str, Case] = {
+    'bgr2yiq': lambda nt, i: partial(bgr2yiq, i.frame),
+    'yiq2bgr': lambda nt, i: partial(yiq2bgr, i.yiq),
+    'cut_black_line_border': lambda nt, i: partial(cut_black_line_border, i.frame.copy()),
+    'lowpassFilter': lambda nt, i: partial(lowpassFilter, i.yiq[0, 0], 1300000.0, 0.0),
+    'highpassFilter': lambda nt, i: partial(highpassFilter, i.yiq[0, 0], 1000000.0, 16.0),
+    'ringing': lambda nt, i: partial(ringing, i.yiq[0, ::2], 0.7, clip=False),
+    'ringing_freq_noise': lambda nt, i: partial(ringing, i.yiq[0, ::2], 0.7, noiseSize=0.8, clip=False, seed=0),
+    'ringing2': lambda nt, i: partial(ringing2, i.yiq[0, ::2], power=4, clip=False),
+    'composite_lowpass': lambda nt, i: partial(composite_lowpass, i.fresh_yiq(), 0, 0),
+    'composite_lowpass_tv': lambda nt, i: partial(composite_lowpass_tv, i.fresh_yiq(), 0, 0),
+    'composite_preemphasis': lambda nt, i: partial(composite_preemphasis, i.fresh_composite(), 0, 4.0, 1000000.0),
+    'Ntsc.ringing': lambda nt, i: partial(nt.ringing, i.fresh_yiq(), 0, 0),
+    'Ntsc.chroma_into_luma': lambda nt, i: partial(nt.chroma_into_luma, i.fresh_yiq(), 0, 0, 50),
+    'Ntsc.chroma_from_luma': lambda nt, i: partial(nt.chroma_from_luma, i.fresh_composite(), 0, 0, 50),
+    'Ntsc.video_noise': lambda nt, i: partial(nt.video_noise, i.fresh_composite(), 0, 100),
+    'Ntsc.video_chroma_noise': lambda nt, i: partial(nt.video_chroma_noise, i.fresh_yiq(), 0, 1000),
+    'Ntsc.video_chroma_phase_noise': lambda nt, i: partial(nt.video_chroma_phase_noise, i.fresh_yiq(), 0, 10),
+    'Ntsc.vhs_head_switching': lambda nt, i: partial(nt.vhs_head_switching, i.fresh_yiq(), 0, 0),
+    'Ntsc.vhs_luma_lowpass': lambda nt, i: partial(nt.vhs_luma_lowpass, i.fresh_yiq(), 0, SP.luma_cut),
+    'Ntsc.vhs_chroma_lowpass':
+        lambda nt, i: partial(nt.vhs_chroma_lowpass, i.fresh_yiq(), 0, SP.chroma_cut, SP.chroma_delay),
+    'Ntsc.vhs_chroma_vert_blend': lambda nt, i: partial(nt.vhs_chroma_vert_blend, i.fresh_yiq(), 0),
+    'Ntsc.vhs_sharpen': lambda nt, i: partial(nt.vhs_sharpen, i.fresh_yiq(), 0, SP.luma_cut),
+    'Ntsc.vhs_edge_wave': lambda nt, i: partial(nt.vhs_edge_wave, i.fresh_yiq(), 0),
+    'Ntsc.vhs_tracking_error': lambda nt, i: partial(nt.vhs_tracking_error, i.fresh_yiq(), 0, 50),
+    'Ntsc.vhs_chroma_loss': lambda nt, i: partial(nt.vhs_chroma_loss, i.fresh_yiq(), 0, 1000),
+    'Ntsc.color_bleed': lambda nt, i: partial(nt.color_bleed, i.fresh_yiq(), 0),
+    'Ntsc.emulate_vhs': lambda nt, i: partial(nt.emulate_vhs, i.fresh_yiq(), 0, 0),
+    'Ntsc.blur_chroma': lambda nt, i: partial(nt._blur_chroma_field, i.fresh_yiq(), 0),
+    'Ntsc.composite_layer': lambda nt, i: partial(nt.composite_layer, i.frame, i.frame, 0, 0, 0),
+}
+
+
+def time_case(case: Case, nt: Ntsc, inputs: Inputs, repeat: int) -> List[float]:
+    """Seconds of `repeat` runs, after one untimed run that also pulls in scipy and cv2"""
+    times = []
+    for run in range(repeat + 1):
+        nt.random.seed(0)
+        nt.tracking_random = random.Random(0)
+        call = case(nt, inputs)
+        started = time.perf_counter()
+        call()
+        if run:
+            times.append(time.perf_counter() - started)
+    return times
+
+
+def run(cases: List[str], heights: List[int], repeat: int) -> dict:
+    results = {name: {} for name in cases}
+    for height in heights:
+        inputs = Inputs(height)
+        nt = bench_ntsc()
+        for name in cases:
+            times = time_case(CASES[name], nt, inputs, repeat)
+            results[name][str(height)] = {
+                "median_ms": statistics.median(times) * 1000,
+                "min_ms": min(times) * 1000,
+                "runs": len(times),
+            }
+            print(f'{name:<32}{height:>6}{results[name][str(height)]["median_ms"]:>12.3f} ms', file=sys.stderr)
+    return {"environment": environment(), "repeat": repeat, "results": results}
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> List[str]:
+    """Prints current against baseline medians, returns the regressed 'case@height' entries"""
+    regressions = []
+    print(f'{"case":<32}{"height":>6}{"baseline ms":>14}{"current ms":>14}{"change":>9}')
+    for name, by_height in current["results"].items():
+        for height, result in by_height.items():
+            before = baseline["results"].get(name, {}).get(height)
+            if before is None:
+                print(f'{name:<32}{height:>6}{"-":>14}{result["median_ms"]:>14.3f}{"new":>9}')
+                continue
+            change = result["median_ms"] / before["median_ms"] - 1 if before["median_ms"] > 0 else 0.0
+            regressed = change > threshold
+            if regressed:
+                regressions.append(f'{name}@{height}')
+            print(
+                f'{name:<32}{height:>6}{before["median_ms"]:>14.3f}{result["median_ms"]:>14.3f}{change:>+9.1%}'
+                + ('  REGRESSION' if regressed else '')
+            )
+    return regressions
+
+
+def print_results(current: dict):
+    heights = sorted({int(height) for by_height in current["results"].values() for height in by_height})
+    print(f'{"case":<32}' + ''.join(f'{f"{height} ms":>12}' for height in heights))
+    for name, by_height in current["results"].items():
+        print(f'{name:<32}' + ''.join(
+            f'{by_height[str(height)]["median_ms"]:>12.3f}' if str(height) in by_height else f'{"-":>12}'
+            for height in heights
+        ))
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.ntsc_stages', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--heights', type=int, nargs='+', default=list(HEIGHTS), help='frame heights in lines')
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help='timed runs per case and height')
+    parser.add_argument('--cases', nargs='+', help='only cases whose name contains one of these')
+    parser.add_argument('--list', action='store_true', help='list the cases and exit')
+    parser.add_argument('--output', type=Path, help='save the results as JSON')
+    parser.add_argument('--baseline', type=Path, help='results JSON to compare against')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='allowed slowdown against the baseline, 0.1 is 10%%')
+    args = parser.parse_args(argv)
+
+    if args.list:
+        print('\n'.join(CASES))
+        return 0
+    cases = [name for name in CASES if not args.cases or any(part in name for part in args.cases)]
+    if not cases:
+        parser.error('no case matches --cases')
+
+    current = run(cases, args.heights, max(1, args.repeat))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(current, f, indent=2)
+
+    if args.baseline is None:
+        print_results(current)
+        return 0
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    regressions = compare(current, baseline, args.threshold)
+    if regressions:
+        print(f'{len(regressions)} regression(s) over {args.threshold:.0%}: {", ".join(regressions)}')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
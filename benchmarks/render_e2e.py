@@ -0,0 +1,229 @@
+"""
+End-to-end render benchmark on synthetic clips made locally with ffmpeg's testsrc:
+
+    python -m benchmarks.render_e2e --output renders.json
+    python -m benchmarks.render_e2e --heights 480 --rates 60000/1001 --presets RGM --seeds
+
+Every clip is rendered through DefaultRenderer and InterlacedRenderer with every builtin template
+and a few random_ntsc seeds, each render in a fresh process so its peak RSS is its own.
+Reports frames per second, peak RSS and output size per combination
+"""
+import argparse
+import json
+import multiprocessing
+import queue
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+from fractions import Fraction
+from pathlib import Path
+from typing import List, Union
+
+from benchmarks.synthetic import environment
+
+DEFAULT_HEIGHTS = (240, 480, 720)
+# NTSC film/video rate and the field rate the GUI treats as interlaced
+DEFAULT_RATES = ('30000/1001', '60000/1001')
+DEFAULT_SECONDS = 2.0
+DEFAULT_SEEDS = (0, 1, 2)
+# random_ntsc seed the templates are applied on top of, same as the command line renderer
+TEMPLATE_BASE_SEED = 18
+RENDERERS = ('DefaultRenderer', 'InterlacedRenderer')
+
+
+def make_clip(directory: Path, height: int, rate: str, seconds: float) -> Path:
+    """testsrc clip with a tone, generated once and reused"""
+    width = height * 4 // 3 // 4 * 4
+    path = directory / f'testsrc_{height}p_{rate.replace("/", "_")}_{seconds:g}s.mp4'
+    if path.exists():
+        return path
+    directory.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f'tmp_{path.name}')
+    subprocess.run([
+        'ffmpeg', '-y', '-v', 'error',
+        '-f', 'lavfi', '-i', f'testsrc=size={width}x{height}:rate={rate}:duration={seconds}',
+        '-f', 'lavfi', '-i', f'sine=frequency=1000:duration={seconds}',
+        '-c:v', 'libx264', '-preset', 'ultrafast', '-pix_fmt', 'yuv420p', '-c:a', 'aac', '-shortest',
+        str(tmp_path),
+    ], check=True, stdin=subprocess.DEVNULL)
+    tmp_path.replace(path)
+    return path
+
+
+def load_presets(names: Union[List[str], None], seeds: List[int]) -> dict:
+    """preset name -> (random_ntsc seed, template values or None)"""
+    from app.templates import bundled_templates_path
+
+    with open(bundled_templates_path, 'r', encoding='utf-8') as f:
+        templates = json.load(f)
+    if names is not None:
+        missing = set(names) - set(templates)
+        if missing:
+            raise ValueError(f'Unknown templates: {", ".join(sorted(missing))}')
+        templates = {name: templates[name] for name in names}
+    presets = {name: (TEMPLATE_BASE_SEED, values) for name, values in templates.items()}
+    presets.update({f'seed {seed}': (seed, None) for seed in seeds})
+    return presets
+
+
+def peak_rss_mib() -> Union[float, None]:
+    """Peak RSS of this process. Not of its children, Linux counts the memory they had when forked"""
+    try:
+        import resource
+    except ImportError:
+        # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (2 ** 20 if sys.platform == 'darwin' else 2 ** 10), 1)
+
+
+def render_one(job: dict, results):
+    """Runs in its own process: one clip, renderer and preset"""
+    try:
+        from app.logs import add_sink, remove_sink, stderr_handler
+        from app.cli import input_video_info
+        from app.ntsc import apply_parameters, random_ntsc
+        from app.InterlacedRenderer import InterlacedRenderer
+        from app.Renderer import DefaultRenderer
+
+        # the result table is on stdout, keep the debug log off the terminal
+        remove_sink(stderr_handler)
+        add_sink(sys.stderr, level='WARNING')
+
+        renderer_class = {'DefaultRenderer': DefaultRenderer, 'InterlacedRenderer': InterlacedRenderer}[job["renderer"]]
+        input_video = input_video_info(Path(job["clip"]))
+
+        nt = random_ntsc(job["seed"])
+        nt._enable_ringing2 = True
+        apply_parameters(nt, job["template"] or {})
+
+        renderer = renderer_class()
+        step = 2 if renderer.interlaced else 1
+        framecount = -(-input_video["frames_count"] // step)
+        output = Path(job["output"])
+        renderer.render_data = {
+            "target_file": output,
+            "nt": nt,
+            "input_video": input_video,
+            "input_height": input_video["height"],
+            "upscale_2x": False,
+            "lossless": job["lossless"],
+            "framecount": framecount,
+            "workers": job["workers"],
+            "segment_parallel": False,
+            "audio_process": False,
+        }
+
+        started = time.perf_counter()
+        written = renderer.run()
+        seconds = time.perf_counter() - started
+        if not written:
+            raise RuntimeError('Nothing rendered')
+
+        results.put({
+            "frames": renderer.framecount,
+            "seconds": round(seconds, 3),
+            "fps": round(renderer.framecount / seconds, 3),
+            "peak_rss_mib": peak_rss_mib(),
+            "output_bytes": output.stat().st_size,
+        })
+        output.unlink()
+    except Exception:
+        results.put({"error": traceback.format_exc()})
+
+
+def run_isolated(job: dict) -> dict:
+    ctx = multiprocessing.get_context('spawn')
+    results = ctx.Queue()
+    process = ctx.Process(target=render_one, args=(job, results))
+    process.start()
+    while True:
+        try:
+            result = results.get(timeout=1)
+            break
+        except queue.Empty:
+            if process.is_alive():
+                continue
+        # crashed or killed before it could put a result, unless the result is still in the pipe
+        try:
+            result = results.get(timeout=1)
+        except queue.Empty:
+            result = {"error": f'Render process exited with code {process.exitcode}'}
+        break
+    process.join()
+    return result
+
+
+def print_row(row: dict):
+    if "error" in row:
+        result = 'FAILED ' + row["error"].strip().splitlines()[-1]
+    else:
+        rss = '-' if row["peak_rss_mib"] is None else f'{row["peak_rss_mib"]:.0f}'
+        result = f'{row["fps"]:>9.2f}{rss:>10}{row["output_bytes"] / 2 ** 20:>10.2f}'
+    print(f'{row["height"]:>6}{row["rate"]:>12}  {row["renderer"]:<20}{row["preset"]:<16}{result}', flush=True)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.render_e2e', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--heights', type=int, nargs='+', default=list(DEFAULT_HEIGHTS), help='clip heights')
+    parser.add_argument('--rates', nargs='+', default=list(DEFAULT_RATES), help='clip frame rates, like 30000/1001')
+    parser.add_argument('--seconds', type=float, default=DEFAULT_SECONDS, help='clip duration')
+    parser.add_argument('--renderers', nargs='+', choices=RENDERERS, default=list(RENDERERS))
+    parser.add_argument('--presets', nargs='*', help='builtin templates to use, all by default, none with no names')
+    parser.add_argument('--seeds', type=int, nargs='*', default=list(DEFAULT_SEEDS), help='random_ntsc seeds')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='render processes, only the peak RSS of the main one is measured')
+    parser.add_argument('--encode', action='store_true', help='x264 output like a normal render, not lossless')
+    parser.add_argument('--clips', type=Path, default=Path(tempfile.gettempdir()) / 'ntscqt_bench',
+                        help='where clips are generated and kept')
+    parser.add_argument('--output', type=Path, help='save the results as JSON')
+    args = parser.parse_args(argv)
+
+    for rate in args.rates:
+        try:
+            Fraction(rate)
+        except ValueError:
+            parser.error(f'not a frame rate: {rate}')
+
+    try:
+        presets = load_presets(args.presets, args.seeds)
+    except ValueError as e:
+        parser.error(str(e))
+    rows = []
+    print(f'{"height":>6}{"rate":>12}  {"renderer":<20}{"preset":<16}{"fps":>9}{"RSS MiB":>10}{"out MiB":>10}')
+    for height in args.heights:
+        for rate in args.rates:
+            clip = make_clip(args.clips, height, rate, args.seconds)
+            for renderer in args.renderers:
+                for preset, (seed, template) in presets.items():
+                    row = {"clip": clip.name, "height": height, "rate": rate, "renderer": renderer, "preset": preset}
+                    row.update(run_isolated({
+                        "clip": str(clip),
+                        "output": str(args.clips / f'out_{clip.stem}.mkv'),
+                        "renderer": renderer,
+                        "seed": seed,
+                        "template": template,
+                        "workers": args.workers,
+                        "lossless": not args.encode,
+                    }))
+                    print_row(row)
+                    rows.append(row)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({
+                "environment": environment(),
+                "seconds": args.seconds,
+                "workers": args.workers,
+                "lossless": not args.encode,
+                "results": rows,
+            }, f, indent=2)
+    return 1 if any("error" in row for row in rows) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,51 @@
+import platform
+import sys
+import time
+
+import numpy
+
+HEIGHTS = (240, 480, 720, 1080)
+
+
+def frame_width(height: int) -> int:
+    """4:3 width, divisible by 4 like every frame the renderer hands to Ntsc"""
+    return height * 4 // 3 // 4 * 4
+
+
+def synthetic_frame(height: int, seed: int = 0) -> numpy.ndarray:
+    """
+    BGR test picture: colour bars over the top half, a luma ramp below and some fine noise,
+    so the filters see sharp edges, smooth gradients and high frequencies. Same seed, same frame
+    """
+    width = frame_width(height)
+    frame = numpy.empty((height, width, 3), dtype=numpy.uint8)
+
+    bars = numpy.array([
+        (192, 192, 192), (0, 192, 192), (192, 192, 0), (0, 192, 0),
+        (192, 0, 192), (0, 0, 192), (192, 0, 0), (16, 16, 16),
+    ], dtype=numpy.uint8)
+    columns = numpy.arange(width) * len(bars) // width
+    frame[:height // 2] = bars[columns]
+
+    ramp = numpy.linspace(0, 255, width, dtype=numpy.float32)
+    frame[height // 2:] = ramp[None, :, None].astype(numpy.uint8)
+
+    noise = numpy.random.RandomState(seed).randint(-12, 13, size=frame.shape)
+    return numpy.clip(frame.astype(numpy.int16) + noise, 0, 255).astype(numpy.uint8)
+
+
+def environment() -> dict:
+    """Versions and machine a result was measured with"""
+    import cv2
+    import scipy
+
+    return {
+        "time": time.strftime('%Y-%m-%dT%H:%M:%S'),
+        "python": sys.version.split()[0],
+        "numpy": numpy.__version__,
+        "scipy": scipy.__version__,
+        "opencv": cv2.__version__,
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+    }
@@ -1,27 +1,11 @@
+import multiprocessing
 import os
 import sys
 from pathlib import Path
 import traceback
 
-from PyQt5 import QtCore, QtWidgets
-from PyQt5.QtCore import QLibraryInfo
-from PyQt5.QtCore import QFile, QTextStream
-from PyQt5 import QtGui
-import darkdetect
-
-import colorama
-import qdarktheme
-
-from app import NtscApp
 from app import logger
 
-import traceback
-from halo import Halo
-
-os.environ["QT_QPA_PLATFORM_PLUGIN_PATH"] = QLibraryInfo.location(
-    QLibraryInfo.PluginsPath
-)
-
 def crash_handler(etype, value, tb):
     logger.trace(value)
     traceback.print_exception(etype, value, tb)
@@ -35,6 +19,21 @@ def cls():
 sys.excepthook = crash_handler
 
 def main():
+    # spawned render workers re-import this file, keep the GUI imports out of their way
+    from PyQt5 import QtCore, QtWidgets
+    from PyQt5.QtCore import QLibraryInfo
+    from PyQt5 import QtGui
+    import darkdetect
+    import colorama
+    import qdarktheme
+    from halo import Halo
+
+    from app import NtscApp
+
+    os.environ["QT_QPA_PLATFORM_PLUGIN_PATH"] = QLibraryInfo.location(
+        QLibraryInfo.PluginsPath
+    )
+
     translator = QtCore.QTranslator()
     locale = QtCore.QLocale.system().name()
 
@@ -78,4 +77,6 @@ def main():
 
 
 if __name__ == '__main__':
+    # render workers are spawned processes, needed for pyinstaller builds
+    multiprocessing.freeze_support()
     main()
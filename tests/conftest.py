@@ -0,0 +1,4 @@
+import os
+
+# app.logs opens its log file on import, test runs must not write one into the checkout
+os.environ['NTSCQT_LOG_FILE'] = ''
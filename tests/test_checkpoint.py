@@ -0,0 +1,103 @@
+from pathlib import Path
+
+from app.checkpoint import ChunkWriter, RenderManifest, config_hash
+from app.ntsc import Ntsc, NumpyRandom
+
+N = 30
+
+
+def manifest_with_chunks(chunk_dir: Path, *ranges) -> RenderManifest:
+    manifest = RenderManifest.open(chunk_dir, 'hash', 'source')
+    for start, end in ranges:
+        manifest.chunk_path(start).touch()
+        manifest.add_chunk(start, end)
+    return manifest
+
+
+def test_stopped_render_joins_only_the_contiguous_chunks(tmp_path):
+    # a stopped segment render: the first and the third segment finished, the second did not
+    manifest = manifest_with_chunks(tmp_path, (2 * N, 3 * N), (0, N))
+
+    assert manifest.last_frame == N
+    assert manifest.joinable_files() == [manifest.chunk_path(0)]
+    assert manifest.chunk_files() == [manifest.chunk_path(0), manifest.chunk_path(2 * N)]
+
+
+def test_resumed_writer_drops_chunks_past_the_gap(tmp_path):
+    manifest = manifest_with_chunks(tmp_path, (0, N), (2 * N, 3 * N))
+
+    writer = ChunkWriter(manifest, lambda path: None, N)
+
+    assert writer.frameno == N
+    assert manifest.chunk_files() == [manifest.chunk_path(0)]
+    assert not manifest.chunk_path(2 * N).exists()
+    reopened = RenderManifest.open(tmp_path, 'hash', 'source')
+    assert [chunk["start"] for chunk in reopened.chunks] == [0]
+
+
+def test_chunking_mode_is_part_of_the_config_hash():
+    nt = Ntsc(precise=False, random=NumpyRandom(0))
+    sequential = config_hash(nt, {"segment_parallel": False}, False, True)
+    segments = config_hash(nt, {"segment_parallel": True}, False, True)
+    assert sequential != segments
+
+
+def test_bytes_written_is_counted_once_per_chunk(tmp_path):
+    manifest = RenderManifest.open(tmp_path, 'hash', 'source')
+    for start, size in ((0, 100), (N, 50), (2 * N, 25)):
+        manifest.chunk_path(start).write_bytes(b'x' * size)
+        manifest.add_chunk(start, start + N)
+    assert manifest.bytes_written == 175
+
+    # a chunk file gone after the fact doesn't matter any more
+    manifest.chunk_path(0).unlink()
+    assert manifest.bytes_written == 175
+
+    manifest.discard_from(2 * N)
+    assert manifest.bytes_written == 150
+    assert RenderManifest.open(tmp_path, 'hash', 'source').bytes_written == 50
+
+
+def test_reopening_with_the_same_settings_resumes(tmp_path):
+    manifest_with_chunks(tmp_path, (0, N), (N, 2 * N))
+
+    reopened = RenderManifest.open(tmp_path, 'hash', 'source')
+
+    assert reopened.last_frame == 2 * N
+    assert reopened.is_done(N)
+
+
+def test_reopening_with_other_settings_deletes_the_chunks(tmp_path):
+    manifest = manifest_with_chunks(tmp_path, (0, N))
+
+    reopened = RenderManifest.open(tmp_path, 'other hash', 'source')
+
+    assert reopened.chunks == []
+    assert not manifest.chunk_path(0).exists()
+
+
+def test_chunks_missing_on_disk_are_forgotten(tmp_path):
+    manifest = manifest_with_chunks(tmp_path, (0, N), (N, 2 * N))
+    manifest.chunk_path(N).unlink()
+
+    assert RenderManifest.open(tmp_path, 'hash', 'source').last_frame == N
+
+
+def test_time_range_render_starts_at_its_first_frame(tmp_path):
+    manifest = RenderManifest.open(tmp_path, 'hash', 'source', first_frame=2 * N)
+    assert manifest.last_frame == 2 * N
+    assert manifest.joinable_files() == []
+
+    manifest.chunk_path(2 * N).touch()
+    manifest.add_chunk(2 * N, 3 * N)
+    assert manifest.joinable_files() == [manifest.chunk_path(2 * N)]
+
+
+def test_discard_from_keeps_the_earlier_chunks(tmp_path):
+    manifest = manifest_with_chunks(tmp_path, (0, N), (N, 2 * N), (2 * N, 3 * N))
+
+    manifest.discard_from(N)
+
+    assert manifest.chunk_files() == [manifest.chunk_path(0)]
+    assert not manifest.chunk_path(N).exists() and not manifest.chunk_path(2 * N).exists()
+    assert RenderManifest.open(tmp_path, 'hash', 'source').last_frame == N
@@ -0,0 +1,40 @@
+import json
+import shutil
+
+import cv2
+import numpy
+import pytest
+
+from app import cli
+from app.ntsc import VHSSpeed, apply_parameters, random_ntsc
+
+
+def export_preset(path, **parameters):
+    # what the config dialog writes, enums end up as plain ints in JSON
+    path.write_text(json.dumps(parameters), encoding='utf-8')
+    return path
+
+
+def test_preset_enum_values_are_restored(tmp_path):
+    preset = export_preset(tmp_path / 'vhs.json', _emulating_vhs=True, _output_vhs_tape_speed=int(VHSSpeed.VHS_EP))
+
+    nt = random_ntsc(18)
+    apply_parameters(nt, cli.load_preset(preset))
+
+    assert nt._output_vhs_tape_speed is VHSSpeed.VHS_EP
+    frame = numpy.zeros((48, 64, 3), dtype=numpy.uint8)
+    nt.composite_layer(frame, frame, field=0, fieldno=0, frameno=0)
+
+
+@pytest.mark.skipif(shutil.which('ffmpeg') is None, reason='ffmpeg is needed to join the rendered chunks')
+def test_render_with_exported_vhs_preset(tmp_path):
+    clip = tmp_path / 'clip.avi'
+    writer = cv2.VideoWriter(str(clip), cv2.VideoWriter_fourcc(*'MJPG'), 25, (64, 48))
+    for i in range(4):
+        writer.write(numpy.full((48, 64, 3), i * 60, dtype=numpy.uint8))
+    writer.release()
+    preset = export_preset(tmp_path / 'vhs.json', _emulating_vhs=True, _output_vhs_tape_speed=int(VHSSpeed.VHS_LP))
+    output = tmp_path / 'out.mkv'
+
+    assert cli.main(['render', str(clip), str(output), '--preset', str(preset), '--lossless']) == 0
+    assert output.exists()
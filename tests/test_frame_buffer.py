@@ -0,0 +1,69 @@
+import cv2
+import numpy
+
+from app.frame_buffer import BufferedVideoStream, FrameBuffer
+
+SHAPE = (4, 6, 3)
+
+
+def frame(value: int) -> numpy.ndarray:
+    return numpy.full(SHAPE, value, dtype=numpy.uint8)
+
+
+def test_frames_are_found_by_index():
+    buffer = FrameBuffer(2, SHAPE)
+    buffer[0] = frame(10)
+    buffer[1] = frame(11)
+
+    assert buffer[0][0, 0, 0] == 10 and buffer[1][0, 0, 0] == 11
+    assert buffer[2] is None
+
+
+def test_storing_an_index_replaces_the_one_in_its_slot():
+    buffer = FrameBuffer(2, SHAPE)
+    buffer[0] = frame(10)
+    buffer[2] = frame(12)
+
+    assert buffer[0] is None
+    assert buffer[2][0, 0, 0] == 12
+
+
+def test_decoding_into_a_slot():
+    buffer = FrameBuffer(3, SHAPE)
+    buffer[4] = frame(1)
+
+    # the slot is invalid until the decoded frame is stored
+    target = buffer.slot(4)
+    assert buffer[4] is None
+    target[:] = 7
+    buffer[4] = target
+    assert buffer[4][0, 0, 0] == 7
+
+    buffer[4] = None
+    assert buffer[4] is None
+    buffer[5] = frame(5)
+    buffer.clear()
+    assert buffer[5] is None
+
+
+def test_buffered_stream_reads_every_frame(tmp_path):
+    clip = tmp_path / 'clip.avi'
+    writer = cv2.VideoWriter(str(clip), cv2.VideoWriter_fourcc(*'MJPG'), 25, (64, 48))
+    for i in range(12):
+        writer.write(numpy.full((48, 64, 3), i * 20, dtype=numpy.uint8))
+    writer.release()
+
+    # a budget of two frames, the decoder has to wait for the reader
+    stream = BufferedVideoStream(str(clip), prefetch_bytes=2 * 64 * 48 * 3).start()
+    try:
+        assert stream.depth == 2
+        dst = numpy.empty((48, 64, 3), dtype=numpy.uint8)
+        values = []
+        while stream.read(dst) is not None:
+            values.append(int(dst.mean()))
+        assert stream.read() is None
+    finally:
+        stream.stop()
+
+    assert len(values) == 12
+    assert all(abs(value - i * 20) <= 2 for i, value in enumerate(values))
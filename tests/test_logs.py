@@ -0,0 +1,63 @@
+import pytest
+
+from app.logs import SampledLogger, add_sink, level_enabled, remove_sink
+
+
+class Counted:
+    """Argument that counts how often it was formatted"""
+
+    def __init__(self):
+        self.formatted = 0
+
+    def __format__(self, spec):
+        self.formatted += 1
+        return 'counted'
+
+
+@pytest.fixture
+def records():
+    records = []
+    handler = add_sink(lambda message: records.append(message.record), level='DEBUG', format='{message}')
+    yield records
+    remove_sink(handler)
+
+
+def test_every_nth_call_is_logged(records):
+    hot = SampledLogger(every=3)
+    for i in range(7):
+        hot.debug('frame {}', i)
+
+    assert [record["message"] for record in records] == ['frame 0', 'frame 3 [4 calls]', 'frame 6 [7 calls]']
+    assert all(record["function"] == 'test_every_nth_call_is_logged' for record in records)
+
+
+def test_messages_are_counted_apart(records):
+    hot = SampledLogger(every=2)
+    for _ in range(2):
+        hot.debug('a')
+        hot.debug('b')
+
+    assert [record["message"] for record in records] == ['a', 'b']
+
+
+def test_skipped_calls_format_nothing(records):
+    if level_enabled('TRACE'):
+        pytest.skip('a sink logs TRACE')
+    hot = SampledLogger(every=2)
+    argument = Counted()
+
+    hot.trace('{}', argument)
+    hot.debug('{}', argument)
+    hot.debug('{}', argument)
+
+    assert argument.formatted == 1
+    assert [record["message"] for record in records] == ['counted']
+
+
+def test_removed_sinks_no_longer_count():
+    if level_enabled('TRACE'):
+        pytest.skip('a sink logs TRACE')
+    handler = add_sink(lambda message: None, level='TRACE')
+    assert level_enabled('TRACE')
+    remove_sink(handler)
+    assert not level_enabled('TRACE')
@@ -0,0 +1,62 @@
+import numpy
+import pytest
+
+from app.ntsc import Ntsc, NumpyRandom, Workspace, lowpassFilter
+
+
+def edge_wave_ntsc(seed: int) -> Ntsc:
+    nt = Ntsc(precise=False, random=NumpyRandom(seed))
+    nt._vhs_edge_wave = 6
+    return nt
+
+
+def padded_edge_wave(nt: Ntsc, yiq: numpy.ndarray, field: int):
+    # the numpy.pad version vhs_edge_wave replaced, only defined for even heights
+    _, height, width = yiq.shape
+    rnds = nt.random.nextIntArray(height // 2, 0, nt._vhs_edge_wave)
+    rnds = lowpassFilter(rnds, nt._output_vhs_tape_speed.luma_cut, 0.0).astype(numpy.int32)
+    for plane in yiq:
+        for y, line in enumerate(plane[field::2]):
+            if rnds[y] != 0:
+                line[:] = numpy.pad(line, (rnds[y], 0))[:-rnds[y]]
+
+
+@pytest.mark.parametrize('field', [0, 1])
+def test_edge_wave_matches_the_padded_version(field):
+    yiq = numpy.random.RandomState(1).randint(-20000, 20000, (3, 40, 64)).astype(numpy.int32)
+    expected = yiq.copy()
+    padded_edge_wave(edge_wave_ntsc(5), expected, field)
+
+    edge_wave_ntsc(5).vhs_edge_wave(yiq, field)
+
+    assert numpy.array_equal(yiq, expected)
+
+
+@pytest.mark.parametrize('field', [0, 1])
+def test_edge_wave_on_an_odd_height(field):
+    # used to raise an IndexError on the last line of the first field
+    yiq = numpy.random.RandomState(1).randint(-20000, 20000, (3, 41, 64)).astype(numpy.int32)
+    original = yiq.copy()
+
+    edge_wave_ntsc(5).vhs_edge_wave(yiq, field)
+
+    even = original[:, :40].copy()
+    padded_edge_wave(edge_wave_ntsc(5), even, field)
+    assert numpy.array_equal(yiq[:, :40], even)
+    assert numpy.array_equal(yiq[:, 40], original[:, 40])
+
+
+def test_workspace_keeps_the_arrays_of_the_current_frame():
+    workspace = Workspace(max_bytes=1000)
+    workspace.start_frame()
+    first = [workspace.get(name, (100,), numpy.int32) for name in ('a', 'b', 'c')]
+
+    # one frame needs more than the cap, none of its arrays is dropped
+    assert workspace.nbytes == 1200
+    assert all(workspace.get(name, (100,), numpy.int32) is array for name, array in zip('abc', first))
+
+    # a frame of another size replaces them
+    workspace.start_frame()
+    workspace.get('a', (200,), numpy.int32)
+    assert workspace.nbytes == 800
+    assert workspace.get('a', (100,), numpy.int32) is not first[0]
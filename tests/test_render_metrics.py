@@ -0,0 +1,85 @@
+import pytest
+
+from app import render_metrics
+from app.render_metrics import RenderMetrics, format_metrics
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def perf_counter(self) -> float:
+        return self.now
+
+    def time(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(render_metrics, 'time', clock)
+    return clock
+
+
+def render(metrics: RenderMetrics, clock: Clock, frames: int, fps: float):
+    for _ in range(frames):
+        clock.now += 1 / fps
+        metrics.frame_done()
+
+
+def test_fps_and_eta(clock):
+    metrics = RenderMetrics(100)
+    render(metrics, clock, 50, 10)
+
+    snapshot = metrics.snapshot()
+
+    assert snapshot["fps"] == pytest.approx(10)
+    assert snapshot["eta"] == pytest.approx(5.0)
+
+
+def test_fps_only_counts_the_last_seconds(clock):
+    metrics = RenderMetrics(1000)
+    render(metrics, clock, 10, 1)
+    render(metrics, clock, 200, 20)
+
+    assert metrics.fps == pytest.approx(20)
+
+
+def test_resumed_frames_are_not_counted_as_rendered(clock):
+    metrics = RenderMetrics(100, done_frames=40)
+    clock.now += 2
+    metrics.frame_done()
+
+    snapshot = metrics.snapshot()
+
+    assert snapshot["frames"] == 41
+    assert snapshot["fps"] == pytest.approx(0.5)
+    assert snapshot["eta"] == pytest.approx(59 / 0.5)
+
+
+def test_eta_follows_a_speed_change_smoothly(clock):
+    metrics = RenderMetrics(10000)
+    render(metrics, clock, 100, 10)
+    metrics.snapshot()
+    render(metrics, clock, 200, 20)
+
+    eta = metrics.snapshot()["eta"]
+
+    rate = 10 + render_metrics.SMOOTHING * (20 - 10)
+    assert eta == pytest.approx((10000 - 300) / rate, abs=0.1)
+
+
+def test_no_eta_before_the_first_frame(clock):
+    snapshot = RenderMetrics(100).snapshot()
+
+    assert snapshot["eta"] is None
+    assert 'ETA --:--' in format_metrics(snapshot)
+
+
+def test_stage_times_are_smoothed(clock):
+    metrics = RenderMetrics(10)
+    metrics.stage('effect', 0.010)
+    metrics.stage('effect', 0.020)
+
+    assert metrics.stage_ms['effect'] == pytest.approx(10 + render_metrics.SMOOTHING * 10)
@@ -0,0 +1,41 @@
+from app.segments import plan_segments
+
+
+def covers(segments, frame_range) -> bool:
+    starts = [start for start, _ in segments]
+    ends = [end for _, end in segments]
+    return starts[0] == frame_range[0] and ends[-1] == frame_range[1] and starts[1:] == ends[:-1]
+
+
+def test_without_keyframes_the_range_is_split_evenly():
+    assert plan_segments([], (0, 100), 4) == [(0, 25), (25, 50), (50, 75), (75, 100)]
+
+
+def test_boundaries_move_to_the_nearest_keyframe():
+    assert plan_segments([0, 20, 48, 80], (0, 100), 4) == [(0, 20), (20, 48), (48, 80), (80, 100)]
+
+
+def test_sparse_keyframes_give_fewer_segments():
+    assert plan_segments([0, 60], (0, 100), 8) == [(0, 60), (60, 100)]
+
+
+def test_keyframes_on_the_range_ends_are_no_boundaries():
+    assert plan_segments([0, 100], (0, 100), 4) == [(0, 100)]
+    assert plan_segments([10, 50, 90], (10, 90), 2) == [(10, 50), (50, 90)]
+
+
+def test_one_segment_is_the_whole_range():
+    assert plan_segments([0, 30, 60], (5, 95), 1) == [(5, 95)]
+
+
+def test_interlaced_boundaries_stay_on_frame_pairs():
+    segments = plan_segments([0, 31, 63, 95], (0, 128), 4, step=2)
+    assert segments == [(0, 30), (30, 62), (62, 94), (94, 128)]
+    assert covers(segments, (0, 128))
+
+
+def test_time_range_is_covered_without_gaps():
+    keyframes = list(range(0, 1000, 48))
+    segments = plan_segments(keyframes, (130, 870), 16, step=2)
+    assert covers(segments, (130, 870))
+    assert all(start in keyframes for start, _ in segments[1:])
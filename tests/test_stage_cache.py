@@ -0,0 +1,74 @@
+import numpy
+import pytest
+
+from app.ntsc import random_ntsc
+from app.stage_cache import StageCache
+from app.stage_profiler import StageProfiler
+
+SRC = numpy.random.RandomState(3).randint(0, 256, (48, 64, 3)).astype(numpy.uint8)
+
+
+def make_ntsc(**parameters):
+    nt = random_ntsc(18)
+    nt._composite_in_chroma_lowpass = True
+    nt._video_noise = 2
+    nt._video_chroma_noise = 100
+    for name, value in parameters.items():
+        setattr(nt, name, value)
+    return nt
+
+
+def effect(nt, cache=None, src=SRC, frameno=3):
+    """Output of the first field and how often each stage ran"""
+    nt.stage_cache = cache
+    nt.profiler = StageProfiler()
+    out = nt.composite_layer(src.copy(), src, field=0, fieldno=0, frameno=frameno).copy()
+    return out, {row["stage"]: row["calls"] for row in nt.profiler.rows()}
+
+
+@pytest.mark.parametrize('max_bytes', [256 * 2 ** 20, 1])
+def test_later_stage_edit_reuses_the_early_stages(max_bytes):
+    cache = StageCache(max_bytes)
+    effect(make_ntsc(), cache)
+
+    out, calls = effect(make_ntsc(_video_chroma_noise=900), cache)
+
+    assert numpy.array_equal(out, effect(make_ntsc(_video_chroma_noise=900))[0])
+    if max_bytes > 1:
+        assert 'composite_in_chroma_lowpass' not in calls
+    assert calls['video_chroma_noise'] == 1
+
+
+@pytest.mark.parametrize('change', [
+    {'parameters': {'_noise_seed': 7}},
+    {'frameno': 4},
+    {'src': SRC[::-1].copy()},
+])
+def test_other_inputs_make_the_cache_stale(change):
+    cache = StageCache()
+    effect(make_ntsc(), cache)
+
+    nt = make_ntsc(**change.get('parameters', {}))
+    kwargs = {key: value for key, value in change.items() if key != 'parameters'}
+    out, calls = effect(nt, cache, **kwargs)
+
+    assert numpy.array_equal(out, effect(make_ntsc(**change.get('parameters', {})), **kwargs)[0])
+    assert calls['composite_in_chroma_lowpass'] == 1
+
+
+def test_unchanged_parameters_run_no_stage():
+    cache = StageCache()
+    first, _ = effect(make_ntsc(), cache)
+
+    again, calls = effect(make_ntsc(), cache)
+
+    assert numpy.array_equal(first, again)
+    assert calls.get('composite_in_chroma_lowpass') is None
+
+
+def test_byte_budget_is_kept():
+    cache = StageCache(max_bytes=200 * 1024)
+    for frameno in range(4):
+        effect(make_ntsc(), cache, frameno=frameno)
+
+    assert cache.nbytes <= 200 * 1024
@@ -0,0 +1,19 @@
+import pickle
+
+from app.stage_profiler import StageProfiler
+
+
+def test_worker_stats_merge_into_the_main_profiler():
+    main = StageProfiler()
+    main.measure('ringing', 0, lambda: None)
+
+    # what a render worker gets, renders with and sends back
+    worker = pickle.loads(pickle.dumps(main))
+    assert worker.rows() == []
+    worker.measure('ringing', 0, lambda: None)
+    worker.measure('ringing', 2, lambda: None)
+    main.extend(pickle.loads(pickle.dumps(worker.take())))
+
+    assert worker.rows() == []
+    calls = {(row["stage"], row["field"]): row["calls"] for row in main.rows()}
+    assert calls == {('ringing', 0): 2, ('ringing', 2): 1}
@@ -0,0 +1,46 @@
+import cv2
+import numpy
+from PyQt5 import QtGui, QtCore
+from PyQt5.QtWidgets import QLabel
+
+
+class PreviewDisplay(QLabel):
+    """
+    QLabel that paints BGR frames itself: one conversion into a reused RGB buffer, a QImage on top of
+    that memory and scaling done while painting, no intermediate copies or pixmaps
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._rgb: numpy.ndarray = None
+        # views self._rgb, the buffer is only replaced together with the image
+        self._image: QtGui.QImage = None
+
+    def show_frame(self, frame: numpy.ndarray):
+        height, width = frame.shape[:2]
+        if self._rgb is None or self._rgb.shape != frame.shape:
+            self._image = None
+            self._rgb = numpy.empty((height, width, 3), dtype=numpy.uint8)
+        cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=self._rgb)
+        if self._image is None:
+            self._image = QtGui.QImage(self._rgb.data, width, height, self._rgb.strides[0], QtGui.QImage.Format_RGB888)
+        if self.text():
+            self.setText('')
+        self.update()
+
+    def paintEvent(self, event: QtGui.QPaintEvent):
+        # background from the style sheet, and the placeholder text before the first frame
+        super().paintEvent(event)
+        if self._image is None:
+            return
+
+        # same as before: shrink to the widget height, never enlarge
+        size = QtCore.QSize(self._image.width(), self._image.height())
+        if size.height() > self.height() or size.width() > self.width():
+            size.scale(self.size(), QtCore.Qt.KeepAspectRatio)
+        target = QtCore.QRect(QtCore.QPoint(0, 0), size)
+        target.moveCenter(self.rect().center())
+
+        painter = QtGui.QPainter(self)
+        painter.drawImage(target, self._image)
+        painter.end()